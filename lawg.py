@@ -1,30 +1,44 @@
-import atexit
+import time
+
+STARTED = time.monotonic()
+
+import importlib
 import logging
+import logging.handlers
 import os
-import signal
 import sys
-from functools import partial
 from pathlib import Path
-from typing import List
+from typing import List, TYPE_CHECKING
+
+from utils.startup import ImportProfiler, PhaseTimer
 
-from git import GitCommandError
-from prompt_toolkit import HTML
-from prompt_toolkit.key_binding import bindings, KeyBindings
-from prompt_toolkit.shortcuts import yes_no_dialog
+# Installed first to time every import that follows
+import_profiler = ImportProfiler.install() if "--startup-profile" in sys.argv else None
 
-from utils import find_stash_with_message, clear_console
-from utils.command import FixCommand, ExitCommand, CommandInterface, FixCommandOneBranch, FinishCommand
+from utils import clear_console
 from utils.constant import NO_WATCHER, NO_SESSION_CLOSURE, AUTO_BRANCH, CONFIG_FILE_NAME, DATA_FILE_NAME, \
-    IDENTITY_FILE_NAME, AUTH_CONFIG_FILE_NAME, NO_AUTO_BRANCH
-from utils.data_file_manager import PickleDataFileManager, DataFileManagerInterface
+    IDENTITY_FILE_NAME, AUTH_CONFIG_FILE_NAME, NO_AUTO_BRANCH, LOG_PATH, LOG_MAX_SIZE
+from utils.data_file_manager import JournalDataFileManager, DataFileManagerInterface
 from utils.file_manager import FileManagerGlob
 from utils.file_watcher import FileWatcherWatchdog, FileWatcherInterface, FileWatcherWatchdogOneBranch
-from utils.git_manager import GitManagerPython, GitManagerInterface
-from utils.prompt import PromptAutocomplete
+from utils.git_manager import GitManagerInterface, GIT_ENGINES
 from utils.identity_file_manager import IdentityCreatorDialog
 from utils.config_file_manager import YAMLConfigFileManager, \
-    ConfigFileManagerInterface
+    ConfigFileManagerInterface, Config
 from utils.session_manager import SessionManager, SessionManagerInterface
+from utils.status_channel import StatusChannel
+
+if TYPE_CHECKING:
+    from utils.command import CommandInterface
+
+# The user interface is only needed once the session is open, it is imported in the background meanwhile
+UI_MODULES = ["prompt_toolkit.shortcuts", "utils.dialogs", "utils.prompt"]
+
+
+def import_ui_modules():
+    for module in UI_MODULES:
+        importlib.import_module(module)
+
 
 def read_settings(config_file_manager: ConfigFileManagerInterface):
     try:
@@ -42,6 +56,26 @@ def read_settings(config_file_manager: ConfigFileManagerInterface):
         read_settings(config_file_manager)
 
 
+def configure_logging(repo_path):
+    """
+    Writes the reports of the session (startup phases, pushes, maintenance, ...) to a log file in the repository, only
+    the warnings and errors being shown in the console.
+    """
+    console_handler = logging.StreamHandler()
+    console_handler.setLevel(logging.WARNING)
+    console_handler.setFormatter(logging.Formatter("%(message)s"))
+    handlers = [console_handler]
+    log_path = Path(repo_path) / LOG_PATH
+    try:
+        log_path.parent.mkdir(parents=True, exist_ok=True)
+        handlers.append(logging.handlers.RotatingFileHandler(log_path, maxBytes=LOG_MAX_SIZE, backupCount=1,
+                                                             encoding="utf-8"))
+    except OSError as e:
+        print(f"Cannot write the log file {log_path}: {e}")
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(threadName)s: %(message)s",
+                        handlers=handlers)
+
+
 def read_auth_settings(config_file_manager: ConfigFileManagerInterface):
     config_file_manager.load_auth_settings(AUTH_CONFIG_FILE_NAME)
 
@@ -52,7 +86,9 @@ def get_commands_list(questions: List[str],
                       data_file_manager: DataFileManagerInterface,
                       session_manager: SessionManagerInterface,
                       repo_path,
-                      __file__) -> List[CommandInterface]:
+                      __file__) -> List["CommandInterface"]:
+    from utils.command import FixCommand, ExitCommand, FixCommandOneBranch, FinishCommand
+
     fix_command = FixCommandOneBranch(questions, git_service, data_file_manager, file_watcher_manager) \
             if NO_AUTO_BRANCH else FixCommand(questions, git_service, data_file_manager, file_watcher_manager)
     finish_command = FinishCommand(git_service)
@@ -60,60 +96,112 @@ def get_commands_list(questions: List[str],
     return [fix_command, finish_command, exit_command]
 
 
+def apply_settings(previous: Config, current: Config):
+    """
+    Rebuilds what depends on the settings that changed, the session itself going on as it is.
+    """
+    if current.questions != previous.questions:
+        data_file_manager.questions = current.questions
+        for command in commands:
+            command.update_questions(current.questions)
+    watcher_settings = {"coalescing": "coalescing", "save_patterns": "save_patterns", "large_files": "large_files",
+                        "watch_scope": "watch"}
+    file_watcher.update_settings(**{setting: getattr(current, field) for setting, field in watcher_settings.items()
+                                    if getattr(current, field) != getattr(previous, field)})
+    if current.status != previous.status:
+        status_channel.configure(**current.status)
+    status_channel.publish("Settings reloaded", save=False)
+
+
 def bottom_toolbar():
-    event = file_watcher.last_message.partition("\n")[0]
-    return HTML(f'Last event: {event}')
+    from prompt_toolkit import HTML
+
+    return HTML('Last event: {}').format(status_channel.summary())
 
 if __name__ == "__main__":
     clear_console()
     if getattr(sys, 'frozen', False):
         os.chdir(Path(sys.executable).parent)
 
-    last_message = ""
-
     file_manager = FileManagerGlob()
     config = YAMLConfigFileManager(file_manager)
     identity_file_manager = IdentityCreatorDialog()
 
-    read_settings(config)
-    git_manager = GitManagerPython(config.repo_path, config.ssh_path, config.nickname, config.pat)
-
-    data_file_manager = PickleDataFileManager(file_manager, Path(config.repo_path) / DATA_FILE_NAME, config.questions)
-    identity_file_manager.create_identity_file(config.repo_path, config.groups)
-
-    session_manager = SessionManager(git_manager, data_file_manager, file_manager)
+    timer = PhaseTimer(STARTED)
+    ui_imported = timer.background("ui imports", import_ui_modules)
+    with timer.phase("settings"):
+        read_settings(config)
+        configure_logging(config.repo_path)
+        file_manager.reap_trash(Path(config.repo_path))
+    with timer.phase("git"):
+        git_manager = GIT_ENGINES[config.git_engine](config.repo_path, config.ssh_path, config.nickname, config.pat)
+
+    data_file_manager = JournalDataFileManager(file_manager, Path(config.repo_path) / DATA_FILE_NAME, config.questions)
+
+    status_channel = StatusChannel(**config.status)
+    with timer.phase("watcher setup"):
+        if NO_AUTO_BRANCH:
+            file_watcher = FileWatcherWatchdogOneBranch(config.repo_path, git_manager, file_manager,
+                                                        coalescing=config.coalescing,
+                                                        save_patterns=config.save_patterns,
+                                                        large_files=config.large_files,
+                                                        watch_scope=config.watch,
+                                                        status=status_channel)
+        else:
+            file_watcher = FileWatcherWatchdog(config.repo_path, git_manager, file_manager,
+                                               coalescing=config.coalescing,
+                                               save_patterns=config.save_patterns,
+                                               large_files=config.large_files,
+                                               watch_scope=config.watch,
+                                               status=status_channel)
+    snapshot_loaded = timer.background("snapshot", file_watcher.load_snapshot)
+
+    session_manager = SessionManager(git_manager, data_file_manager, file_manager, file_watcher)
 
     auth_file_path_str = str((Path(config.repo_path) / AUTH_CONFIG_FILE_NAME).relative_to(config.repo_path))
-    session_manager.restore_auth_file(auth_file_path_str)
+    with timer.phase("auth file"):
+        session_manager.restore_auth_file(auth_file_path_str)
 
-    read_auth_settings(config)
+    # The network round-trip runs on the git worker while the dialogs are up
+    fetched = timer.background("fetch", git_manager.fetch, submit=git_manager.submit)
 
-    session_manager.open_session(__file__, config.repo_path)
+    with timer.phase("dialogs"):
+        identity_file_manager.create_identity_file(config.repo_path, config.groups)
+        read_auth_settings(config)
 
-    if NO_AUTO_BRANCH:
-        file_watcher = FileWatcherWatchdogOneBranch(config.repo_path, git_manager, file_manager)
-    else:
-        file_watcher = FileWatcherWatchdog(config.repo_path, git_manager, file_manager)
-    session_manager.file_watcher = file_watcher
+    timer.wait(snapshot_loaded)
+    with timer.phase("resume"):
+        session_manager.open_session(__file__, config.repo_path, fetched)
 
     if not NO_WATCHER:
         print("Starting observer ...")
-        file_watcher.start()
+        with timer.phase("watcher start"):
+            file_watcher.start()
+
+    timer.wait(ui_imported)
+    from prompt_toolkit.shortcuts import yes_no_dialog
+    from utils.prompt import PromptAutocomplete
 
     commands = get_commands_list(config.questions, file_watcher, git_manager, data_file_manager, session_manager,
                                  config.repo_path, __file__)
     command_prompt = PromptAutocomplete(commands, bottom_toolbar)
-
-    file = open(".variables.dat", "w")
+    config.add_listener(apply_settings)
+    config.watch_settings()
+    logging.info(timer.report())
 
     while True:
         try:
             clear_console()
+            if import_profiler is not None:
+                print(f"First prompt after {(time.monotonic() - STARTED) * 1000:.0f} ms.\n{timer.report()}\n"
+                      f"{import_profiler.report()}")
+                import_profiler = None
             command_prompt.prompt()
         except KeyboardInterrupt:
             response = yes_no_dialog(
                 title='Quit & close session',
                 text='Do you confirm you want to quit and close your workspace?').run()
             if response:
+                config.stop_watching_settings()
                 session_manager.close_session(config.repo_path, __file__)
                 sys.exit()
@@ -0,0 +1,28 @@
+import subprocess
+
+import pytest
+
+
+def git(*args, cwd, env=None):
+    return subprocess.run(["git", *args], cwd=cwd, check=True, capture_output=True, text=True,
+                          env=env).stdout.strip()
+
+
+def make_clone(folder):
+    """
+    :return: a clone, with one pushed commit, of a bare repository created next to it in the folder
+    """
+    folder.mkdir(parents=True, exist_ok=True)
+    git("init", "-q", "--bare", "remote.git", cwd=folder)
+    git("clone", "-q", f"file://{folder / 'remote.git'}", "clone", cwd=folder)
+    clone = folder / "clone"
+    git("config", "user.email", "student@example.com", cwd=clone)
+    git("config", "user.name", "Student", cwd=clone)
+    git("commit", "-q", "--allow-empty", "-m", "Initial commit", cwd=clone)
+    git("push", "-q", "-u", "origin", "HEAD", cwd=clone)
+    return clone
+
+
+@pytest.fixture
+def clone(tmp_path):
+    return make_clone(tmp_path)
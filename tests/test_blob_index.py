@@ -0,0 +1,75 @@
+import os
+
+import pytest
+
+from tests.conftest import git
+from utils.blob_index import BlobIndex, hash_file
+from utils.git_manager import GitManagerPython
+
+
+@pytest.fixture
+def git_manager(clone):
+    git_manager = GitManagerPython(clone, None, None, None)
+    yield git_manager
+    git_manager.close()
+
+
+def commit_all(clone, message: str) -> str:
+    git("add", "-A", cwd=clone)
+    git("commit", "-q", "-m", message, cwd=clone)
+    return git("rev-parse", "HEAD", cwd=clone)
+
+
+def test_hash_file_matches_git(clone):
+    (clone / "a.py").write_bytes(b"print('hello')\r\n\0")
+    os.symlink("a.py", clone / "link")
+    assert hash_file(clone / "a.py") == git("hash-object", "a.py", cwd=clone)
+    git("add", "link", cwd=clone)
+    assert hash_file(clone / "link") == git("ls-files", "-s", "link", cwd=clone).split()[1]
+
+
+def test_changes_are_told_apart_from_no_ops(git_manager, clone):
+    path = clone / "a.py"
+    path.write_text("x = 1\n")
+    blob_index = BlobIndex(git_manager, clone)
+    assert not blob_index.is_unchanged(path)
+
+    commit_id = commit_all(clone, "Add a.py")
+    blob_index.record([path], commit_id)
+    assert blob_index.is_unchanged(path)
+    assert blob_index.committed(path) == (git("rev-parse", "HEAD:a.py", cwd=clone), 6)
+
+    path.write_text("x = 2\n")
+    assert not blob_index.is_unchanged(path)
+    path.write_text("x = 1\n")
+    assert blob_index.is_unchanged(path)
+
+    path.unlink()
+    assert not blob_index.is_unchanged(path)
+    assert blob_index.is_unchanged(clone / "missing.py")
+
+
+def test_save_made_after_the_commit_is_not_recorded(git_manager, clone):
+    path = clone / "a.py"
+    path.write_text("x = 1\n")
+    commit_all(clone, "Add a.py")
+    blob_index = BlobIndex(git_manager, clone)
+    assert blob_index.is_unchanged(path)
+
+    # The size changed, the file is not hashed before being committed
+    path.write_text("x = 10\n")
+    assert not blob_index.is_unchanged(path)
+    commit_id = commit_all(clone, "Edit a.py")
+    path.write_text("x = 100\n")
+    blob_index.record([path], commit_id)
+
+    assert not blob_index.is_unchanged(path)
+
+
+def test_commits_made_elsewhere_are_picked_up(git_manager, clone):
+    path = clone / "a.py"
+    path.write_text("x = 1\n")
+    blob_index = BlobIndex(git_manager, clone)
+    assert not blob_index.is_unchanged(path)
+    commit_all(clone, "Add a.py")
+    assert blob_index.is_unchanged(path)
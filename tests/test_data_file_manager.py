@@ -0,0 +1,54 @@
+import pickle
+
+import pytest
+
+from utils.data_file_manager import JournalDataFileManager, Data
+from utils.file_manager import FileManagerGlob
+
+QUESTIONS = ["q1", "q2", "q3"]
+
+
+@pytest.fixture
+def data_file_path(tmp_path):
+    return tmp_path / ".variables.dat"
+
+
+def open_journal(data_file_path, **kwargs):
+    return JournalDataFileManager(FileManagerGlob(), data_file_path, QUESTIONS, **kwargs)
+
+
+def test_progress_is_replayed_from_the_journal(data_file_path):
+    journal = open_journal(data_file_path)
+    journal.set_cross_close(True)
+    journal.complete_question("q2", {"perceived_difficulty": 5, "perceived_emotions": 3})
+    journal.complete_question("q2")
+    journal.complete_question("unknown")
+
+    reopened = open_journal(data_file_path)
+    assert reopened.cross_close
+    assert reopened.completed_questions == ["q2"]
+    assert reopened.is_completed("q2") and not reopened.is_completed("q1")
+    assert reopened.get_question_record("q2")["answers"] == {"perceived_difficulty": 5, "perceived_emotions": 3}
+    assert len(data_file_path.read_bytes().splitlines()) == 2
+
+
+def test_torn_record_is_dropped_and_the_journal_compacted(data_file_path):
+    journal = open_journal(data_file_path)
+    journal.complete_question("q1")
+    with open(data_file_path, "ab") as data_file:
+        data_file.write(b'{"completed": "q3", "at')
+
+    reopened = open_journal(data_file_path)
+    assert reopened.completed_questions == ["q1"]
+    assert data_file_path.read_bytes().endswith(b"\n")
+
+
+def test_pickled_data_file_is_migrated(data_file_path):
+    data = Data()
+    data.cross_close = True
+    data.completed_questions = ["q1", "q3"]
+    data_file_path.write_bytes(pickle.dumps(data))
+
+    journal = open_journal(data_file_path)
+    assert journal.cross_close and journal.completed_questions == ["q1", "q3"]
+    assert open_journal(data_file_path).completed_questions == ["q1", "q3"]
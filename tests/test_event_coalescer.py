@@ -0,0 +1,86 @@
+import time
+from pathlib import Path
+
+import pytest
+
+from utils.event_coalescer import EventCoalescer, PendingChange, CREATED, MODIFIED, DELETED, MOVED
+
+
+@pytest.fixture
+def batches():
+    return []
+
+
+@pytest.fixture
+def coalescer(batches):
+    return EventCoalescer(batches.append, quiet_period=60, max_delay=60, max_batch=100)
+
+
+def test_created_then_modified_is_created(coalescer, batches):
+    coalescer.add(CREATED, Path("a.py"))
+    coalescer.add(MODIFIED, Path("a.py"))
+    coalescer.flush()
+    assert batches == [[PendingChange(CREATED, Path("a.py"))]]
+
+
+def test_modified_then_deleted_is_deleted(coalescer, batches):
+    coalescer.add(MODIFIED, Path("a.py"))
+    coalescer.add(DELETED, Path("a.py"))
+    coalescer.flush()
+    assert batches == [[PendingChange(DELETED, Path("a.py"))]]
+
+
+def test_deleted_then_created_is_modified(coalescer, batches):
+    coalescer.add(DELETED, Path("a.py"))
+    coalescer.add(CREATED, Path("a.py"))
+    coalescer.flush()
+    assert batches == [[PendingChange(MODIFIED, Path("a.py"))]]
+
+
+def test_created_then_deleted_cancels_out(coalescer, batches):
+    coalescer.add(CREATED, Path("a.py"))
+    coalescer.add(DELETED, Path("a.py"))
+    coalescer.flush()
+    assert batches == []
+
+
+def test_created_then_moved_is_created_at_destination(coalescer, batches):
+    coalescer.add(CREATED, Path("a.tmp"))
+    coalescer.add(MOVED, Path("a.py"), Path("a.tmp"))
+    coalescer.flush()
+    assert batches == [[PendingChange(CREATED, Path("a.py"))]]
+
+
+def test_moved_back_is_modified(coalescer, batches):
+    coalescer.add(MOVED, Path("b.py"), Path("a.py"))
+    coalescer.add(MOVED, Path("a.py"), Path("b.py"))
+    coalescer.flush()
+    assert batches == [[PendingChange(MODIFIED, Path("a.py"))]]
+
+
+def test_flushes_when_batch_is_full(batches):
+    coalescer = EventCoalescer(batches.append, quiet_period=60, max_delay=60, max_batch=2)
+    coalescer.start()
+    coalescer.add(MODIFIED, Path("a.py"))
+    coalescer.add(MODIFIED, Path("b.py"))
+    # Checked before stop(), which flushes whatever is pending anyway
+    for _ in range(100):
+        if batches:
+            break
+        time.sleep(0.01)
+    flushed = list(batches)
+    coalescer.stop()
+    assert flushed == [[PendingChange(MODIFIED, Path("a.py")), PendingChange(MODIFIED, Path("b.py"))]]
+
+
+def test_flushes_after_quiet_period(batches):
+    coalescer = EventCoalescer(batches.append, quiet_period=0.05, max_delay=60, max_batch=100)
+    coalescer.start()
+    coalescer.add(MODIFIED, Path("a.py"))
+    coalescer.add(MODIFIED, Path("a.py"))
+    for _ in range(100):
+        if batches:
+            break
+        time.sleep(0.01)
+    coalescer.stop()
+    assert batches == [[PendingChange(MODIFIED, Path("a.py"))]]
@@ -0,0 +1,43 @@
+import pytest
+
+from utils.constant import TRASH_PATH
+from utils.file_manager import DeletionManifest, FileManagerGlob
+
+
+@pytest.fixture
+def workspace(tmp_path):
+    (tmp_path / ".git" / "objects").mkdir(parents=True)
+    (tmp_path / "node_modules" / "left-pad" / "lib").mkdir(parents=True)
+    for i in range(50):
+        (tmp_path / "node_modules" / "left-pad" / "lib" / f"{i}.js").write_text("module.exports = 0;\n")
+    (tmp_path / "tp1" / "data").mkdir(parents=True)
+    (tmp_path / "tp1" / "main.py").write_text("print('hello')\n")
+    (tmp_path / "tp1" / "data" / "keep.csv").write_text("a,b\n")
+    (tmp_path / ".settings.yml").write_text("repo_path: .\n")
+    (tmp_path / "notes.txt").write_text("notes\n")
+    return tmp_path
+
+
+@pytest.fixture
+def kept_paths(workspace):
+    return [workspace / ".git/", workspace / ".settings.yml", workspace / "tp1" / "data" / "keep.csv"]
+
+
+def test_manifest_walks_only_into_the_folders_holding_kept_paths(workspace, kept_paths):
+    manifest = DeletionManifest.plan(workspace, kept_paths)
+    assert sorted(manifest.folders) == [str(workspace / "node_modules")]
+    assert sorted(manifest.files) == [str(workspace / "notes.txt"), str(workspace / "tp1" / "main.py")]
+
+
+def test_delete_all_keeps_the_kept_paths(workspace, kept_paths):
+    FileManagerGlob(workers=4).delete_all(workspace, kept_paths)
+    remaining = sorted(path.relative_to(workspace).as_posix() for path in workspace.rglob("*"))
+    assert remaining == [".git", ".git/objects", ".settings.yml", "tp1", "tp1/data", "tp1/data/keep.csv"]
+
+
+def test_delete_all_in_background_moves_folders_to_the_trash(workspace, kept_paths):
+    file_manager = FileManagerGlob()
+    file_manager.delete_all(workspace, kept_paths, background=True)
+    assert not (workspace / "node_modules").exists()
+    file_manager.reaper.join(timeout=10)
+    assert not (workspace / TRASH_PATH).exists()
@@ -0,0 +1,108 @@
+import json
+import threading
+
+import pytest
+
+from tests.conftest import git
+from utils.blob_index import hash_file
+from utils.file_policy import LargeFilePolicy, parse_size, is_binary, SKIP, METADATA, THROTTLE
+from utils.git_manager import GitManagerPython
+
+
+def test_parse_size():
+    assert parse_size(100) == 100
+    assert parse_size("100") == 100
+    assert parse_size("20MB") == 20 * 1024 ** 2
+    assert parse_size(" 1.5 kb ") == 1536
+    assert parse_size("2G") == 2 * 1024 ** 3
+    for value in ("abc", "0", 0, "-1", "10TB"):
+        with pytest.raises(ValueError):
+            parse_size(value)
+
+
+def test_is_binary(tmp_path):
+    (tmp_path / "a.py").write_text("print('hello')\n")
+    (tmp_path / "a.o").write_bytes(b"\x7fELF\0\1")
+    (tmp_path / "late.bin").write_bytes(b"a" * 10 + b"\0")
+    assert not is_binary(tmp_path / "a.py")
+    assert is_binary(tmp_path / "a.o")
+    assert not is_binary(tmp_path / "late.bin", sniff_size=10)
+
+
+def test_skip_withholds_oversized_files(tmp_path):
+    (tmp_path / "a.py").write_text("x = 1\n")
+    (tmp_path / "data.csv").write_text("1,2\n" * 100)
+    (tmp_path / "a.o").write_bytes(b"\0" * 50)
+    policy = LargeFilePolicy(tmp_path, max_size=200, max_binary_size=20, action=SKIP)
+    paths = [tmp_path / "a.py", tmp_path / "data.csv", tmp_path / "a.o", tmp_path / "deleted.csv"]
+    assert policy.apply(paths) == ([tmp_path / "a.py", tmp_path / "deleted.csv"],
+                                   [tmp_path / "data.csv", tmp_path / "a.o"])
+    assert policy.bytes_saved == 450
+    assert not policy.manifest_path.exists()
+
+
+def test_metadata_is_recorded_in_the_manifest(tmp_path):
+    path = tmp_path / "data.csv"
+    path.write_text("1,2\n" * 100)
+    policy = LargeFilePolicy(tmp_path, max_size=200, action=METADATA)
+    assert policy.apply([path]) == ([policy.manifest_path], [path])
+    manifest = json.loads(policy.manifest_path.read_text())
+    assert manifest["data.csv"]["size"] == 400
+    assert manifest["data.csv"]["blob"] == hash_file(path)
+
+    # Unchanged files leave the manifest alone
+    assert policy.apply([path]) == ([], [path])
+
+    path.write_text("1,2\n" * 200)
+    assert policy.apply([path]) == ([policy.manifest_path], [path])
+    assert json.loads(policy.manifest_path.read_text())["data.csv"]["size"] == 800
+
+
+def test_throttled_write_is_committed_when_the_interval_ends(tmp_path):
+    path = tmp_path / "data.csv"
+    path.write_text("1,2\n" * 100)
+    interval_ended = threading.Event()
+    ended_paths = []
+
+    def on_interval_end(ended_path):
+        ended_paths.append(ended_path)
+        interval_ended.set()
+
+    policy = LargeFilePolicy(tmp_path, max_size=200, action=THROTTLE, interval=0.2 / 60,
+                             on_interval_end=on_interval_end)
+    assert policy.apply([path]) == ([path], [])
+    assert policy.apply([path]) == ([], [path])
+    assert policy.apply([path]) == ([], [path])
+    assert interval_ended.wait(5)
+    assert ended_paths == [path]
+    assert policy.apply([path]) == ([path], [])
+
+
+def test_closing_releases_the_throttled_files(tmp_path):
+    path = tmp_path / "data.csv"
+    path.write_text("1,2\n" * 100)
+    ended_paths = []
+    policy = LargeFilePolicy(tmp_path, max_size=200, action=THROTTLE, interval=60, on_interval_end=ended_paths.append)
+    policy.apply([path])
+    policy.apply([path])
+    assert policy.close() == [path]
+    assert policy.apply([path]) == ([path], [])
+    assert ended_paths == []
+
+
+def test_add_all_leaves_withheld_files_out(clone):
+    (clone / "tracked.csv").write_text("1,2\n")
+    git("add", "tracked.csv", cwd=clone)
+    git("commit", "-q", "-m", "Add tracked.csv", cwd=clone)
+    (clone / "tracked.csv").write_text("1,2\n" * 100)
+    (clone / "folder").mkdir()
+    (clone / "folder" / "big file.csv").write_text("1,2\n" * 100)
+    (clone / "a.py").write_text("x = 1\n")
+
+    git_manager = GitManagerPython(clone, None, None, None)
+    try:
+        git_manager.withhold = LargeFilePolicy(clone, max_size=200, action=SKIP).withheld
+        git_manager.add_all()
+    finally:
+        git_manager.close()
+    assert git("diff", "--cached", "--name-only", cwd=clone).splitlines() == ["a.py"]
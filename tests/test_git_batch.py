@@ -0,0 +1,52 @@
+import threading
+
+import pytest
+
+from tests.conftest import git
+from utils.git_batch import GitBatchPool
+
+
+@pytest.fixture
+def batch(clone):
+    (clone / ".gitignore").write_text("*.log\n!keep.log\nbuild/\n")
+    (clone / "a.txt").write_text("a\n")
+    git("add", ".gitignore", "a.txt", cwd=clone)
+    git("commit", "-q", "-m", "Exercise", cwd=clone)
+    batch = GitBatchPool(clone)
+    yield batch
+    batch.close()
+
+
+def test_objects_are_read_by_the_persistent_cat_file(batch, clone):
+    blob_id = git("rev-parse", "HEAD:a.txt", cwd=clone)
+    assert batch.object_info("HEAD:a.txt") == (blob_id, "blob", 2)
+    assert batch.read_object(blob_id) == (blob_id, "blob", b"a\n")
+    assert batch.object_info("HEAD:missing.txt") is None
+    assert batch.read_object("HEAD:missing.txt") is None
+
+
+def test_files_are_hashed_like_git_hash_object(batch, clone):
+    (clone / "b.txt").write_text("b\n")
+    for path in [clone / "a.txt", clone / "b.txt", "a.txt"]:
+        assert batch.hash_object(path) == git("hash-object", str(path), cwd=clone)
+
+
+def test_helper_is_restarted_when_it_dies(batch, clone):
+    assert batch.hash_object("a.txt")
+    process = next(iter(batch._helpers.values())).process
+    process.kill()
+    process.wait()
+    assert batch.hash_object("a.txt") == git("hash-object", "a.txt", cwd=clone)
+    assert batch.restarts() == 1
+
+
+def test_large_ignore_checks_do_not_fill_the_pipes(batch):
+    paths = [f"exercises/part{i // 100}/file{i}.{'log' if i % 3 == 0 else 'py'}" for i in range(5000)]
+    paths += ["keep.log", "build/out.o", "build.txt"]
+    results = []
+    checker = threading.Thread(target=lambda: results.append(batch.check_ignore(paths)), daemon=True)
+    checker.start()
+    checker.join(timeout=30)
+    assert not checker.is_alive(), "check-ignore is blocked"
+    assert results[0] == [path.endswith(".log") and path != "keep.log" or path.startswith("build/") for path in paths]
+    assert batch.check_ignore(["x.log", "x.py"]) == [True, False]
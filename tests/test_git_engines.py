@@ -0,0 +1,64 @@
+import pytest
+from git import GitCommandError
+
+from tests.conftest import git, make_clone
+from utils.git_manager import GitManagerInProcess, GitManagerPython
+
+
+@pytest.fixture(autouse=True)
+def fixed_dates(monkeypatch):
+    # Both engines then write the very same commits
+    monkeypatch.setenv("GIT_AUTHOR_DATE", "1700000000 +0100")
+    monkeypatch.setenv("GIT_COMMITTER_DATE", "1700000000 +0100")
+
+
+def repository_state(clone) -> dict:
+    branch = git("branch", "--show-current", cwd=clone)
+    return {
+        "refs": git("for-each-ref", "--format=%(refname) %(objectname)", cwd=clone),
+        "index": git("write-tree", cwd=clone),
+        "status": git("status", "--porcelain", cwd=clone),
+        "reflogs": {ref: git("reflog", "show", "--format=%H %gs", ref, "--", cwd=clone)
+                    for ref in ["HEAD", f"refs/heads/{branch}", "refs/heads/auto"]},
+    }
+
+
+def run_scenario(engine, clone) -> dict:
+    git_manager = engine(clone, None, None, None)
+    try:
+        assert git_manager.in_process if engine is GitManagerInProcess else True
+        (clone / "a.txt").write_text("a\n")
+        git_manager.add(clone / "a.txt")
+        git_manager.commit("Add a")
+        (clone / "b.txt").write_text("b\n")
+        git_manager.add(clone / "b.txt")
+        git_manager.commit("Add b\n\n\nwith  \nits body\n\n")
+        with pytest.raises(GitCommandError):
+            git_manager.commit("Nothing")
+        git_manager.commit("Empty", allow_empty=True)
+        (clone / "a.txt").write_text("a2\n")
+        git_manager.add(clone / "a.txt")
+        git_manager.commit("Add a2", amend=True)
+        git_manager.branch("feature")
+        git_manager.tag("v0")
+
+        git_manager.snapshot_commit("[modified] a.txt", "auto", [clone / "a.txt"])
+        (clone / "a.txt").write_text("a3\n")
+        git_manager.snapshot_commit("[modified] a.txt", "auto", [clone / "a.txt"], amend=True)
+        (clone / "b.txt").rename(clone / "c.txt")
+        git_manager.snapshot_commit("[renamed] b.txt → c.txt", "auto", [clone / "b.txt", clone / "c.txt"])
+
+        git_manager.reset("HEAD~1", soft=True)
+        git_manager.reset("HEAD@{2}")
+        git_manager.reset("HEAD", hard=True)
+        assert git_manager.get_commit_id("auto") == git("rev-parse", "auto", cwd=clone)
+    finally:
+        git_manager.close()
+    return repository_state(clone)
+
+
+def test_in_process_engine_writes_what_git_writes(tmp_path):
+    subprocess_state = run_scenario(GitManagerPython, make_clone(tmp_path / "subprocess"))
+    in_process_state = run_scenario(GitManagerInProcess, make_clone(tmp_path / "in-process"))
+    assert in_process_state == subprocess_state
+    assert "refs/heads/auto" in subprocess_state["refs"] and "refs/tags/v0" in subprocess_state["refs"]
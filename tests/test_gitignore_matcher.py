@@ -0,0 +1,58 @@
+import pytest
+
+from utils.gitignore_matcher import GitignoreMatcher, rebase_pattern
+
+
+@pytest.fixture
+def repo(tmp_path):
+    (tmp_path / ".git" / "info").mkdir(parents=True)
+    (tmp_path / ".git" / "info" / "exclude").write_text("*.log\n")
+    (tmp_path / ".gitignore").write_text("# comment\nbuild/\n*.pyc\n!keep.pyc\n")
+    (tmp_path / "tp1").mkdir()
+    (tmp_path / "tp1" / ".gitignore").write_text("data\n/out.txt\n")
+    (tmp_path / "build").mkdir()
+    (tmp_path / "build" / ".gitignore").write_text("!*\n")
+    return tmp_path
+
+
+@pytest.fixture
+def matcher(repo):
+    return GitignoreMatcher(repo)
+
+
+def test_rebase_pattern():
+    assert rebase_pattern("data", "tp1/") == "tp1/**/data"
+    assert rebase_pattern("/out.txt", "tp1/") == "tp1/out.txt"
+    assert rebase_pattern("!a/b", "tp1/") == "!tp1/a/b"
+    assert rebase_pattern("# comment", "tp1/") is None
+    assert rebase_pattern("*.pyc", "") == "*.pyc"
+
+
+def test_root_rules(matcher, repo):
+    assert matcher.is_ignored(repo / "main.pyc")
+    assert not matcher.is_ignored(repo / "keep.pyc")
+    assert not matcher.is_ignored(repo / "main.py")
+
+
+def test_info_exclude(matcher, repo):
+    assert matcher.is_ignored(repo / "tp1" / "run.log")
+
+
+def test_nested_rules_are_relative_to_their_folder(matcher, repo):
+    assert matcher.is_ignored(repo / "tp1" / "data")
+    assert matcher.is_ignored(repo / "tp1" / "sub" / "data")
+    assert matcher.is_ignored(repo / "tp1" / "out.txt")
+    assert not matcher.is_ignored(repo / "tp1" / "sub" / "out.txt")
+    assert not matcher.is_ignored(repo / "data")
+
+
+def test_files_of_an_excluded_folder_cannot_be_included(matcher, repo):
+    assert matcher.is_ignored(repo / "build" / "main.o")
+
+
+def test_invalidate_reloads_rules(matcher, repo):
+    assert not matcher.is_ignored(repo / "notes.md")
+    (repo / ".gitignore").write_text("*.md\n")
+    assert not matcher.is_ignored(repo / "notes.md")
+    matcher.invalidate()
+    assert matcher.is_ignored(repo / "notes.md")
@@ -0,0 +1,23 @@
+import os
+import time
+
+from tests.conftest import git
+from utils.git_manager import GitManagerPython
+from utils.idle_maintenance import IdleMaintenance
+
+
+def test_maintenance_keeps_the_stashes(clone):
+    three_hours_ago = {**os.environ, "GIT_COMMITTER_DATE": f"{int(time.time()) - 3 * 3600} +0000"}
+    (clone / "draft.py").write_text("print('draft')\n")
+    git("stash", "push", "-q", "--include-untracked", "-m", "my draft", cwd=clone, env=three_hours_ago)
+    git("commit", "-q", "--allow-empty", "-m", "Old commit", cwd=clone, env=three_hours_ago)
+    git("reset", "-q", "HEAD~1", cwd=clone, env=three_hours_ago)
+    head_entries = len(git("reflog", "show", "HEAD", cwd=clone).splitlines())
+
+    git_manager = GitManagerPython(clone, None, None, None)
+    try:
+        assert IdleMaintenance(git_manager, clone, loose_objects=0).run_once()
+    finally:
+        git_manager.close()
+    assert "my draft" in git("stash", "list", cwd=clone)
+    assert len(git("reflog", "show", "HEAD", cwd=clone).splitlines()) < head_entries
@@ -0,0 +1,153 @@
+import os
+import threading
+import time
+
+import pytest
+from watchdog.events import FileSystemEventHandler, FileModifiedEvent
+from watchdog.observers.polling import PollingEmitter
+
+from utils import observer as observer_module
+from utils.file_manager import FileManagerGlob
+from utils.file_watcher import FileWatcherWatchdogOneBranch
+from utils.git_manager import GitManagerPython
+from utils.observer import PausingObserver, POLLING_BACKEND, resolve_backend
+
+
+class RecordingHandler(FileSystemEventHandler):
+    def __init__(self):
+        self.paths = []
+        self.lock = threading.Lock()
+
+    def on_any_event(self, event):
+        if event.is_directory:
+            return
+        with self.lock:
+            self.paths.append(os.fsdecode(event.src_path))
+            if hasattr(event, "dest_path"):
+                self.paths.append(os.fsdecode(event.dest_path))
+
+    def saw(self, path) -> bool:
+        with self.lock:
+            return str(path) in self.paths
+
+
+def eventually(predicate, timeout=5.0) -> bool:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if predicate():
+            return True
+        time.sleep(0.02)
+    return predicate()
+
+
+@pytest.fixture(params=["native", POLLING_BACKEND])
+def observed(request, tmp_path):
+    observer = PausingObserver(request.param, timeout=0.1)
+    handler = RecordingHandler()
+    observer.schedule(handler, str(tmp_path), recursive=True)
+    observer.start()
+    yield observer, handler
+    observer.stop()
+    observer.join()
+
+
+def settle():
+    # Long enough for both the kernel events and a few polling rounds
+    time.sleep(0.5)
+
+
+def test_writes_inside_the_block_are_dropped(observed, tmp_path):
+    observer, handler = observed
+    path = tmp_path / "data.json"
+    with observer.ignore_events([path]):
+        path.write_text("{}")
+        settle()
+    with observer.ignore_events([path]):
+        path.write_text('{"q1": true}')
+        settle()
+    settle()
+    assert not handler.saw(path)
+
+
+def test_edits_after_the_block_are_delivered(observed, tmp_path):
+    observer, handler = observed
+    path = tmp_path / "a.py"
+    with observer.ignore_events([path]):
+        path.write_text("x = 1\n")
+        settle()
+    settle()
+    assert not handler.saw(path)
+    path.write_text("x = 10\n")
+    assert eventually(lambda: handler.saw(path))
+
+
+def test_edits_of_other_paths_during_the_block_are_delivered(observed, tmp_path):
+    observer, handler = observed
+    path, other_path = tmp_path / "data.json", tmp_path / "b.py"
+    with observer.ignore_events([path]):
+        path.write_text("{}")
+        other_path.write_text("y = 1\n")
+        assert eventually(lambda: handler.saw(other_path))
+    settle()
+    assert not handler.saw(path)
+
+
+def test_deferred_events_are_dispatched_if_the_file_changed_again(tmp_path):
+    # Dispatched by hand, so that the file can be changed between the end of the block and the check of its events
+    observer = PausingObserver(POLLING_BACKEND)
+    handler = RecordingHandler()
+    watch = observer.schedule(handler, str(tmp_path), recursive=True)
+    unchanged_path, changed_path = tmp_path / "unchanged.py", tmp_path / "changed.py"
+    with observer.ignore_events([unchanged_path, changed_path]):
+        for path in (unchanged_path, changed_path):
+            path.write_text("x = 1\n")
+            observer.event_queue.put((FileModifiedEvent(str(path)), watch))
+            observer.dispatch_events(observer.event_queue, 0)
+        assert handler.paths == []
+    changed_path.write_text("x = 10\n")
+    while not observer.event_queue.empty():
+        observer.dispatch_events(observer.event_queue, 0)
+    assert handler.paths == [str(changed_path)]
+
+
+def test_unavailable_backends_fall_back_to_polling(monkeypatch):
+    def unavailable():
+        raise ImportError("no inotify here")
+
+    monkeypatch.setattr(observer_module, "native_backends", lambda: ["inotify"])
+    monkeypatch.setitem(observer_module.BACKENDS, "inotify", unavailable)
+    assert resolve_backend("native") == (POLLING_BACKEND, PollingEmitter)
+    assert resolve_backend("inotify") == (POLLING_BACKEND, PollingEmitter)
+    assert PausingObserver("native").is_polling
+    with pytest.raises(ValueError):
+        resolve_backend("dnotify")
+
+
+def test_polling_takes_over_when_the_observer_cannot_start(monkeypatch, clone, caplog):
+    start = PausingObserver.start
+
+    def failing_start(observer):
+        if not observer.is_polling:
+            raise OSError(28, "inotify watch limit reached")
+        start(observer)
+
+    monkeypatch.setattr(PausingObserver, "start", failing_start)
+    git_manager = GitManagerPython(clone, None, None, None)
+    file_watcher = FileWatcherWatchdogOneBranch(clone, git_manager, FileManagerGlob())
+    dispatched = []
+    file_watcher.event_handler.dispatch = lambda event: dispatched.append(os.fsdecode(event.src_path))
+    own_path, edited_path = clone / "data.json", clone / "a.py"
+    try:
+        file_watcher.start()
+        assert file_watcher.observer.is_polling and file_watcher.observer.is_alive()
+        assert "falling back to polling" in caplog.text
+        with file_watcher.pause([own_path]):
+            own_path.write_text("{}")
+        edited_path.write_text("x = 1\n")
+        assert eventually(lambda: str(edited_path) in dispatched)
+        # One more polling round, the own write would have been reported by now
+        time.sleep(1.5)
+    finally:
+        file_watcher.stop()
+        git_manager.close()
+    assert str(own_path) not in dispatched
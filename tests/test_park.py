@@ -0,0 +1,53 @@
+import os
+
+import pytest
+
+from tests.conftest import git
+from utils.constant import PARKED_REFS_PREFIX
+from utils.git_manager import GitManagerPython
+
+
+@pytest.fixture
+def git_manager(clone):
+    (clone / ".gitignore").write_text("build/\n")
+    git("add", ".gitignore", cwd=clone)
+    git("commit", "-q", "-m", "Ignore the builds", cwd=clone)
+    (clone / "run.sh").write_text("#!/bin/sh\necho run\n")
+    (clone / "run.sh").chmod(0o755)
+    (clone / "notes.txt").write_text("notes\n")
+    os.symlink("notes.txt", clone / "latest")
+    (clone / "build").mkdir()
+    (clone / "build" / "out.o").write_bytes(b"\x7fELF\0")
+    git_manager = GitManagerPython(clone, None, None, None)
+    yield git_manager
+    git_manager.close()
+
+
+def parked_paths(clone):
+    return [clone / "run.sh", clone / "notes.txt", clone / "latest", clone / "build" / "out.o"]
+
+
+def test_parked_files_are_restored_as_they_were(git_manager, clone):
+    assert sorted(git_manager.get_untracked_files()) == sorted(parked_paths(clone))
+    git_manager.park("untracked", parked_paths(clone))
+    for path in parked_paths(clone):
+        path.unlink()
+
+    assert sorted(git_manager.restore_parked("untracked")) == sorted(parked_paths(clone))
+    assert (clone / "run.sh").stat().st_mode & 0o111
+    assert os.readlink(clone / "latest") == "notes.txt"
+    assert (clone / "build" / "out.o").read_bytes() == b"\x7fELF\0"
+    assert git("for-each-ref", PARKED_REFS_PREFIX, cwd=clone) == ""
+    assert git_manager.restore_parked("untracked") is None
+
+
+def test_restore_skips_unchanged_files_and_keeps_the_new_ones(git_manager, clone):
+    git_manager.park("untracked", parked_paths(clone))
+    (clone / "run.sh").unlink()
+    (clone / "build" / "out.o").unlink()
+    (clone / "build" / "out.o").write_bytes(b"rebuilt")
+
+    assert git_manager.restore_parked("untracked") == [clone / "run.sh"]
+    assert (clone / "build" / "out.o").read_bytes() == b"rebuilt"
+    # The parked version of the conflicting file stays available
+    assert git("cat-file", "-p", f"{PARKED_REFS_PREFIX}untracked:build/out.o", cwd=clone) == "\x7fELF\0"
@@ -0,0 +1,73 @@
+import json
+
+import pytest
+
+from utils.push_scheduler import PushScheduler
+
+
+class FlakyPush:
+    def __init__(self, failures=0):
+        self.failures = failures
+        self.calls = []
+
+    def __call__(self, all, tags):
+        self.calls.append((all, tags))
+        if self.failures:
+            self.failures -= 1
+            raise OSError("network is unreachable")
+
+
+@pytest.fixture
+def outbox_path(tmp_path):
+    return tmp_path / "outbox.json"
+
+
+def test_requests_are_collapsed_into_one_push(outbox_path):
+    push = FlakyPush()
+    scheduler = PushScheduler(push, outbox_path, max_delay=60, max_commits=100)
+    scheduler.schedule(all=True)
+    scheduler.schedule(tags=True)
+    assert scheduler.flush(timeout=5)
+    scheduler.stop()
+    assert push.calls == [(True, True)]
+    assert not outbox_path.exists()
+
+
+def test_failed_push_is_retried(outbox_path):
+    push = FlakyPush(failures=2)
+    scheduler = PushScheduler(push, outbox_path, retry_delay=0.01)
+    scheduler.schedule(urgent=True)
+    assert scheduler.flush(timeout=5)
+    scheduler.stop()
+    assert len(push.calls) == 3
+    assert scheduler.failures == 2
+
+
+def test_unsent_push_is_resumed_by_the_next_session(outbox_path):
+    scheduler = PushScheduler(FlakyPush(failures=100), outbox_path, retry_delay=60)
+    scheduler.schedule(all=True, tags=True, urgent=True)
+    assert not scheduler.flush(timeout=0.2)
+    scheduler.stop()
+    assert json.loads(outbox_path.read_text())["tags"]
+
+    push = FlakyPush()
+    next_scheduler = PushScheduler(push, outbox_path)
+    next_scheduler.resume()
+    assert next_scheduler.flush(timeout=5)
+    next_scheduler.stop()
+    assert push.calls == [(True, True)]
+
+
+def test_unsent_push_is_kept_when_scheduling_before_resuming(outbox_path):
+    scheduler = PushScheduler(FlakyPush(failures=100), outbox_path, retry_delay=60)
+    scheduler.schedule(all=True, tags=True, urgent=True)
+    assert not scheduler.flush(timeout=0.2)
+    scheduler.stop()
+
+    push = FlakyPush()
+    next_scheduler = PushScheduler(push, outbox_path, max_delay=60)
+    next_scheduler.schedule(all=True)
+    next_scheduler.resume()
+    assert next_scheduler.flush(timeout=5)
+    next_scheduler.stop()
+    assert push.calls == [(True, True)]
@@ -0,0 +1,27 @@
+from prompt_toolkit.completion import CompleteEvent
+from prompt_toolkit.document import Document
+
+from utils.question_catalog import QuestionCatalog, QuestionCompleter
+
+QUESTIONS = ["tp3.ex1.q1", "tp3.ex2.q1", "tp3.ex2.q4", "tp3.ex10", "tp4.ex1.q1", "q1"]
+
+
+def complete(completer, text):
+    return [(completion.text, completion.display_meta_text)
+            for completion in completer.get_completions(Document(text), CompleteEvent())]
+
+
+def test_catalog_lists_the_next_part_of_the_ids():
+    catalog = QuestionCatalog(QUESTIONS)
+    assert len(catalog) == 6
+    assert "tp3.ex2.q4" in catalog and "q1" in catalog
+    assert "tp3.ex2" not in catalog and "tp3.ex2.q9" not in catalog
+    assert [text for text, _, _ in catalog.completions("tp3.ex1")] == ["tp3.ex1", "tp3.ex10"]
+    assert list(catalog.completions("tp5.")) == []
+    assert list(catalog.questions_under("tp3.ex2")) == ["tp3.ex2.q1", "tp3.ex2.q4"]
+
+
+def test_completer_marks_the_completed_questions():
+    completer = QuestionCompleter(QuestionCatalog(QUESTIONS), lambda question: question == "tp3.ex2.q1")
+    assert complete(completer, "tp") == [("tp3.", ""), ("tp4.", "")]
+    assert complete(completer, "tp3.ex2.") == [("tp3.ex2.q1", "done"), ("tp3.ex2.q4", "")]
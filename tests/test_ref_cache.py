@@ -0,0 +1,64 @@
+import time
+
+import pytest
+
+from tests.conftest import git
+from utils.git_manager import GitManagerPython
+
+
+@pytest.fixture
+def git_manager(clone):
+    git_manager = GitManagerPython(clone, None, None, None)
+    yield git_manager
+    git_manager.close()
+
+
+def eventually(predicate, timeout=5.0) -> bool:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if predicate():
+            return True
+        time.sleep(0.02)
+    return predicate()
+
+
+def test_external_git_commands_invalidate_the_cache(git_manager, clone):
+    branch = git_manager.get_current_branch()
+    assert git_manager.get_commit_id(branch) == git("rev-parse", "HEAD", cwd=clone)
+
+    git("commit", "-q", "--allow-empty", "-m", "External", cwd=clone)
+    assert eventually(lambda: git_manager.get_commit_id(branch) == git("rev-parse", "HEAD", cwd=clone))
+    assert eventually(lambda: git_manager.get_commit_id("HEAD") == git("rev-parse", "HEAD", cwd=clone))
+
+    git("checkout", "-q", "-b", "feature", cwd=clone)
+    assert eventually(lambda: git_manager.get_current_branch() == "feature" and git_manager.has_branch("feature"))
+
+    previous_commit = git("rev-parse", "HEAD~1", cwd=clone)
+    git("pack-refs", "--all", cwd=clone)
+    git("update-ref", "refs/heads/feature", previous_commit, cwd=clone)
+    assert eventually(lambda: git_manager.get_commit_id("feature") == previous_commit)
+
+
+def test_own_writes_are_cache_hits(git_manager, clone):
+    (clone / "a.txt").write_text("a\n")
+    commit_id = git_manager.snapshot_commit("[created] a.txt", "auto", [clone / "a.txt"])
+    # The watch reports the write of the manager itself, which must leave the cache as it is
+    time.sleep(0.3)
+    misses = git_manager.refs.misses
+    assert git_manager.get_commit_id("auto") == commit_id
+    assert git_manager.get_commit_id("refs/heads/auto") == commit_id
+    assert git_manager.refs.misses == misses and git_manager.refs.hits >= 2
+
+
+def test_fetch_invalidates_the_remote_branches(git_manager, clone, monkeypatch):
+    git("clone", "-q", f"file://{clone.parent / 'remote.git'}", "other", cwd=clone.parent)
+    git("-c", "user.email=a@b", "-c", "user.name=Other", "commit", "-q", "--allow-empty", "-m", "Remote",
+        cwd=clone.parent / "other")
+    git("push", "-q", cwd=clone.parent / "other")
+    branch = git_manager.get_current_branch()
+    git_manager.get_commit_id(f"origin/{branch}")
+
+    # The watch may report the fetched refs late, the cache must not wait for it
+    monkeypatch.setattr(git_manager.refs, "dispatch", lambda event: None)
+    git_manager.fetch()
+    assert git_manager.get_commit_id(f"origin/{branch}") == git("rev-parse", "HEAD", cwd=clone.parent / "other")
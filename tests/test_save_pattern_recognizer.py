@@ -0,0 +1,16 @@
+from pathlib import Path
+
+from utils.event_coalescer import CREATED, MODIFIED, MOVED
+from utils.save_pattern_recognizer import SavePatternRecognizer
+
+
+def test_student_tmp_files_are_not_temporary():
+    recognizer = SavePatternRecognizer()
+    assert recognizer.recognize(CREATED, Path("results.tmp")) == [(CREATED, Path("results.tmp"), None)]
+    assert recognizer.recognize(MOVED, Path("a.py"), Path("a.tmp")) == [(MOVED, Path("a.py"), Path("a.tmp"))]
+
+
+def test_editor_swap_files_are_temporary():
+    recognizer = SavePatternRecognizer()
+    assert recognizer.recognize(CREATED, Path(".a.py.swp")) == []
+    assert recognizer.recognize(MOVED, Path("a.py"), Path("a.py___jb_tmp___")) == [(MODIFIED, Path("a.py"), None)]
@@ -0,0 +1,39 @@
+from tests.conftest import git
+from utils.constant import DATA_FILE_NAME
+from utils.data_file_manager import JournalDataFileManager
+from utils.file_manager import FileManagerGlob
+from utils.file_watcher import FileWatcherWatchdogOneBranch
+from utils.git_manager import GitManagerPython
+from utils.session_manager import SessionManager
+
+
+def open_workspace(clone):
+    file_manager = FileManagerGlob()
+    git_manager = GitManagerPython(clone, None, None, None)
+    file_watcher = FileWatcherWatchdogOneBranch(clone, git_manager, file_manager)
+    data_file_manager = JournalDataFileManager(file_manager, clone / DATA_FILE_NAME, ["q1"])
+    return SessionManager(git_manager, data_file_manager, file_manager, file_watcher), file_watcher
+
+
+def test_nothing_is_caught_up_after_the_workspace_was_closed(clone):
+    (clone / "tp1").mkdir()
+    (clone / "tp1" / "main.py").write_text("print('hello')\n")
+    git("add", "tp1/main.py", cwd=clone)
+    git("commit", "-q", "-m", "Exercise", cwd=clone)
+    (clone / "tp1" / "notes.txt").write_text("untracked\n")
+    session_manager, file_watcher = open_workspace(clone)
+    session_manager.open_session(str(clone / "lawg.py"), str(clone))
+    session_manager.close_session(str(clone), str(clone / "lawg.py"))
+    session_manager.file_manager.reaper.join(timeout=10)
+    assert not (clone / "tp1").exists()
+
+    session_manager, file_watcher = open_workspace(clone)
+    caught_up = []
+    file_watcher.event_handler.dispatch = caught_up.append
+    try:
+        session_manager.open_session(str(clone / "lawg.py"), str(clone))
+    finally:
+        session_manager.git_manager.close()
+    assert (clone / "tp1" / "main.py").read_text() == "print('hello')\n"
+    assert (clone / "tp1" / "notes.txt").read_text() == "untracked\n"
+    assert caught_up == []
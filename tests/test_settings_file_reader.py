@@ -17,3 +17,20 @@ def test_set_valid_repo_path(yaml_sfr):
 def test_set_invalid_repo_path(yaml_sfr):
     with pytest.raises(ValueError):
         yaml_sfr.repo_path = "5:/ert/trgr/tgez/README.md"
+
+
+def test_reload_swaps_valid_settings_in_and_tells_the_listeners(yaml_sfr, tmp_path):
+    settings_path = tmp_path / ".settings.yml"
+    settings_path.write_text("questions: [q1]\ngroups: [g1]\n")
+    yaml_sfr.load_settings(settings_path)
+    changes = []
+    yaml_sfr.add_listener(lambda previous, current: changes.append((previous.questions, current.questions)))
+
+    settings_path.write_text("questions: [q1, q2]\ngroups: [g1]\nsave_patterns: 3\n")
+    assert not yaml_sfr.reload_settings()
+    assert yaml_sfr.questions == ["q1"]
+
+    settings_path.write_text("questions: [q1, q2]\ngroups: [g1]\n")
+    assert yaml_sfr.reload_settings()
+    assert not yaml_sfr.reload_settings()
+    assert changes == [(["q1"], ["q1", "q2"])]
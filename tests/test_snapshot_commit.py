@@ -0,0 +1,69 @@
+import pytest
+from git import GitCommandError
+
+from tests.conftest import git
+from utils.git_manager import GitManagerInProcess, GitManagerPython
+
+
+@pytest.fixture(params=[GitManagerPython, GitManagerInProcess], ids=["subprocess", "in-process"])
+def git_manager(request, clone):
+    (clone / "a.txt").write_text("a\n")
+    (clone / "b.txt").write_text("b\n")
+    git("add", "a.txt", "b.txt", cwd=clone)
+    git("commit", "-q", "-m", "Exercise", cwd=clone)
+    git_manager = request.param(clone, None, None, None)
+    yield git_manager
+    git_manager.close()
+
+
+def tree(clone, ref) -> dict:
+    return dict(line.split("\t")[::-1] for line in git("ls-tree", "-r", ref, cwd=clone).splitlines())
+
+
+def test_snapshots_leave_head_and_the_index_alone(git_manager, clone):
+    head, index = git("rev-parse", "HEAD", cwd=clone), (clone / ".git" / "index").read_bytes()
+    (clone / "a.txt").write_text("a2\n")
+    (clone / "c.txt").write_text("c\n")
+
+    git_manager.snapshot_commit("[created] c.txt", "auto", [clone / "c.txt"])
+    git_manager.snapshot_commit("[modified] a.txt", "auto", [clone / "a.txt"])
+    (clone / "c.txt").write_text("c2\n")
+    git_manager.snapshot_commit("[modified] c.txt", "auto", [clone / "c.txt"], amend=True)
+    (clone / "b.txt").rename(clone / "d.txt")
+    git_manager.snapshot_commit("[renamed] b.txt → d.txt", "auto", [clone / "b.txt", clone / "d.txt"])
+
+    assert git("rev-parse", "HEAD", cwd=clone) == head
+    assert (clone / ".git" / "index").read_bytes() == index
+    assert [line.strip() for line in git("status", "--porcelain", cwd=clone).splitlines()] == \
+           ["M a.txt", "D b.txt", "?? c.txt", "?? d.txt"]
+    assert git("log", "--format=%s", "auto", cwd=clone).splitlines()[:3] == \
+           ["[renamed] b.txt → d.txt", "[modified] c.txt", "[created] c.txt"]
+    files = tree(clone, "auto")
+    assert sorted(files) == ["a.txt", "c.txt", "d.txt"]
+    assert files["d.txt"] == tree(clone, "HEAD")["b.txt"]
+    assert git("cat-file", "-p", "auto:c.txt", cwd=clone) == "c2"
+    assert git("cat-file", "-p", "auto:a.txt", cwd=clone) == "a2"
+
+
+def test_concurrent_branch_move_is_not_overwritten(git_manager, clone):
+    (clone / "a.txt").write_text("a2\n")
+    git_manager.snapshot_commit("[modified] a.txt", "auto", [clone / "a.txt"])
+    external_commits = []
+    get_commit_id = git_manager.get_commit_id
+
+    def get_commit_id_then_move(ref="HEAD"):
+        # The branch is moved by another git process every time the manager has read it
+        commit_id = get_commit_id(ref)
+        if ref == "refs/heads/auto":
+            message = f"External {len(external_commits)}"
+            external_commit = git("commit-tree", "HEAD^{tree}", "-p", "HEAD", "-m", message, cwd=clone)
+            git("update-ref", "refs/heads/auto", external_commit, cwd=clone)
+            external_commits.append(external_commit)
+        return commit_id
+
+    git_manager.get_commit_id = get_commit_id_then_move
+    (clone / "a.txt").write_text("a3\n")
+    with pytest.raises(GitCommandError):
+        git_manager.snapshot_commit("[modified] a.txt", "auto", [clone / "a.txt"])
+    assert git("rev-parse", "auto", cwd=clone) == external_commits[-1]
+    assert not (clone / ".git" / "refs" / "heads" / "auto.lock").exists()
@@ -0,0 +1,36 @@
+import time
+
+from utils.status_channel import StatusChannel
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 100.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_redraws_are_throttled_to_the_frame_rate():
+    redraws = []
+    channel = StatusChannel(frame_rate=20, redraw=lambda: redraws.append(time.monotonic()))
+    for i in range(50):
+        channel.publish(f"[modified] file{i}.py")
+    assert len(redraws) == 1
+    time.sleep(0.2)
+    assert len(redraws) == 2
+    channel.close()
+
+
+def test_summary_counts_the_saves_of_the_window():
+    clock = FakeClock()
+    channel = StatusChannel(summary_window=5, redraw=lambda: None, clock=clock)
+    assert channel.summary() == "Workspace opened"
+    for i in range(12):
+        channel.publish(f"[batch] 2 files\n[modified] file{i}.py")
+        clock.now += 0.1
+    channel.publish("Fix q1", save=False)
+    assert channel.summary() == "12 saves in the last 5s, last: Fix q1"
+    clock.now += 5
+    assert channel.summary() == "Fix q1"
+    channel.close()
@@ -0,0 +1,114 @@
+import time
+from pathlib import Path, PurePosixPath
+
+import pytest
+
+from tests.conftest import git
+from utils.file_manager import FileManagerGlob
+from utils.file_watcher import FileWatcherWatchdogOneBranch
+from utils.git_manager import GitManagerPython
+from utils.watch_scope import WatchScope, literal_prefix
+
+
+class IgnoredFolders:
+    def __init__(self, *folders):
+        self.folders = set(folders)
+
+    def is_ignored(self, path) -> bool:
+        return Path(path).name in self.folders
+
+
+@pytest.fixture
+def workspace(tmp_path):
+    for folder in ("tp1/src/deep", "tp1/node_modules/lib", "tp2", "build", "notes"):
+        (tmp_path / folder).mkdir(parents=True)
+    return tmp_path
+
+
+def eventually(predicate, timeout=5.0) -> bool:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if predicate():
+            return True
+        time.sleep(0.02)
+    return predicate()
+
+
+def test_literal_prefix():
+    assert literal_prefix("tp1/src/**/*.py") == PurePosixPath("tp1/src")
+    assert literal_prefix("/tp1/") == PurePosixPath(".")
+    assert literal_prefix("tp*/main.py") == PurePosixPath(".")
+    assert literal_prefix("*.py") == PurePosixPath(".")
+
+
+def test_pruned_folders(workspace):
+    scope = WatchScope(workspace, IgnoredFolders("build"))
+    assert scope.is_pruned(workspace / ".git")
+    assert scope.is_pruned(workspace / "tp1" / "node_modules")
+    assert scope.is_pruned(workspace / "build")
+    assert not scope.is_pruned(workspace / "tp1")
+    assert not scope.accepts(workspace / "tp1" / "node_modules" / "lib" / "index.js")
+    assert scope.accepts(workspace / "tp1" / "main.py")
+    assert not scope.accepts(Path("/elsewhere/main.py"))
+
+
+def test_include_and_exclude(workspace):
+    scope = WatchScope(workspace, IgnoredFolders(), include=["tp1/src/**/*.py"], exclude=["deep/"])
+    # The ancestors of an included folder are kept so that the watch can reach it
+    assert not scope.is_pruned(workspace / "tp1")
+    assert not scope.is_pruned(workspace / "tp1" / "src")
+    assert scope.is_pruned(workspace / "tp1" / "src" / "deep")
+    assert scope.is_pruned(workspace / "tp2")
+    assert scope.accepts(workspace / "tp1" / "src" / "main.py")
+    assert not scope.accepts(workspace / "tp1" / "src" / "notes.txt")
+    assert not scope.accepts(workspace / "tp1" / "main.py")
+    assert not scope.accepts(workspace / "tp1" / "src" / "deep" / "main.py")
+
+
+def test_listdir_and_walk_skip_pruned_folders(workspace):
+    (workspace / "tp1" / "main.py").write_text("x = 1\n")
+    (workspace / "tp1" / "node_modules" / "lib" / "index.js").write_text("")
+    (workspace / "build" / "out.o").write_text("")
+    scope = WatchScope(workspace, IgnoredFolders("build"))
+    assert sorted(scope.listdir(workspace)) == ["notes", "tp1", "tp2"]
+    assert sorted(scope.listdir(workspace / "tp1")) == ["main.py", "src"]
+    assert sorted(scope.top_level_folders()) == [workspace / "notes", workspace / "tp1", workspace / "tp2"]
+    assert list(scope.walk_files(workspace)) == [workspace / "tp1" / "main.py"]
+
+
+def test_top_level_folders_get_their_own_watch(clone):
+    (clone / "tp1").mkdir()
+    (clone / "node_modules").mkdir()
+    (clone / ".gitignore").write_text("build/\n")
+    git("add", ".gitignore", cwd=clone)
+    git("commit", "-q", "-m", "Ignore build", cwd=clone)
+    git_manager = GitManagerPython(clone, None, None, None)
+    file_watcher = FileWatcherWatchdogOneBranch(clone, git_manager, FileManagerGlob(), backend="native")
+    added = []
+    file_watcher.coalescer.add = lambda kind, path, src_path=None: added.append(path)
+    try:
+        file_watcher.start()
+        if file_watcher.observer.is_polling:
+            pytest.skip("no kernel watches on this platform")
+        assert set(file_watcher._folder_watches) == {clone / "tp1"}
+
+        # Files written before the watch of a new folder is registered are caught up
+        (clone / "tp2" / "src").mkdir(parents=True)
+        (clone / "tp2" / "src" / "main.py").write_text("x = 1\n")
+        (clone / "build").mkdir()
+        assert eventually(lambda: clone / "tp2" in file_watcher._folder_watches)
+        assert eventually(lambda: clone / "tp2" / "src" / "main.py" in added)
+        (clone / "tp2").rename(clone / "tp3")
+        assert eventually(lambda: set(file_watcher._folder_watches) == {clone / "tp1", clone / "tp3"})
+        (clone / "tp3" / "src" / "main.py").unlink()
+        (clone / "tp3" / "src").rmdir()
+        (clone / "tp3").rmdir()
+        assert eventually(lambda: set(file_watcher._folder_watches) == {clone / "tp1"})
+
+        (clone / "tp4").mkdir()
+        assert eventually(lambda: clone / "tp4" in file_watcher._folder_watches)
+        file_watcher.update_settings(watch_scope={"include": ["tp4/**"]})
+        assert set(file_watcher._folder_watches) == {clone / "tp4"}
+    finally:
+        file_watcher.stop()
+        git_manager.close()
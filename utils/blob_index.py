@@ -0,0 +1,109 @@
+import hashlib
+import os
+import stat
+import threading
+from pathlib import Path
+from typing import Optional
+
+CHUNK_SIZE = 1024 * 1024
+
+
+def hash_file(path, size: int = None) -> str:
+    """
+    Computes the git blob id of a file without loading it in memory, as `git hash-object` would.
+    """
+    path = Path(path)
+    status = os.lstat(path)
+    if stat.S_ISLNK(status.st_mode):
+        content = os.fsencode(os.readlink(path))
+        return hashlib.sha1(b"blob %d\0" % len(content) + content).hexdigest()
+    size = status.st_size if size is None else size
+    sha1 = hashlib.sha1(b"blob %d\0" % size)
+    with open(path, "rb") as file:
+        for chunk in iter(lambda: file.read(CHUNK_SIZE), b""):
+            sha1.update(chunk)
+    return sha1.hexdigest()
+
+
+class BlobIndex:
+    """
+    Remembers the blob id and size committed on `ref` for every path the watcher has seen, so that a change can be
+    told apart from a no-op by hashing the affected file only.
+    """
+
+    def __init__(self, git_manager, repo_path, ref: str = "HEAD"):
+        self.git_manager = git_manager
+        self.repo_path = Path(repo_path)
+        self.ref = ref
+        self._committed = {}
+        self._seen = {}
+        self._tip = None
+        self._lock = threading.Lock()
+        self.has_content_filters = git_manager.has_content_filters()
+
+    def committed(self, path) -> Optional[tuple[str, int]]:
+        """
+        :return: the blob id and size of the path on the reference, None if it is not tracked
+        """
+        key = self.__key(path)
+        with self._lock:
+            self.__sync()
+            if key not in self._committed:
+                self._committed[key] = self.git_manager.get_committed_blob(path, self.ref)
+            return self._committed[key]
+
+    def current(self, path) -> Optional[tuple[str, int]]:
+        """
+        :return: the blob id and size of the path in the working tree, None if it does not exist
+        """
+        try:
+            size = os.lstat(path).st_size
+            return self.__hash(path, size), size
+        except (FileNotFoundError, NotADirectoryError):
+            return None
+
+    def is_unchanged(self, path) -> bool:
+        committed = self.committed(path)
+        key = self.__key(path)
+        try:
+            size = os.lstat(path).st_size
+        except (FileNotFoundError, NotADirectoryError):
+            self._seen[key] = None
+            return committed is None
+        # Different sizes cannot be the same content, no need to read the file (unless git converts it)
+        if committed is None or (committed[1] != size and not self.has_content_filters):
+            self._seen.pop(key, None)
+            return False
+        blob_id = self.__hash(path, size)
+        self._seen[key] = (blob_id, committed[1] if blob_id == committed[0] else size)
+        return blob_id == committed[0]
+
+    def record(self, paths: list, commit_id: str = None):
+        """
+        Marks the paths as committed as they were last hashed, `commit_id` being the new tip of the reference. The paths
+        not hashed beforehand are looked up on the reference the next time.
+        """
+        with self._lock:
+            for path in paths:
+                key = self.__key(path)
+                if key in self._seen:
+                    self._committed[key] = self._seen.pop(key)
+                else:
+                    # Hashing now could pick up a save made after the commit, the blob is read from the tip instead
+                    self._committed.pop(key, None)
+            self._tip = commit_id or self.git_manager.get_commit_id(self.ref)
+
+    def __hash(self, path, size: int) -> str:
+        # Converted files (e.g. autocrlf) have to be hashed by git to match what it stores
+        return self.git_manager.hash_object(path) if self.has_content_filters else hash_file(path, size)
+
+    def __sync(self):
+        # Commits made behind our back (fix, resume, ...) make every remembered id suspect
+        tip = self.git_manager.get_commit_id(self.ref)
+        if tip != self._tip:
+            self._committed.clear()
+            self._tip = tip
+
+    def __key(self, path) -> str:
+        path = Path(path)
+        return (path.relative_to(self.repo_path) if path.is_absolute() else path).as_posix()
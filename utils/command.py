@@ -10,11 +10,12 @@ from prompt_toolkit.validation import ValidationError
 from prompt_toolkit.widgets import Dialog, Button, Label
 
 from utils import Object
-from utils.constant import AUTO_BRANCH, NO_FIX_LIMITATION, NO_AUTO_BRANCH
+from utils.constant import AUTO_BRANCH, NO_FIX_LIMITATION, NO_AUTO_BRANCH, PUSH_FLUSH_TIMEOUT
 from utils.data_file_manager import DataFileManagerInterface
 from utils.file_manager import FileManagerGlob
 from utils.file_watcher import FileWatcherInterface
 from utils.git_manager import GitManagerInterface
+from utils.question_catalog import QuestionCatalog, QuestionCompleter
 from utils.session_manager import SessionManagerInterface
 from utils.spinner import Spinner
 
@@ -40,6 +41,12 @@ class CommandInterface(ABC):
         if not re.match(self.regex, args):
             raise ValidationError(message='This command is unknown.')
 
+    def update_questions(self, questions):
+        """
+        Called when the questions of the settings file change.
+        """
+        pass
+
     def execute(self, args):
         with Spinner():
             self._execute(args)
@@ -58,24 +65,35 @@ class FixCommand(CommandInterface):
         self.git_manager = git_manager
         self.data_file_manager = data_file_manager
         self.file_watcher = file_watcher
-        questions_regex = f"({'|'.join(self.questions)})"
-        regex = r'fix .*$' if NO_FIX_LIMITATION else rf'fix *{questions_regex} *$'
+        # Built once, the completion and the validation of a question then only depend on the length of its id
+        self.catalog = QuestionCatalog(self.questions)
+        regex = r'fix .*$' if NO_FIX_LIMITATION else r'fix +(\S+) *$'
 
-        questions_dict = dict.fromkeys(self.questions, None)
         command = {
-            'fix': questions_dict
+            'fix': QuestionCompleter(self.catalog, self.data_file_manager.is_completed)
         }
         super().__init__(command, regex)
 
+    def validate(self, args):
+        super().validate(args)
+        if not NO_FIX_LIMITATION and re.match(self.regex, args).group(1) not in self.catalog:
+            raise ValidationError(message='This question is unknown.')
+
+    def update_questions(self, questions):
+        # Swapped whole, a completion running meanwhile goes on with the previous catalog
+        catalog = QuestionCatalog(questions)
+        self.questions = questions
+        self.catalog = catalog
+        self.command['fix'].catalog = catalog
+
     def _execute(self, args):
-        with self.file_watcher.pause():
+        with self.file_watcher.pause([self.data_file_manager.data_file_path]):
             commit_message = f"Fix {args}"
 
             self.data_file_manager.complete_question(args)
 
-            self.git_manager.duplicate_commit(commit_message, AUTO_BRANCH, allow_empty=True)
-            self.file_watcher.last_message = commit_message
-            get_app().invalidate()
+            self.git_manager.run(self.git_manager.duplicate_commit, commit_message, AUTO_BRANCH, allow_empty=True)
+            self.file_watcher.status.publish(commit_message, save=False)
 
 
 class FixCommandOneBranch(FixCommand):
@@ -90,14 +108,19 @@ class FixCommandOneBranch(FixCommand):
         super().execute(arguments)
 
     def _execute(self, args):
-        with self.file_watcher.pause():
+        with self.file_watcher.pause([self.data_file_manager.data_file_path]):
             commit_message = f"Fix {args['question']}\nD={args['perceived_difficulty']}\nE={args['perceived_emotions']}"
-            self.data_file_manager.complete_question(args)
-            self.git_manager.add_all()
-            self.git_manager.commit(commit_message, allow_empty=True)
-            self.git_manager.push(all=True)
-            self.file_watcher.last_message = commit_message
-            get_app().invalidate()
+            self.data_file_manager.complete_question(args['question'], {
+                'perceived_difficulty': args['perceived_difficulty'],
+                'perceived_emotions': args['perceived_emotions']
+            })
+            self.git_manager.run(self.__commit_fix, commit_message)
+            self.file_watcher.status.publish(commit_message, save=False)
+
+    def __commit_fix(self, commit_message: str):
+        self.git_manager.add_all()
+        self.git_manager.commit(commit_message, allow_empty=True)
+        self.git_manager.schedule_push(all=True, urgent=True)
 
 
 class FinishCommand(CommandInterface):
@@ -117,16 +140,20 @@ class FinishCommand(CommandInterface):
             super().execute(args)
 
     def _execute(self, args):
+        self.git_manager.run(self.__commit_finish)
+        if not self.git_manager.flush_pushes(PUSH_FLUSH_TIMEOUT):
+            print("Your work could not be sent yet, it will be sent the next time LAWG is launched.")
+        exit()
+
+    def __commit_finish(self):
         commit_message = f"Finish"
         if NO_AUTO_BRANCH:
             self.git_manager.add_all()
             self.git_manager.commit(commit_message, allow_empty=True)
             self.git_manager.tag("v1.0.0")
-            self.git_manager.push(all=True)
-            self.git_manager.push(tags=True)
+            self.git_manager.schedule_push(all=True, tags=True, urgent=True)
         else:
             self.git_manager.duplicate_commit(commit_message, AUTO_BRANCH, allow_empty=True)
-        exit()
 
 
 class ExitCommand(CommandInterface):
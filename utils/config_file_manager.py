@@ -1,12 +1,19 @@
+import logging
+import os
+import threading
 from abc import ABC, abstractmethod
 from pathlib import Path
 
 import yaml
-from prompt_toolkit.shortcuts import input_dialog, radiolist_dialog
+from watchdog.events import FileSystemEventHandler
+from watchdog.observers import Observer
 
 from . import verify_path, get_missing_fields_in_dict
-from .constant import REPO_PATH
+from .constant import REPO_PATH, COALESCE_QUIET_PERIOD, COALESCE_MAX_DELAY, COALESCE_MAX_BATCH, SAVE_PATTERNS, \
+    GIT_ENGINE, SETTINGS_RELOAD_DELAY, STATUS_FRAME_RATE, STATUS_SUMMARY_WINDOW
 from .file_manager import FileManagerInterface
+from .file_policy import LargeFilePolicy
+from .git_manager import GIT_ENGINES
 
 
 class Config:
@@ -17,6 +24,15 @@ class Config:
         self._groups = None
         self._pat = None
         self._nickname = None
+        self._coalescing = {"quiet_period": COALESCE_QUIET_PERIOD,
+                            "max_delay": COALESCE_MAX_DELAY,
+                            "max_batch": COALESCE_MAX_BATCH}
+        self._save_patterns = SAVE_PATTERNS
+        self._large_files = {}
+        self._watch = {}
+        self._git_engine = GIT_ENGINE
+        self._status = {"frame_rate": STATUS_FRAME_RATE,
+                        "summary_window": STATUS_SUMMARY_WINDOW}
 
     @property
     def nickname(self):
@@ -59,9 +75,79 @@ class Config:
     def questions(self, value):
         self._questions = value
 
+    @property
+    def coalescing(self):
+        return self._coalescing
+
+    @coalescing.setter
+    def coalescing(self, value):
+        unknown_fields = [field for field in value if field not in self._coalescing]
+        if unknown_fields:
+            raise ValueError(f"Unknown coalescing settings: {', '.join(unknown_fields)}")
+        for field, number in value.items():
+            if not isinstance(number, (int, float)) or number <= 0:
+                raise ValueError(f"The coalescing setting '{field}' must be a positive number.")
+        self._coalescing = {**self._coalescing, **value}
+
+    @property
+    def save_patterns(self):
+        return self._save_patterns
+
+    @save_patterns.setter
+    def save_patterns(self, value):
+        if not isinstance(value, list) or not all(isinstance(pattern, str) for pattern in value):
+            raise ValueError("The setting 'save_patterns' must be a list of file name patterns.")
+        self._save_patterns = value
+
+    @property
+    def large_files(self):
+        return self._large_files
+
+    @large_files.setter
+    def large_files(self, value):
+        # Validated by building the policy it configures
+        LargeFilePolicy(self.repo_path, **value)
+        self._large_files = value
+
+    @property
+    def watch(self):
+        return self._watch
+
+    @watch.setter
+    def watch(self, value):
+        if not isinstance(value, dict) or not set(value) <= {"include", "exclude"} or not all(
+                isinstance(patterns, list) and all(isinstance(pattern, str) for pattern in patterns)
+                for patterns in value.values()):
+            raise ValueError("The setting 'watch' accepts 'include' and 'exclude' lists of path patterns.")
+        self._watch = value
+
+    @property
+    def status(self):
+        return self._status
+
+    @status.setter
+    def status(self, value):
+        unknown_fields = [field for field in value if field not in self._status]
+        if unknown_fields:
+            raise ValueError(f"Unknown status settings: {', '.join(unknown_fields)}")
+        for field, number in value.items():
+            if not isinstance(number, (int, float)) or number <= 0:
+                raise ValueError(f"The status setting '{field}' must be a positive number.")
+        self._status = {**self._status, **value}
+
+    @property
+    def git_engine(self):
+        return self._git_engine
+
+    @git_engine.setter
+    def git_engine(self, value):
+        if value not in GIT_ENGINES:
+            raise ValueError(f"The setting 'git_engine' must be one of the following: {list(GIT_ENGINES)!r}.")
+        self._git_engine = value
+
     @property
     def ssh_path(self):
-        return str(self._ssh_path)
+        return str(self._ssh_path) if self._ssh_path is not None else None
 
     @ssh_path.setter
     def ssh_path(self, value):
@@ -69,10 +155,54 @@ class Config:
         self._ssh_path = path.resolve(strict=True)
 
 
+class SettingsWatcher(FileSystemEventHandler):
+    """
+    Calls `reload` once the writes to the settings file settle, editors often writing it in several steps.
+    """
+
+    def __init__(self, config_path, reload, delay: float = SETTINGS_RELOAD_DELAY):
+        self.config_path = Path(config_path).resolve()
+        self.reload = reload
+        self.delay = delay
+        self._observer = None
+        self._timer = None
+        self._lock = threading.Lock()
+
+    def start(self):
+        try:
+            observer = Observer()
+            observer.schedule(self, str(self.config_path.parent), recursive=False)
+            observer.start()
+            self._observer = observer
+        except OSError as e:
+            logging.warning(f"Cannot watch '{self.config_path}' ({e}), LAWG has to be restarted to apply its changes.")
+
+    def stop(self):
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+        if self._observer is not None:
+            self._observer.stop()
+            self._observer.join()
+            self._observer = None
+
+    def on_any_event(self, event):
+        paths = (event.src_path, getattr(event, "dest_path", None))
+        if not any(path and Path(os.fsdecode(path)) == self.config_path for path in paths):
+            return
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+            self._timer = threading.Timer(self.delay, self.reload)
+            self._timer.daemon = True
+            self._timer.start()
+
+
 class ConfigFileManagerInterface(ABC):
     def __init__(self, file_manager: FileManagerInterface):
         self.config = Config()
         self.file_manager = file_manager
+        self.listeners = []
 
     @abstractmethod
     def load_settings(self, config_path) -> Config:
@@ -83,6 +213,38 @@ class ConfigFileManagerInterface(ABC):
         """
         pass
 
+    @abstractmethod
+    def reload_settings(self) -> bool:
+        """
+        Reads the config file again and swaps the new settings in if they are valid, the listeners being then told.
+        :return: whether the settings changed
+        """
+        pass
+
+    @abstractmethod
+    def watch_settings(self):
+        """
+        Reloads the settings whenever the config file is written, until `stop_watching_settings`.
+        """
+        pass
+
+    @abstractmethod
+    def stop_watching_settings(self):
+        pass
+
+    def add_listener(self, listener):
+        """
+        :param listener: called with the previous and the new `Config` on every reload that changes the settings
+        """
+        self.listeners.append(listener)
+
+    def _notify(self, previous: Config, config: Config):
+        for listener in self.listeners:
+            try:
+                listener(previous, config)
+            except Exception as e:
+                logging.error(f"Cannot apply the new settings: {e}")
+
     @abstractmethod
     def load_auth_settings(self, auth_config_path) -> Config:
         """
@@ -131,9 +293,57 @@ class ConfigFileManagerInterface(ABC):
     def questions(self, value):
         self.config.questions = value
 
+    @property
+    def coalescing(self):
+        return self.config.coalescing
+
+    @coalescing.setter
+    def coalescing(self, value):
+        self.config.coalescing = value
+
+    @property
+    def save_patterns(self):
+        return self.config.save_patterns
+
+    @save_patterns.setter
+    def save_patterns(self, value):
+        self.config.save_patterns = value
+
+    @property
+    def large_files(self):
+        return self.config.large_files
+
+    @large_files.setter
+    def large_files(self, value):
+        self.config.large_files = value
+
+    @property
+    def watch(self):
+        return self.config.watch
+
+    @watch.setter
+    def watch(self, value):
+        self.config.watch = value
+
+    @property
+    def status(self):
+        return self.config.status
+
+    @status.setter
+    def status(self, value):
+        self.config.status = value
+
+    @property
+    def git_engine(self):
+        return self.config.git_engine
+
+    @git_engine.setter
+    def git_engine(self, value):
+        self.config.git_engine = value
+
     @property
     def ssh_path(self):
-        return str(self.config.ssh_path)
+        return self.config.ssh_path
 
     @ssh_path.setter
     def ssh_path(self, value):
@@ -158,25 +368,82 @@ class ConfigFileManagerInterface(ABC):
 
 
 class YAMLConfigFileManager(ConfigFileManagerInterface):
+    # The settings applied by a reload, the others only at the next launch
+    RELOADED_FIELDS = ["_questions", "_groups", "_coalescing", "_save_patterns", "_large_files", "_watch",
+                       "_status"]
+
+    def __init__(self, file_manager: FileManagerInterface):
+        super().__init__(file_manager)
+        self.config_path = None
+        self.settings_watcher = None
+
     def load_settings(self, config_path):
         try:
             config_path = verify_path(config_path)
         except ValueError as ve:
             self.create_config_file(config_path)
 
-        settings_file = open(config_path, "r")
-        settings = yaml.load(settings_file, Loader=yaml.FullLoader)
+        self.config = self.__parse_settings(config_path)
+        self.config_path = Path(config_path).resolve()
+
+        return self
+
+    def reload_settings(self):
+        try:
+            config = self.__parse_settings(self.config_path)
+        except (ValueError, KeyError, OSError, yaml.YAMLError) as e:
+            logging.warning(f"The settings file is not reloaded, the current settings are kept: {e}")
+            return False
+        if config.git_engine != self.config.git_engine:
+            logging.warning("The setting 'git_engine' will only be applied the next time LAWG is launched.")
+            config.git_engine = self.config.git_engine
+        if all(getattr(config, field) == getattr(self.config, field) for field in self.RELOADED_FIELDS):
+            return False
+        # Swapped in one assignment, readers see either the previous settings or the new ones
+        previous, self.config = self.config, config
+        logging.info(f"Settings reloaded from '{self.config_path}'.")
+        self._notify(previous, config)
+        return True
+
+    def watch_settings(self):
+        if self.settings_watcher is None:
+            self.settings_watcher = SettingsWatcher(self.config_path, self.reload_settings)
+            self.settings_watcher.start()
+
+    def stop_watching_settings(self):
+        if self.settings_watcher is not None:
+            self.settings_watcher.stop()
+            self.settings_watcher = None
+
+    def __parse_settings(self, config_path) -> Config:
+        """
+        :return: a new config holding the settings of the file, which are all validated, and the current other ones
+        """
+        with open(config_path, "r") as settings_file:
+            settings = yaml.load(settings_file, Loader=yaml.FullLoader)
+        if not isinstance(settings, dict):
+            raise KeyError(f"The settings file '{config_path}' does not hold any setting.")
         fields_list = ["questions", "groups"]
         missing_fields = get_missing_fields_in_dict(fields_list, settings)
         if missing_fields:
             raise KeyError(f"Following fields are missing from the settings file : {', '.join(missing_fields)}")
-        else:
-            self.questions = settings["questions"]
-            self.groups = settings["groups"]
-
-        settings_file.close()
 
-        return self
+        config = Config()
+        for field, value in vars(self.config).items():
+            if field not in self.RELOADED_FIELDS:
+                setattr(config, field, value)
+        config.questions = settings["questions"]
+        config.groups = settings["groups"]
+        config.coalescing = settings.get("coalescing") or {}
+        config.save_patterns = settings.get("save_patterns", SAVE_PATTERNS)
+        try:
+            config.large_files = settings.get("large_files") or {}
+        except TypeError as e:
+            raise ValueError(f"Invalid large_files settings: {e}")
+        config.watch = settings.get("watch") or {}
+        config.status = settings.get("status") or {}
+        config.git_engine = settings.get("git_engine", GIT_ENGINE)
+        return config
 
     def load_auth_settings(self, auth_config_path):
         try:
@@ -231,6 +498,8 @@ class YAMLConfigFileManager(ConfigFileManagerInterface):
             yaml.dump(data, file)
 
     def ask_nickname(self) -> str:
+        from prompt_toolkit.shortcuts import input_dialog
+
         nickname = input_dialog(
             title='Creation of the config file',
             text='Please enter your Github nickname: ').run()
@@ -238,6 +507,8 @@ class YAMLConfigFileManager(ConfigFileManagerInterface):
         return nickname
 
     def ask_ssh_key(self) -> str:
+        from prompt_toolkit.shortcuts import input_dialog
+
         ssh_key = input_dialog(
             title='Creation of the config file',
             text='Please enter your ssh key path (absolute): ').run()
@@ -245,6 +516,8 @@ class YAMLConfigFileManager(ConfigFileManagerInterface):
         return ssh_key
 
     def ask_pat(self) -> str:
+        from prompt_toolkit.shortcuts import input_dialog
+
         pat = input_dialog(
             title='Creation of the config file',
             text='Please enter your PAT: ').run()
@@ -252,6 +525,8 @@ class YAMLConfigFileManager(ConfigFileManagerInterface):
         return pat
 
     def ask_authentication_mode(self) -> str:
+        from prompt_toolkit.shortcuts import radiolist_dialog
+
         auth_mode = radiolist_dialog(
             title='Creation of the config file',
             text='What authentication mode do you want to use ?',
@@ -10,3 +10,42 @@ DATA_FILE_NAME = ".variables.dat"
 IDENTITY_FILE_NAME = "IDENTITY.json"
 REMOTE_NAME = 'origin'
 REPO_PATH = "."
+WATCHER_BACKEND = "native"
+COALESCE_QUIET_PERIOD = 0.5
+COALESCE_MAX_DELAY = 5
+COALESCE_MAX_BATCH = 50
+GIT_QUEUE_SIZE = 100
+INDEX_LOCK_RETRIES = 5
+INDEX_LOCK_RETRY_DELAY = 0.05
+SAVE_PATTERNS = ["*.swp", "*.swo", "*.swx", "4913", "*~", ".#*", "#*#", "*___jb_tmp___", "*___jb_old___",
+                 ".goutputstream-*", "*.kate-swp", "~$*", "*.crswap"]
+LARGE_FILE_MAX_SIZE = "50MB"
+LARGE_FILE_MAX_BINARY_SIZE = "5MB"
+LARGE_FILE_ACTION = "metadata"
+LARGE_FILE_INTERVAL = 10
+LARGE_FILES_MANIFEST_NAME = ".large_files.json"
+PRUNED_FOLDERS = [".git", "node_modules", "__pycache__", "venv", ".venv", ".tox", ".mypy_cache", ".pytest_cache"]
+WATCH_SNAPSHOT_PATH = ".git/lawg/watch_snapshot.gz"
+GIT_ENGINE = "subprocess"
+PUSH_MAX_DELAY = 30
+PUSH_MAX_COMMITS = 10
+PUSH_RETRY_DELAY = 2
+PUSH_MAX_RETRY_DELAY = 300
+PUSH_FLUSH_TIMEOUT = 20
+PUSH_OUTBOX_PATH = ".git/lawg/outbox.json"
+MAINTENANCE_IDLE_DELAY = 120
+MAINTENANCE_MIN_INTERVAL = 1800
+MAINTENANCE_LOOSE_OBJECTS = 500
+MAINTENANCE_REFLOG_EXPIRE = "2.hours.ago"
+SSH_CONTROL_PERSIST = 600
+PARKED_REFS_PREFIX = "refs/lawg/parked/"
+DELETE_WORKERS = 8
+TRASH_PATH = ".git/lawg-trash"
+DELETE_IN_BACKGROUND = True
+DATA_FILE_FSYNC = True
+DATA_FILE_COMPACT_RECORDS = 200
+SETTINGS_RELOAD_DELAY = 0.5
+STATUS_FRAME_RATE = 10
+STATUS_SUMMARY_WINDOW = 5
+LOG_PATH = ".git/lawg/lawg.log"
+LOG_MAX_SIZE = 1024 ** 2
@@ -1,7 +1,14 @@
+import json
+import logging
+import os
 import pickle
+import threading
 from abc import ABC, abstractmethod
+from datetime import datetime, timezone
 from pathlib import Path
+from typing import Optional
 
+from utils.constant import DATA_FILE_FSYNC, DATA_FILE_COMPACT_RECORDS
 from utils.file_manager import FileManagerInterface
 
 
@@ -40,9 +47,21 @@ class DataFileManagerInterface(ABC):
         pass
 
     @abstractmethod
-    def complete_question(self, question):
+    def complete_question(self, question, answers: dict = None):
+        """
+        :param answers: what the student answered when fixing the question, e.g. the perceived difficulty
+        """
         pass
 
+    def is_completed(self, question) -> bool:
+        return question in self.completed_questions
+
+    def get_question_record(self, question) -> Optional[dict]:
+        """
+        :return: when the question was completed and the answers given then, None if it is not completed or not known
+        """
+        return None
+
     @abstractmethod
     def set_cross_close(self, value: bool):
         pass
@@ -76,7 +95,7 @@ class PickleDataFileManager(DataFileManagerInterface):
             #print("Empty variables.dat.")
             pass
 
-    def complete_question(self, question):
+    def complete_question(self, question, answers=None):
         if question in self.questions \
                 and question not in self.completed_questions:
             self.completed_questions.append(question)
@@ -105,3 +124,107 @@ class PickleDataFileManager(DataFileManagerInterface):
     @cross_close.setter
     def cross_close(self, value):
         self.data.cross_close = value
+
+
+class JournalDataFileManager(DataFileManagerInterface):
+    """
+    Appends every change to the data file as a JSON line, so that a crash can only lose the last, torn, line. The file
+    is compacted, written to a temporary file then renamed over it, when it loads with too many lines, a torn line or
+    in the former pickle format.
+    """
+
+    def __init__(self, file_manager: FileManagerInterface, data_file_path: Path, questions,
+                 fsync: bool = DATA_FILE_FSYNC, compact_after: int = DATA_FILE_COMPACT_RECORDS):
+        self.fsync = fsync
+        self.compact_after = compact_after
+        self.records = {}
+        self._completed = set()
+        self._lines = 0
+        self._lock = threading.Lock()
+        super().__init__(file_manager, data_file_path, questions)
+
+    def load(self, path: Path):
+        try:
+            with self.file_manager.open(path, "rb") as file:
+                content = file.read()
+        except FileNotFoundError:
+            return
+        if content.startswith(b"\x80"):
+            self.__load_pickle(content)
+            self.__compact(path)
+            return
+        *lines, torn_line = content.split(b"\n")
+        valid = not torn_line
+        for line in lines:
+            try:
+                self.__apply(json.loads(line))
+            except (ValueError, TypeError, KeyError):
+                valid = False
+        self._lines = len(lines)
+        if not valid:
+            logging.warning(f"{path} has unreadable records, they are dropped.")
+        if not valid or self._lines > self.compact_after:
+            self.__compact(path)
+
+    def complete_question(self, question, answers=None):
+        if question not in self.questions or question in self._completed:
+            return
+        record = {"completed": question, "at": datetime.now(timezone.utc).isoformat(timespec="seconds")}
+        if answers:
+            record["answers"] = answers
+        self.__apply(record)
+        self.__append(record)
+
+    def set_cross_close(self, value: bool):
+        record = {"cross_close": bool(value)}
+        self.__apply(record)
+        self.__append(record)
+
+    def is_completed(self, question) -> bool:
+        return question in self._completed
+
+    def get_question_record(self, question) -> Optional[dict]:
+        return self.records.get(question)
+
+    def __apply(self, record: dict):
+        if "cross_close" in record:
+            self.data.cross_close = bool(record["cross_close"])
+        else:
+            question = record["completed"]
+            if question not in self._completed:
+                self._completed.add(question)
+                self.data.completed_questions.append(question)
+            self.records[question] = {key: value for key, value in record.items() if key != "completed"}
+
+    def __load_pickle(self, content: bytes):
+        try:
+            data = pickle.loads(content)
+        except (pickle.UnpicklingError, EOFError, AttributeError, ValueError) as e:
+            logging.warning(f"The former data file cannot be read ({e}), it is reset.")
+            return
+        self.__apply({"cross_close": data.cross_close})
+        for question in data.completed_questions:
+            self.__apply({"completed": question})
+
+    def __append(self, record: dict):
+        line = json.dumps(record, ensure_ascii=False).encode() + b"\n"
+        with self._lock:
+            with self.file_manager.open(self.data_file_path, "ab") as file:
+                file.write(line)
+                file.flush()
+                if self.fsync:
+                    os.fsync(file.fileno())
+            self._lines += 1
+
+    def __compact(self, path: Path):
+        records = [{"cross_close": self.data.cross_close}]
+        records += [{"completed": question, **self.records.get(question, {})}
+                    for question in self.data.completed_questions]
+        temporary_path = Path(path).with_name(Path(path).name + ".tmp")
+        with self._lock:
+            with self.file_manager.open(temporary_path, "wb") as file:
+                file.write(b"".join(json.dumps(record, ensure_ascii=False).encode() + b"\n" for record in records))
+                file.flush()
+                os.fsync(file.fileno())
+            os.replace(temporary_path, path)
+            self._lines = len(records)
@@ -0,0 +1,148 @@
+import threading
+import time
+from pathlib import Path
+from typing import Callable, Optional
+
+CREATED = "created"
+MODIFIED = "modified"
+DELETED = "deleted"
+MOVED = "moved"
+
+# (pending kind, incoming kind) -> folded kind, None meaning the change cancels out
+FOLDS = {
+    (CREATED, CREATED): CREATED,
+    (CREATED, MODIFIED): CREATED,
+    (CREATED, DELETED): None,
+    (MODIFIED, CREATED): MODIFIED,
+    (MODIFIED, MODIFIED): MODIFIED,
+    (MODIFIED, DELETED): DELETED,
+    (DELETED, CREATED): MODIFIED,
+    (DELETED, MODIFIED): MODIFIED,
+    (DELETED, DELETED): DELETED,
+    (MOVED, MODIFIED): MOVED,
+    (MOVED, CREATED): MOVED,
+}
+
+
+class PendingChange:
+    def __init__(self, kind: str, path: Path, src_path: Optional[Path] = None):
+        self.kind = kind
+        self.path = path
+        self.src_path = src_path
+
+    @property
+    def paths(self) -> list[Path]:
+        return [self.src_path, self.path] if self.kind == MOVED else [self.path]
+
+    def __eq__(self, other):
+        return isinstance(other, PendingChange) and \
+               (self.kind, self.path, self.src_path) == (other.kind, other.path, other.src_path)
+
+    def __repr__(self):
+        return f"PendingChange({self.kind!r}, {self.path!r}, {self.src_path!r})"
+
+
+class EventCoalescer:
+    """
+    Collects file events per path and hands them over as a single folded batch once no event arrived during
+    `quiet_period` seconds, `max_delay` seconds after the first pending event or when `max_batch` paths are pending.
+    """
+
+    def __init__(self, flush_callback: Callable[[list[PendingChange]], None], quiet_period: float = 0.5,
+                 max_delay: float = 5, max_batch: int = 50):
+        self.flush_callback = flush_callback
+        self.quiet_period = quiet_period
+        self.max_delay = max_delay
+        self.max_batch = max_batch
+        self._pending: dict[Path, PendingChange] = {}
+        self._first_event_time = None
+        self._last_event_time = None
+        self._condition = threading.Condition()
+        self._flush_lock = threading.Lock()
+        self._running = False
+        self._thread = None
+
+    def start(self):
+        with self._condition:
+            if self._running:
+                return
+            self._running = True
+        self._thread = threading.Thread(target=self.__run, name="EventCoalescer", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        with self._condition:
+            self._running = False
+            self._condition.notify_all()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self.flush()
+
+    def add(self, kind: str, path: Path, src_path: Optional[Path] = None):
+        with self._condition:
+            self.__fold(kind, path, src_path)
+            now = time.monotonic()
+            if self._first_event_time is None:
+                self._first_event_time = now
+            self._last_event_time = now
+            self._condition.notify_all()
+
+    def flush(self):
+        """
+        Hands the pending batch over to the callback right away, in the calling thread.
+        """
+        with self._flush_lock:
+            with self._condition:
+                changes = list(self._pending.values())
+                self._pending.clear()
+                self._first_event_time = None
+                self._last_event_time = None
+            if changes:
+                self.flush_callback(changes)
+
+    def __fold(self, kind: str, path: Path, src_path: Optional[Path]):
+        if kind == MOVED:
+            origin = self._pending.pop(src_path, None)
+            if origin is not None and origin.kind == CREATED:
+                kind, src_path = CREATED, None
+            elif origin is not None and origin.kind == MOVED:
+                src_path = origin.src_path
+            if src_path == path:
+                kind, src_path = MODIFIED, None
+            self._pending.pop(path, None)
+            self._pending[path] = PendingChange(kind, path, src_path)
+            return
+
+        pending = self._pending.get(path)
+        if pending is None:
+            self._pending[path] = PendingChange(kind, path)
+            return
+        if pending.kind == MOVED and kind == DELETED:
+            del self._pending[path]
+            self._pending[pending.src_path] = PendingChange(DELETED, pending.src_path)
+            return
+        folded = FOLDS[(pending.kind, kind)]
+        if folded is None:
+            del self._pending[path]
+        elif folded != pending.kind:
+            self._pending[path] = PendingChange(folded, path)
+
+    def __deadline(self):
+        return min(self._last_event_time + self.quiet_period, self._first_event_time + self.max_delay)
+
+    def __run(self):
+        while True:
+            with self._condition:
+                while self._running and not self._pending:
+                    self._condition.wait()
+                if not self._running:
+                    return
+                while self._running and self._pending and len(self._pending) < self.max_batch:
+                    remaining = self.__deadline() - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._condition.wait(remaining)
+                if not self._running:
+                    return
+            self.flush()
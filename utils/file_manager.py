@@ -1,8 +1,53 @@
+import logging
 import os
 import shutil
+import stat
+import threading
+import uuid
 from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 
+from utils.constant import DELETE_WORKERS, TRASH_PATH
+
+
+class DeletionManifest:
+    """
+    What deleting everything in a folder but some paths comes down to: the folders holding a kept path are walked
+    into, everything else is deleted whole.
+    """
+
+    def __init__(self, keep_roots: set[str], files: list[str], folders: list[str]):
+        self.keep_roots = keep_roots
+        self.files = files
+        self.folders = folders
+
+    @classmethod
+    def plan(cls, root_path, keep_paths) -> "DeletionManifest":
+        root_path = os.path.abspath(root_path)
+        keep_roots = {os.path.abspath(path) for path in keep_paths}
+        # The folders to walk into are the ones between the root and a kept path
+        walked_folders = set()
+        for keep_root in keep_roots:
+            parent = os.path.dirname(keep_root)
+            while len(parent) > len(root_path) and parent not in walked_folders:
+                walked_folders.add(parent)
+                parent = os.path.dirname(parent)
+        files, folders = [], []
+        pending = [root_path]
+        while pending:
+            with os.scandir(pending.pop()) as entries:
+                for entry in entries:
+                    if entry.path in keep_roots:
+                        continue
+                    if entry.path in walked_folders:
+                        pending.append(entry.path)
+                    elif entry.is_dir(follow_symlinks=False):
+                        folders.append(entry.path)
+                    else:
+                        files.append(entry.path)
+        return cls(keep_roots, files, folders)
+
 
 class FileManagerInterface(ABC):
     @abstractmethod
@@ -14,7 +59,18 @@ class FileManagerInterface(ABC):
         pass
 
     @abstractmethod
-    def delete_all(self, repo_path: Path, ignore_paths):
+    def delete_all(self, repo_path: Path, ignore_paths, background: bool = False):
+        """
+        Deletes everything in the folder but the ignored paths.
+        :param background: move the folders aside and delete them in the background, the call returning right away
+        """
+        pass
+
+    @abstractmethod
+    def reap_trash(self, repo_path: Path):
+        """
+        Deletes in the background the folders moved aside by a previous session that could not finish deleting them.
+        """
         pass
 
     @abstractmethod
@@ -27,6 +83,9 @@ class FileManagerInterface(ABC):
 
 
 class FileManagerGlob(FileManagerInterface):
+    def __init__(self, workers: int = DELETE_WORKERS):
+        self.workers = workers
+        self.reaper = None
 
     def file_exists(self, path: Path):
         return path.is_file()
@@ -37,16 +96,81 @@ class FileManagerGlob(FileManagerInterface):
     def delete_file(self, path: Path):
         os.remove(path)
 
-    def delete_all(self, repo_path: Path, ignore_paths):
-        for path in repo_path.glob("*"):
-            if all((ignore_path not in path.parents and path != ignore_path) for ignore_path in
-                   ignore_paths):
-                if path.is_dir():
-                    self.delete_folder(path)
-                else:
-                    self.delete_file(path)
+    def delete_all(self, repo_path: Path, ignore_paths, background=False):
+        manifest = DeletionManifest.plan(repo_path, ignore_paths)
+        folders = manifest.folders
+        if background:
+            folders = self.__move_to_trash(repo_path, folders)
+            self.reap_trash(repo_path)
+        self.__delete_trees(manifest.files, folders, self.workers)
+
+    def reap_trash(self, repo_path: Path):
+        trash_path = Path(repo_path) / TRASH_PATH
+        if not trash_path.is_dir() or (self.reaper is not None and self.reaper.is_alive()):
+            return
+        # Daemon and without a pool: quitting does not wait for it, what is left is reaped by the next session
+        self.reaper = threading.Thread(target=self.__delete_trees, args=([], [str(trash_path)], 1),
+                                       name="TrashReaper", daemon=True)
+        self.reaper.start()
+
+    def __move_to_trash(self, repo_path: Path, folders: list[str]) -> list[str]:
+        """
+        :return: the folders that could not be moved, to be deleted right away
+        """
+        trash_path = Path(repo_path) / TRASH_PATH
+        left_folders = []
+        for folder in folders:
+            try:
+                trash_path.mkdir(parents=True, exist_ok=True)
+                # A rename within the same file system, whatever the size of the folder
+                os.rename(folder, trash_path / uuid.uuid4().hex)
+            except OSError:
+                left_folders.append(folder)
+        return left_folders
+
+    def __delete_trees(self, files: list[str], folders: list[str], workers: int):
+        # The folders are split into their sub-folders, deleted in parallel, then emptied and removed
+        subfolders = []
+        for folder in folders:
+            try:
+                with os.scandir(folder) as entries:
+                    for entry in entries:
+                        (subfolders if entry.is_dir(follow_symlinks=False) else files).append(entry.path)
+            except OSError as e:
+                logging.warning(f"Cannot list {folder}: {e}")
+        targets = [(path, False) for path in files] + [(path, True) for path in subfolders]
+        if workers > 1 and subfolders:
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                errors = list(executor.map(lambda target: remove_path(*target), targets))
+        else:
+            errors = [remove_path(*target) for target in targets]
+        errors += [remove_path(folder, remove=os.rmdir) for folder in folders]
+        for error in errors:
+            if error is not None:
+                logging.warning(f"Cannot delete {error.filename}: {error}")
 
     def open(self, path: Path, mode="r"):
         return open(path, mode)
 
 
+def remove_path(path: str, is_folder=False, remove=None):
+    """
+    :return: the error if the path could not be removed, None otherwise
+    """
+    if remove is None:
+        remove = shutil.rmtree if is_folder else os.unlink
+    try:
+        remove(path)
+    except FileNotFoundError:
+        pass
+    except PermissionError:
+        # Read-only files cannot be deleted on Windows
+        try:
+            os.chmod(path, stat.S_IWRITE)
+            remove(path)
+        except OSError as e:
+            return e
+    except OSError as e:
+        return e
+    return None
+
@@ -0,0 +1,168 @@
+import json
+import logging
+import os
+import re
+import threading
+import time
+from pathlib import Path
+from typing import Optional
+
+from utils.blob_index import hash_file
+from utils.constant import LARGE_FILE_MAX_SIZE, LARGE_FILE_MAX_BINARY_SIZE, LARGE_FILE_ACTION, \
+    LARGE_FILE_INTERVAL, LARGE_FILES_MANIFEST_NAME
+
+SKIP = "skip"
+METADATA = "metadata"
+THROTTLE = "throttle"
+ACTIONS = (SKIP, METADATA, THROTTLE)
+
+SNIFF_SIZE = 8000
+SIZE_UNITS = {"": 1, "K": 1024, "M": 1024 ** 2, "G": 1024 ** 3}
+
+
+def parse_size(value) -> int:
+    """
+    Reads a size given either in bytes or as a string such as "20MB".
+    """
+    if isinstance(value, int) and value > 0:
+        return value
+    match = re.fullmatch(r"\s*(\d+(?:\.\d+)?)\s*([KMG]?)B?\s*", str(value).upper())
+    if not match or float(match.group(1)) <= 0:
+        raise ValueError(f"'{value}' is not a valid size, use a number of bytes or a value such as '20MB'.")
+    return int(float(match.group(1)) * SIZE_UNITS[match.group(2)])
+
+
+def is_binary(path, sniff_size: int = SNIFF_SIZE) -> bool:
+    """
+    Uses the heuristic of git: a file is binary when a NUL byte appears in its first bytes.
+    """
+    with open(path, "rb") as file:
+        return b"\0" in file.read(sniff_size)
+
+
+class LargeFilePolicy:
+    """
+    Keeps oversized files out of the auto-commits: they are skipped, recorded as metadata in a manifest or committed
+    at most once every `interval` minutes, the last write of an interval being committed when it ends.
+    """
+
+    def __init__(self, repo_path, max_size=LARGE_FILE_MAX_SIZE, max_binary_size=LARGE_FILE_MAX_BINARY_SIZE,
+                 action: str = LARGE_FILE_ACTION, interval: float = LARGE_FILE_INTERVAL, on_interval_end=None):
+        """
+        :param on_interval_end: called with the path of a throttled file once it can be committed again
+        """
+        if action not in ACTIONS:
+            raise ValueError(f"Error: action must be one of the following: {ACTIONS!r}.")
+        self.repo_path = Path(repo_path)
+        self.max_size = parse_size(max_size)
+        self.max_binary_size = parse_size(max_binary_size)
+        self.action = action
+        self.interval = interval * 60
+        self.on_interval_end = on_interval_end
+        self.manifest_path = self.repo_path / LARGE_FILES_MANIFEST_NAME
+        self.bytes_saved = 0
+        self._last_commit_times = {}
+        self._deferred = {}
+        self._lock = threading.Lock()
+
+    def is_oversized(self, path) -> bool:
+        return self.__oversized_size(path) is not None
+
+    def withheld(self, paths) -> list[Path]:
+        """
+        :return: the paths no commit should include, whatever its origin
+        """
+        return [Path(path) for path in paths if self.is_oversized(path)]
+
+    def apply(self, paths: list[Path]) -> tuple[list[Path], list[Path]]:
+        """
+        Splits the paths about to be committed.
+        :return: the paths to commit, possibly including the manifest, and the paths withheld by the policy
+        """
+        kept, withheld, recorded = [], [], {}
+        for path in paths:
+            size = self.__oversized_size(path)
+            if size is None:
+                kept.append(path)
+                continue
+            if self.action == THROTTLE:
+                last_commit_time = self._last_commit_times.get(path)
+                if last_commit_time is None or time.monotonic() - last_commit_time >= self.interval:
+                    self._last_commit_times[path] = time.monotonic()
+                    kept.append(path)
+                    continue
+                self.__defer(path, last_commit_time + self.interval - time.monotonic())
+            elif self.action == METADATA:
+                recorded[path] = size
+            withheld.append(path)
+            self.bytes_saved += size
+            logging.info(f"Large file {path.name} ({size} bytes) withheld from the auto-commit "
+                         f"({self.action}), {self.bytes_saved} bytes saved so far.")
+        if recorded and self.__record(recorded):
+            kept.append(self.manifest_path)
+        return kept, withheld
+
+    def close(self) -> list[Path]:
+        """
+        Cancels the commits scheduled at the end of the intervals, the waiting paths can then be committed right away.
+        :return: the paths which were waiting for their interval to end
+        """
+        with self._lock:
+            deferred, self._deferred = self._deferred, {}
+        for path, timer in deferred.items():
+            timer.cancel()
+            self._last_commit_times.pop(path, None)
+        return list(deferred)
+
+    def __oversized_size(self, path) -> Optional[int]:
+        try:
+            size = os.stat(path).st_size
+            if size > self.max_size or (size > self.max_binary_size and is_binary(path)):
+                return size
+        except OSError:
+            # Deleted or unreadable, the commit reports it as any other file
+            pass
+        return None
+
+    def __defer(self, path: Path, delay: float):
+        if self.on_interval_end is None:
+            return
+        with self._lock:
+            if path in self._deferred:
+                return
+            timer = threading.Timer(max(delay, 0), self.__end_interval, (path,))
+            timer.daemon = True
+            self._deferred[path] = timer
+        timer.start()
+
+    def __end_interval(self, path: Path):
+        with self._lock:
+            if self._deferred.pop(path, None) is None:
+                return
+        self.on_interval_end(path)
+
+    def __record(self, sizes: dict[Path, int]) -> bool:
+        try:
+            with open(self.manifest_path, "r", encoding="utf-8") as manifest_file:
+                manifest = json.load(manifest_file)
+        except (OSError, ValueError):
+            manifest = {}
+        previous = dict(manifest)
+        for path, size in sizes.items():
+            key = path.relative_to(self.repo_path).as_posix()
+            entry = manifest.get(key)
+            try:
+                status = os.stat(path)
+                if entry and entry["size"] == size and entry["mtime_ns"] == status.st_mtime_ns:
+                    continue
+                manifest[key] = {"size": size, "mtime_ns": status.st_mtime_ns, "blob": hash_file(path, size)}
+            except OSError:
+                # Deleted since it was found oversized
+                continue
+        if manifest == previous:
+            return False
+        temporary_path = self.manifest_path.with_name(self.manifest_path.name + ".tmp")
+        with open(temporary_path, "w", encoding="utf-8") as manifest_file:
+            json.dump(manifest, manifest_file, indent=2, sort_keys=True)
+        os.replace(temporary_path, self.manifest_path)
+        return True
@@ -1,18 +1,44 @@
 import contextlib
 import logging
 import os
-import time
 from abc import ABC, abstractmethod
 from pathlib import Path
 
 from git import RemoteProgress, GitCommandError
-from prompt_toolkit.application import get_app
-from watchdog.events import PatternMatchingEventHandler
-from watchdog.observers.polling import PollingObserver as Observer
+from watchdog.events import PatternMatchingEventHandler, FileCreatedEvent, FileDeletedEvent, FileModifiedEvent, \
+    FileMovedEvent, EVENT_TYPE_MOVED, EVENT_TYPE_CREATED, EVENT_TYPE_DELETED, EVENT_TYPE_MODIFIED
 
-from utils.constant import AUTO_BRANCH, SAVE_IGNORED_FILES
+from utils.blob_index import BlobIndex
+from utils.constant import AUTO_BRANCH, SAVE_IGNORED_FILES, WATCHER_BACKEND, WATCH_SNAPSHOT_PATH
+from utils.event_coalescer import EventCoalescer, PendingChange, CREATED, DELETED, MODIFIED, MOVED
 from utils.file_manager import FileManagerInterface
+from utils.file_policy import LargeFilePolicy
 from utils.git_manager import GitManagerInterface
+from utils.idle_maintenance import IdleMaintenance
+from utils.observer import PausingObserver, POLLING_BACKEND
+from utils.save_pattern_recognizer import SavePatternRecognizer, reconcile_kind
+from utils.status_channel import StatusChannel
+from utils.watch_scope import WatchScope
+from utils.workspace_snapshot import WorkspaceSnapshot
+
+# The previous snapshot is not read yet, None meaning there is none
+UNLOADED = object()
+
+
+def describe_change(change: PendingChange, folder_to_watch) -> str:
+    if change.kind != MOVED:
+        return f"[{change.kind}] {change.path.relative_to(folder_to_watch)}"
+    if change.src_path.parent == change.path.parent:
+        return f"[renamed] {change.src_path.relative_to(folder_to_watch)} → {change.path.name}"
+    return f"[moved] {change.src_path.relative_to(folder_to_watch)} → " \
+           f"{change.path.parent.relative_to(folder_to_watch)}"
+
+
+def batch_message(changes: list[PendingChange], folder_to_watch) -> str:
+    lines = [describe_change(change, folder_to_watch) for change in changes]
+    if len(lines) == 1:
+        return lines[0]
+    return f"[batch] {len(lines)} files\n" + "\n".join(lines)
 
 
 class FileWatcherInterface(ABC):
@@ -22,50 +48,75 @@ class FileWatcherInterface(ABC):
         pass
 
     @abstractmethod
-    def pause(self):
+    def pause(self, paths=()):
+        """
+        Context manager around an operation of LAWG that writes `paths` in the workspace, so that it is not
+        auto-committed.
+        """
         pass
 
     @abstractmethod
     def stop(self):
         pass
 
+    @abstractmethod
+    def load_snapshot(self):
+        """
+        Reads the state of the workspace recorded by the previous session, ahead of the catch-up.
+        """
+        pass
 
-class MyProgressPrinter(RemoteProgress):
-    def update(self, op_code, cur_count, max_count=None, message=''):
-        print(op_code, cur_count, max_count, cur_count / (max_count or 100.0),
-              message or "NO MESSAGE")
-
+    @abstractmethod
+    def update_settings(self, coalescing: dict = None, save_patterns: list[str] = None, large_files: dict = None,
+                        watch_scope: dict = None):
+        """
+        Applies the settings reloaded from the settings file, None leaving a setting as it is.
+        """
+        pass
 
-class PausingObserver(Observer):
-    def __init__(self):
-        super().__init__()
-        self._is_paused = False
+    @abstractmethod
+    def catch_up(self):
+        """
+        Replays the changes made to the workspace while LAWG was closed.
+        """
+        pass
 
-    def dispatch_events(self, *args, **kwargs):
-        if not self._is_paused:
-            super(PausingObserver, self).dispatch_events(*args, **kwargs)
+    @abstractmethod
+    def save_snapshot(self):
+        """
+        Records the state of the workspace for the catch-up of the next session.
+        """
+        pass
 
-    def pause(self):
-        self._is_paused = True
+    @abstractmethod
+    def discard_snapshot(self):
+        """
+        Forgets the recorded state, the workspace being deleted on closing and rebuilt from git on the next opening,
+        which leaves nothing to catch up with.
+        """
+        pass
 
-    def resume(self):
-        time.sleep(self.timeout)
-        self.event_queue.queue.clear()
-        self._is_paused = False
 
-    @contextlib.contextmanager
-    def ignore_events(self):
-        self.pause()
-        yield
-        self.resume()
+class MyProgressPrinter(RemoteProgress):
+    def update(self, op_code, cur_count, max_count=None, message=''):
+        print(op_code, cur_count, max_count, cur_count / (max_count or 100.0),
+              message or "NO MESSAGE")
 
 
 class GitignoreEventHandler(PatternMatchingEventHandler):
-    def __init__(self, git_manager: GitManagerInterface, patterns, ignore_paths, ignore_directories, case_sensitive):
+    EVENT_CLASSES = {CREATED: FileCreatedEvent, DELETED: FileDeletedEvent, MODIFIED: FileModifiedEvent}
+
+    def __init__(self, git_manager: GitManagerInterface, patterns, ignore_paths, ignore_directories, case_sensitive,
+                 recognizer: SavePatternRecognizer = None, scope: WatchScope = None):
         super().__init__(patterns, ignore_paths, ignore_directories, case_sensitive)
         self.git_manager = git_manager
+        self.recognizer = recognizer or SavePatternRecognizer()
+        self.scope = scope
+        self.on_folder_event = None
 
     def dispatch(self, event):
+        if event.is_directory and self.on_folder_event is not None:
+            self.on_folder_event(event)
         if self.ignore_directories and event.is_directory:
             return
 
@@ -74,153 +125,292 @@ class GitignoreEventHandler(PatternMatchingEventHandler):
             paths.append(Path(os.fsdecode(event.dest_path)))
         if event.src_path:
             paths.append(Path(os.fsdecode(event.src_path)))
-        not_a_dot_git_file = all('.git' not in p.parts for p in paths)
-        if not_a_dot_git_file and (SAVE_IGNORED_FILES or not self.git_manager.is_ignored(paths)):
-            super().dispatch(event)
+        if any(self.git_manager.is_ignore_file(p) for p in paths):
+            self.git_manager.refresh_ignore_rules()
+
+        if event.event_type == EVENT_TYPE_MOVED:
+            changes = self.recognizer.recognize(MOVED, paths[0], paths[1])
+        elif event.event_type in (EVENT_TYPE_CREATED, EVENT_TYPE_DELETED, EVENT_TYPE_MODIFIED):
+            changes = self.recognizer.recognize(event.event_type, paths[0])
+        else:
+            changes = []
+        for kind, path, src_path in changes:
+            logical_event = self.__filter(kind, path, src_path)
+            if logical_event is not None:
+                super().dispatch(logical_event)
+
+    def __filter(self, kind: str, path: Path, src_path: Path = None):
+        """
+        :return: the event to dispatch once .git and ignored files are left out, None if nothing is left
+        """
+        path_kept = self.__is_kept(path)
+        if kind != MOVED:
+            return self.EVENT_CLASSES[kind](os.fsdecode(path)) if path_kept else None
+        src_path_kept = self.__is_kept(src_path)
+        if path_kept and src_path_kept:
+            return FileMovedEvent(os.fsdecode(src_path), os.fsdecode(path))
+        if path_kept:
+            return FileCreatedEvent(os.fsdecode(path))
+        if src_path_kept:
+            return FileDeletedEvent(os.fsdecode(src_path))
+        return None
+
+    def __is_kept(self, path: Path) -> bool:
+        if '.git' in path.parts or (self.scope is not None and not self.scope.accepts(path)):
+            return False
+        return SAVE_IGNORED_FILES or not self.git_manager.is_ignored(path)
 
 
 class FileWatcherWatchdog(FileWatcherInterface):
+    reference = AUTO_BRANCH
+
     def __init__(self, folder_to_watch, git_manager: GitManagerInterface,
-                 file_manager: FileManagerInterface):
+                 file_manager: FileManagerInterface, backend: str = WATCHER_BACKEND, coalescing: dict = None,
+                 save_patterns: list[str] = None, large_files: dict = None, watch_scope: dict = None,
+                 status: StatusChannel = None):
         self.git_manager = git_manager
         self.folder_to_watch = folder_to_watch
         self.file_manager = file_manager
-        self.last_message = "Workspace opened"
+        self.status = status or StatusChannel()
         patterns = ["**"]
         ignore_paths = [".git"]
         ignore_directories = True
         case_sensitive = True
+        self.watch_scope = WatchScope(folder_to_watch, git_manager, **(watch_scope or {}))
         my_event_handler = GitignoreEventHandler(git_manager, patterns, ignore_paths,
                                                  ignore_directories,
-                                                 case_sensitive)
+                                                 case_sensitive,
+                                                 SavePatternRecognizer(save_patterns),
+                                                 self.watch_scope)
 
         my_event_handler.on_created = self.on_created
         my_event_handler.on_deleted = self.on_deleted
         my_event_handler.on_modified = self.on_modified
         my_event_handler.on_moved = self.on_moved
-        self.observer = PausingObserver()
-        self.observer.schedule(my_event_handler, folder_to_watch,
-                               recursive=True)
-        self.previous_diff = None
+        my_event_handler.on_folder_event = self.on_folder_event
+        self.event_handler = my_event_handler
+        self._folder_watches = {}
+        self.observer = PausingObserver(backend, listdir=self._listdir)
+        self.coalescer = EventCoalescer(self._save_changes, **(coalescing or {}))
+        self.blob_index = BlobIndex(git_manager, folder_to_watch, self.reference)
+        self.large_file_policy = LargeFilePolicy(folder_to_watch, on_interval_end=self._on_interval_end,
+                                                 **(large_files or {}))
+        # The commits of the commands and of the session leave the large files out too
+        git_manager.withhold = self._withhold
+        self.snapshot_path = Path(folder_to_watch) / WATCH_SNAPSHOT_PATH
+        self.previous_snapshot = UNLOADED
+        self.maintenance = IdleMaintenance(git_manager, folder_to_watch)
+        self.previous_file_saved = None
+
+    def __schedule(self):
+        if self.observer.is_polling:
+            # The snapshots of the polling emitter do not enter pruned folders by themselves
+            self.observer.schedule(self.event_handler, self.folder_to_watch,
+                                   recursive=True)
+            return
+        # Kernel watches are registered per top-level folder, so that pruned trees never get one
+        self.observer.schedule(self.event_handler, self.folder_to_watch,
+                               recursive=False)
+        self._folder_watches.clear()
+        for folder in self.watch_scope.top_level_folders():
+            self.__watch_folder(folder)
+
+    def __watch_folder(self, folder: Path):
+        self._folder_watches[folder] = self.observer.schedule(self.event_handler, str(folder),
+                                                              recursive=True)
+
+    def __unwatch_folder(self, folder: Path):
+        watch = self._folder_watches.pop(folder, None)
+        if watch is not None:
+            self.observer.unschedule(watch)
+
+    def _withhold(self, paths) -> list[Path]:
+        # Looked up on every call, the policy being replaced when the settings are reloaded
+        return self.large_file_policy.withheld(paths)
+
+    def _on_interval_end(self, path: Path):
+        self.__add(MODIFIED, path)
+
+    def _listdir(self, folder):
+        # Looked up on every call, the scope being replaced when the settings are reloaded
+        return self.watch_scope.listdir(folder)
+
+    def on_folder_event(self, event):
+        folder = Path(os.fsdecode(event.src_path))
+        if self.observer.is_polling or folder.parent != Path(self.folder_to_watch):
+            return
+        if event.event_type == EVENT_TYPE_DELETED:
+            self.__unwatch_folder(folder)
+        elif event.event_type == EVENT_TYPE_CREATED and not self.watch_scope.is_pruned(folder):
+            self.__watch_folder(folder)
+            # Files written before the watch was registered
+            for path in self.watch_scope.walk_files(folder):
+                self.event_handler.dispatch(FileCreatedEvent(str(path)))
+        elif event.event_type == EVENT_TYPE_MOVED:
+            self.__unwatch_folder(folder)
+            dest_folder = Path(os.fsdecode(event.dest_path))
+            if dest_folder.parent == Path(self.folder_to_watch) and not self.watch_scope.is_pruned(dest_folder):
+                self.__watch_folder(dest_folder)
+                for path in self.watch_scope.walk_files(dest_folder):
+                    self.event_handler.dispatch(FileMovedEvent(str(folder / path.relative_to(dest_folder)),
+                                                               str(path)))
 
     def start(self):
-        self.observer.start()
+        self.coalescer.start()
+        self.maintenance.start()
+        # Scheduled here, once the session is resumed, so that the folders it restores get their watch
+        self.__schedule()
+        try:
+            self.observer.start()
+        except OSError as e:
+            # e.g. the inotify watch limit is reached on a shared host
+            if self.observer.backend == POLLING_BACKEND:
+                raise
+            logging.warning(f"Cannot start the '{self.observer.backend}' watcher ({e}), falling back to polling.")
+            self.observer.unschedule_all()
+            self.observer = PausingObserver(POLLING_BACKEND, listdir=self._listdir)
+            self.__schedule()
+            self.observer.start()
 
     def stop(self):
         if self.observer.is_alive():
             self.observer.stop()
             self.observer.join()
+        # The last write of the throttled files is committed before the session is paused
+        for path in self.large_file_policy.close():
+            self.coalescer.add(MODIFIED, path)
+        self.coalescer.stop()
+        self.maintenance.stop()
+        if self.large_file_policy.bytes_saved:
+            logging.info(f"{self.large_file_policy.bytes_saved} bytes of large files kept out of the auto-commits.")
+
+    def update_settings(self, coalescing: dict = None, save_patterns: list[str] = None, large_files: dict = None,
+                        watch_scope: dict = None):
+        if coalescing is not None:
+            for name, value in coalescing.items():
+                setattr(self.coalescer, name, value)
+        if save_patterns is not None:
+            self.event_handler.recognizer = SavePatternRecognizer(save_patterns)
+        if large_files is not None:
+            large_file_policy = LargeFilePolicy(self.folder_to_watch, on_interval_end=self._on_interval_end,
+                                                **large_files)
+            large_file_policy.bytes_saved = self.large_file_policy.bytes_saved
+            previous_policy, self.large_file_policy = self.large_file_policy, large_file_policy
+            # The new settings decide whether the files waiting for their interval are committed now
+            for path in previous_policy.close():
+                self.__add(MODIFIED, path)
+        if watch_scope is not None:
+            self.watch_scope = self.event_handler.scope = WatchScope(self.folder_to_watch, self.git_manager,
+                                                                     **watch_scope)
+            if self.observer.is_alive() and not self.observer.is_polling:
+                # Only the top-level folders entering or leaving the scope get their watch changed
+                folders = set(self.watch_scope.top_level_folders())
+                for folder in set(self._folder_watches) - folders:
+                    self.__unwatch_folder(folder)
+                for folder in folders - set(self._folder_watches):
+                    self.__watch_folder(folder)
+
+    def load_snapshot(self):
+        if self.previous_snapshot is UNLOADED:
+            self.previous_snapshot = WorkspaceSnapshot.load(self.folder_to_watch, self.snapshot_path)
+
+    def catch_up(self):
+        self.load_snapshot()
+        previous_snapshot, self.previous_snapshot = self.previous_snapshot, UNLOADED
+        if previous_snapshot is None:
+            return
+        changes = WorkspaceSnapshot.scan(self.watch_scope).changes_since(previous_snapshot)
+        logging.info(f"{len(changes)} change(s) made while LAWG was closed.")
+        for kind, path, src_path in changes:
+            if kind == MOVED:
+                self.event_handler.dispatch(FileMovedEvent(str(src_path), str(path)))
+            else:
+                self.event_handler.dispatch(GitignoreEventHandler.EVENT_CLASSES[kind](str(path)))
+        self.coalescer.flush()
+
+    def save_snapshot(self):
+        WorkspaceSnapshot.scan(self.watch_scope).save(self.snapshot_path)
+
+    def discard_snapshot(self):
+        self.snapshot_path.unlink(missing_ok=True)
 
     def on_created(self, event):
-        src_path = Path(event.src_path)
-        is_diff_empty = self.__is_diff_empty(src_path)
-        current_diff = self.git_manager.get_diff()
-        if current_diff == self.previous_diff:
-            self.__save([src_path], f"[modified] {src_path.relative_to(self.folder_to_watch)}",
-                        amend=True)
-        elif not is_diff_empty:
-            self.__save([src_path], f"[created] {src_path.relative_to(self.folder_to_watch)}")
-        self.__reset_flags()
+        self.__add(CREATED, Path(event.src_path))
 
     def on_deleted(self, event):
-        src_path = Path(event.src_path)
-        if not self.__is_diff_empty(src_path):
-            self.previous_diff = self.git_manager.get_diff()
-            self.__save([src_path], f"[deleted] {src_path.relative_to(self.folder_to_watch)}")
+        self.__add(DELETED, Path(event.src_path))
 
     def on_modified(self, event):
-        src_path = Path(event.src_path)
-        if not self.__is_diff_empty(src_path):
-            self.__save([src_path], f"[modified] {src_path.relative_to(self.folder_to_watch)}")
-        self.__reset_flags()
+        self.__add(MODIFIED, Path(event.src_path))
 
     def on_moved(self, event):
-        src_path = Path(event.src_path)
-        dest_path = Path(event.dest_path)
-        if not self.__is_diff_empty(dest_path):
-            if src_path.parent == dest_path.parent:
-                message = f"[renamed] {src_path.relative_to(self.folder_to_watch)} →" \
-                          f" {dest_path.name}"
-            else:
-                message = f"[moved] {src_path.relative_to(self.folder_to_watch)} → " \
-                          f"{dest_path.parent.relative_to(self.folder_to_watch)}"
-            self.__save([Path(event.src_path), Path(event.dest_path)], message)
-        self.__reset_flags()
-
-    def __save(self, raw_paths: any, message: str, amend=False):
-        if AUTO_BRANCH not in self.git_manager.get_local_branches():
-            self.git_manager.branch(AUTO_BRANCH)
-        self.git_manager.reset(AUTO_BRANCH)
-        for path in raw_paths:
-            if not self.git_manager.is_ignored(path):
-                self.git_manager.add(Path(path))
-        self.git_manager.commit(message, amend, allow_empty=True)
-        self.git_manager.branch(AUTO_BRANCH, force=True)
-        self.git_manager.reset("HEAD@{2}")
-        self.last_message = message
-        get_app().invalidate()
-
-    def __reset_flags(self):
-        self.previous_diff = None
+        self.__add(MOVED, Path(event.dest_path), Path(event.src_path))
+
+    def __add(self, kind: str, path: Path, src_path: Path = None):
+        # The student is at work, maintenance waits for the next pause
+        self.maintenance.notify_activity()
+        self.coalescer.add(kind, path, src_path)
+
+    def _save_changes(self, changes: list[PendingChange]):
+        # Runs on the git worker so that the coalescer never waits for git
+        future = self.git_manager.submit(self._commit_changes, changes)
+        future.add_done_callback(self.__report_failure)
+
+    @staticmethod
+    def __report_failure(future):
+        if future.exception() is not None:
+            logging.error(f"Auto-commit failed: {future.exception()}")
+
+    def _commit_changes(self, changes: list[PendingChange]):
+        paths, withheld_paths = self.large_file_policy.apply([path for change in changes for path in change.paths])
+        # Hashing the touched files is enough to tell a real change from a no-op
+        paths = [path for path in paths if not self.blob_index.is_unchanged(path)]
+        if not paths:
+            return
+        described_paths = set(paths)
+        if self.large_file_policy.manifest_path in described_paths:
+            described_paths.update(withheld_paths)
+        changes = [change for change in changes if any(path in described_paths for path in change.paths)]
+        for change in changes:
+            if change.kind != MOVED:
+                change.kind = reconcile_kind(change.kind, self.blob_index.committed(change.path) is not None)
+        single_change = changes[0] if len(changes) == 1 else None
+        if single_change and single_change.kind == CREATED and single_change.path == self.previous_file_saved:
+            self._save(paths, f"[modified] {single_change.path.relative_to(self.folder_to_watch)}",
+                       amend=True)
+        else:
+            self._save(paths, batch_message(changes, self.folder_to_watch))
+        self.previous_file_saved = single_change.path if single_change and single_change.kind == DELETED else None
 
-    def __is_diff_empty(self, path: Path) -> bool:
-        try:
-            self.git_manager.add(Path(path), intent_to_add=True)
-        except GitCommandError as e:
-            pass
-        return not self.git_manager.get_diff(AUTO_BRANCH)
+    def _save(self, raw_paths: any, message: str, amend=False):
+        paths = [Path(path) for path in raw_paths if not self.git_manager.is_ignored(path)]
+        commit_id = self.git_manager.snapshot_commit(message, AUTO_BRANCH, paths, amend)
+        self.blob_index.record(raw_paths, commit_id)
+        self.status.publish(message)
 
     @contextlib.contextmanager
-    def pause(self):
-        self.observer.pause()
-        yield
-        self.observer.resume()
+    def pause(self, paths=()):
+        # The pending work of the student is committed first, the operation then only hides its own writes
+        self.coalescer.flush()
+        with self.observer.ignore_events(paths):
+            yield
 
 
 class FileWatcherWatchdogOneBranch(FileWatcherWatchdog):
-    def __init__(self, folder_to_watch, git_manager: GitManagerInterface, file_manager: FileManagerInterface):
-        super().__init__(folder_to_watch, git_manager, file_manager)
-        self.previous_file_saved = None
+    reference = "HEAD"
 
-    def __save(self, raw_paths: any, message: str, amend=False):
-        for path in raw_paths:
-            if not self.git_manager.is_ignored(path):
+    def _save(self, raw_paths: any, message: str, amend=False):
+        paths = [Path(path) for path in raw_paths if not self.git_manager.is_ignored(path)]
+        try:
+            self.git_manager.add_paths(paths)
+        except GitCommandError:
+            # One unstageable path must not keep the others out of the commit
+            for path in paths:
                 try:
-                    self.git_manager.add(Path(path))
+                    self.git_manager.add(path)
                 except GitCommandError as e:
                     #logging.warning(f"Error when adding {str(path)}")
                     pass
         self.git_manager.commit(message, amend, allow_empty=True)
-        self.last_message = message
-        get_app().invalidate()
-
-    def on_created(self, event):
-        src_path = Path(event.src_path)
-        if src_path == self.previous_file_saved:
-            self.__save([src_path], f"[modified] {src_path.relative_to(self.folder_to_watch)}",
-                        amend=True)
-        else:
-            self.__save([src_path], f"[created] {src_path.relative_to(self.folder_to_watch)}")
-        self.previous_file_saved = None
-
-    def on_deleted(self, event):
-        src_path = Path(event.src_path)
-        self.previous_file_saved = src_path
-        self.__save([src_path], f"[deleted] {src_path.relative_to(self.folder_to_watch)}")
-
-    def on_modified(self, event):
-        src_path = Path(event.src_path)
-        self.__save([src_path], f"[modified] {src_path.relative_to(self.folder_to_watch)}")
-        self.previous_file_saved = None
-
-    def on_moved(self, event):
-        src_path = Path(event.src_path)
-        dest_path = Path(event.dest_path)
-        if src_path.parent == dest_path.parent:
-            message = f"[renamed] {src_path.relative_to(self.folder_to_watch)} →" \
-                      f" {dest_path.name}"
-        else:
-            message = f"[moved] {src_path.relative_to(self.folder_to_watch)} → " \
-                      f"{dest_path.parent.relative_to(self.folder_to_watch)}"
-        self.__save([Path(event.src_path), Path(event.dest_path)], message)
-        self.previous_file_saved = None
+        self.blob_index.record(raw_paths)
+        self.status.publish(message)
@@ -0,0 +1,229 @@
+import logging
+import os
+import shutil
+import subprocess
+import threading
+from pathlib import Path
+from typing import Optional
+
+# Above this size a request is written by its own thread while the response is read, since the helper answers path by
+# path: once both pipe buffers are full, writing it all first would never return
+WRITER_THREAD_THRESHOLD = 4096
+
+
+class GitBatchError(Exception):
+    """
+    Raised when a git helper cannot answer, the caller then falls back to a one-off git command.
+    """
+
+
+class GitBatchProcess:
+    """
+    A long-lived git command reading requests on its standard input, restarted when it dies.
+    """
+
+    def __init__(self, repo_path, args: list[str], git_executable: str = "git"):
+        self.repo_path = repo_path
+        self.args = [git_executable] + args
+        self.process = None
+        self.restarts = 0
+        self.lock = threading.Lock()
+
+    def request(self, data: bytes, read_response):
+        """
+        Writes a request and parses its response with `read_response(stdout)`, the helper being restarted once if it
+        crashed in between.
+        """
+        with self.lock:
+            for attempt in range(2):
+                try:
+                    process = self.__ensure_started()
+                    if len(data) <= WRITER_THREAD_THRESHOLD:
+                        process.stdin.write(data)
+                        process.stdin.flush()
+                        return read_response(process.stdout)
+                    return self.__request_while_writing(process, data, read_response)
+                except (OSError, EOFError, ValueError) as e:
+                    logging.warning(f"git helper '{' '.join(self.args[1:])}' failed ({e}), restarting it.")
+                    self.__kill()
+            raise GitBatchError(f"git helper '{' '.join(self.args[1:])}' is unavailable")
+
+    def __request_while_writing(self, process, data: bytes, read_response):
+        def write():
+            try:
+                process.stdin.write(data)
+                process.stdin.flush()
+            except (OSError, ValueError):
+                # The helper died, reading its response fails too
+                pass
+
+        writer = threading.Thread(target=write, name="GitBatchWriter", daemon=True)
+        writer.start()
+        try:
+            return read_response(process.stdout)
+        except BaseException:
+            # Unblocks the writer, the helper being restarted by the next request
+            self.__kill()
+            raise
+        finally:
+            writer.join()
+
+    def close(self):
+        with self.lock:
+            if self.process is None:
+                return
+            try:
+                self.process.stdin.close()
+                self.process.wait(timeout=2)
+            except (OSError, subprocess.TimeoutExpired):
+                self.__kill()
+            self.process = None
+
+    def __ensure_started(self):
+        if self.process is None or self.process.poll() is not None:
+            if self.process is not None:
+                self.restarts += 1
+            self.process = subprocess.Popen(self.args, cwd=self.repo_path, stdin=subprocess.PIPE,
+                                            stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+        return self.process
+
+    def __kill(self):
+        if self.process is not None:
+            self.process.kill()
+            self.process.wait()
+            self.process = None
+
+
+def read_exactly(stream, size: int) -> bytes:
+    data = stream.read(size)
+    if len(data) != size:
+        raise EOFError("truncated response")
+    return data
+
+
+def read_line(stream, terminator: bytes = b"\n") -> bytes:
+    if terminator == b"\n":
+        line = stream.readline()
+        if not line.endswith(b"\n"):
+            raise EOFError("truncated response")
+        return line[:-1]
+    data = bytearray()
+    while True:
+        byte = read_exactly(stream, 1)
+        if byte == terminator:
+            return bytes(data)
+        data += byte
+
+
+class GitBatchPool:
+    """
+    The git helpers of a repository, started on first use and shared for the whole session: object lookups with
+    `cat-file --batch(-check)`, hashing with `hash-object --stdin-paths` and ignore checks with `check-ignore --stdin`.
+    `update-index --stdin` keeps the index locked while it runs, so it lives for one burst of paths only.
+    """
+
+    def __init__(self, repo_path, git_executable: str = None):
+        self.repo_path = Path(repo_path)
+        self.git_executable = shutil.which(git_executable or "git")
+        self._helpers = {}
+        self._lock = threading.Lock()
+
+    def is_available(self) -> bool:
+        return self.git_executable is not None
+
+    def object_info(self, rev: str) -> Optional[tuple[str, str, int]]:
+        """
+        :return: the id, type and size of the object, None if it does not exist
+        """
+        def read(stdout):
+            header = read_line(stdout).decode()
+            if header.endswith(" missing") or header.endswith(" ambiguous"):
+                return None
+            object_id, object_type, size = header.split()
+            return object_id, object_type, int(size)
+        return self.__helper("cat-file", "--batch-check").request(f"{rev}\n".encode(), read)
+
+    def read_object(self, rev: str) -> Optional[tuple[str, str, bytes]]:
+        """
+        :return: the id, type and content of the object, None if it does not exist
+        """
+        def read(stdout):
+            header = read_line(stdout).decode()
+            if header.endswith(" missing") or header.endswith(" ambiguous"):
+                return None
+            object_id, object_type, size = header.split()
+            content = read_exactly(stdout, int(size))
+            read_exactly(stdout, 1)
+            return object_id, object_type, content
+        return self.__helper("cat-file", "--batch").request(f"{rev}\n".encode(), read)
+
+    def hash_object(self, path) -> str:
+        """
+        :return: the blob id git would store for the file, filters included
+        """
+        relative_path = self.__relative(path)
+        if "\n" in relative_path:
+            raise GitBatchError("paths with a new line cannot be hashed in batch")
+        return self.__helper("hash-object", "--stdin-paths") \
+            .request(f"{relative_path}\n".encode(), lambda stdout: read_line(stdout).decode())
+
+    def check_ignore(self, paths) -> list[bool]:
+        """
+        :return: for every path, whether git ignores it
+        """
+        relative_paths = [self.__relative(path) for path in paths]
+
+        def read(stdout):
+            ignored = []
+            for _ in relative_paths:
+                source, _, pattern, _ = (read_line(stdout, b"\0") for _ in range(4))
+                # Non-matching paths have no source, negated patterns ("!") match but do not ignore
+                ignored.append(bool(source) and not pattern.startswith(b"!"))
+            return ignored
+
+        data = b"".join(os.fsencode(path) + b"\0" for path in relative_paths)
+        return self.__helper("check-ignore", "--stdin", "--verbose", "--non-matching", "-z").request(data, read)
+
+    def update_index(self, paths, index_file=None):
+        """
+        Stages the current state of the paths, deletions included, with a single `update-index` process.
+        :param index_file: the index to update instead of the one of the repository
+        """
+        if not self.is_available():
+            raise GitBatchError("git is not available")
+        data = b"".join(os.fsencode(self.__relative(path)) + b"\0" for path in paths)
+        env = dict(os.environ, GIT_INDEX_FILE=str(index_file)) if index_file is not None else None
+        result = subprocess.run([self.git_executable, "update-index", "--add", "--remove", "-z", "--stdin"],
+                                cwd=self.repo_path, input=data, capture_output=True, env=env)
+        if result.returncode != 0:
+            raise GitBatchError(result.stderr.decode(errors="replace").strip())
+
+    def forget_ignore_rules(self):
+        """
+        Stops the ignore checker, which caches the ignore files it has read, it restarts on the next check.
+        """
+        with self._lock:
+            helper = self._helpers.pop(("check-ignore", "--stdin", "--verbose", "--non-matching", "-z"), None)
+        if helper is not None:
+            helper.close()
+
+    def restarts(self) -> int:
+        return sum(helper.restarts for helper in self._helpers.values())
+
+    def close(self):
+        with self._lock:
+            helpers, self._helpers = list(self._helpers.values()), {}
+        for helper in helpers:
+            helper.close()
+
+    def __helper(self, *args) -> GitBatchProcess:
+        if not self.is_available():
+            raise GitBatchError("git is not available")
+        with self._lock:
+            if args not in self._helpers:
+                self._helpers[args] = GitBatchProcess(self.repo_path, list(args), self.git_executable)
+            return self._helpers[args]
+
+    def __relative(self, path) -> str:
+        path = Path(path)
+        return (path.relative_to(self.repo_path) if path.is_absolute() else path).as_posix()
@@ -1,16 +1,156 @@
+import functools
+import logging
+import os
+import re
+import time
 from abc import ABC, abstractmethod
+from concurrent.futures import Future
 from pathlib import Path
+from typing import Optional
 
-from git import Repo
+from git import Repo, Git, GitCommandError, GitDB, IndexFile, Commit, SymbolicReference, RefLog
+from git.objects.util import altz_to_utctz_str
+from gitdb.exc import BadName, BadObject
 
-from utils.constant import REMOTE_NAME
+from utils.constant import REMOTE_NAME, GIT_QUEUE_SIZE, INDEX_LOCK_RETRIES, INDEX_LOCK_RETRY_DELAY, PUSH_OUTBOX_PATH, \
+    PARKED_REFS_PREFIX, AUTO_BRANCH
 from utils import generate_authenticated_repo_uri
+from utils.git_batch import GitBatchPool, GitBatchError
+from utils.gitignore_matcher import GitignoreMatcher
+from utils.git_worker import GitWorker
+from utils.push_scheduler import PushScheduler
+from utils.ref_cache import RefCache
+from utils.transport import Transport
+
+
+class LockRetryingGit(Git):
+    """
+    Git command wrapper retrying the commands that failed because another process holds the index lock.
+    """
+
+    def execute(self, *args, **kwargs):
+        for attempt in range(INDEX_LOCK_RETRIES + 1):
+            try:
+                return super().execute(*args, **kwargs)
+            except GitCommandError as e:
+                if attempt == INDEX_LOCK_RETRIES or "index.lock" not in str(e.stderr):
+                    raise
+                time.sleep(INDEX_LOCK_RETRY_DELAY * 2 ** attempt)
+
+
+class LockRetryingRepo(Repo):
+    GitCommandWrapperType = LockRetryingGit
+
+
+class RepackAwareGitDB(GitDB):
+    """
+    In-process object database noticing the packs written since it listed them, e.g. by a repack that deleted the
+    loose objects it had found.
+    """
+
+    def info(self, sha):
+        try:
+            return super().info(sha)
+        except BadObject:
+            self.update_cache(force=True)
+            return super().info(sha)
+
+    def stream(self, sha):
+        try:
+            return super().stream(sha)
+        except BadObject:
+            self.update_cache(force=True)
+            return super().stream(sha)
+
+
+def retry_on_index_lock(operation):
+    """
+    Runs an in-process operation writing the index again while another process holds the index lock.
+    """
+    for attempt in range(INDEX_LOCK_RETRIES + 1):
+        try:
+            return operation()
+        except OSError as e:
+            if attempt == INDEX_LOCK_RETRIES or "could not be obtained" not in str(e):
+                raise
+            time.sleep(INDEX_LOCK_RETRY_DELAY * 2 ** attempt)
+
+
+def cleaned_message(message: str) -> str:
+    """
+    :return: the message as `git commit -m` writes it, with its default `whitespace` cleanup: no trailing spaces, no
+    leading, trailing or repeated blank lines, and a final newline
+    """
+    lines = []
+    for line in message.splitlines():
+        line = line.rstrip()
+        if line or (lines and lines[-1]):
+            lines.append(line)
+    while lines and not lines[-1]:
+        lines.pop()
+    return "".join(f"{line}\n" for line in lines)
+
+
+def invalidates_refs(method):
+    """
+    For the git commands that may move any ref: the ref cache is emptied once they are done.
+    """
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        try:
+            return method(self, *args, **kwargs)
+        finally:
+            self.refs.invalidate()
+    return wrapper
 
 
 class GitManagerInterface(ABC):
     def __init__(self, repo_path, ssh_path):
         self.repo_path = repo_path
         self.ssh_path = ssh_path
+        # Given the changed paths, returns the ones `add_all` has to leave out (e.g. the large files of the watcher)
+        self.withhold = None
+        self.worker = GitWorker(GIT_QUEUE_SIZE)
+        self.push_scheduler = PushScheduler(self.__push_in_worker, Path(repo_path) / PUSH_OUTBOX_PATH)
+
+    def submit(self, job, *args, **kwargs) -> Future:
+        """
+        Queues a job mutating the repository behind the ones already submitted.
+        """
+        return self.worker.submit(job, *args, **kwargs)
+
+    def run(self, job, *args, **kwargs):
+        """
+        Queues a job mutating the repository and waits for its result.
+        """
+        return self.worker.run(job, *args, **kwargs)
+
+    def schedule_push(self, all: bool = True, tags: bool = False, urgent: bool = False):
+        """
+        Pushes in the background, together with the other pushes requested meanwhile.
+        """
+        self.push_scheduler.schedule(all=all, tags=tags, urgent=urgent)
+
+    def resume_pushes(self):
+        """
+        Sends the push the previous session could not, to be called once the session is opened.
+        """
+        self.push_scheduler.resume()
+
+    def __push_in_worker(self, all: bool, tags: bool):
+        # A push updates refs/remotes/*, so it waits for its turn behind the other jobs mutating the repository
+        return self.run(self.push, all=all, tags=tags)
+
+    def flush_pushes(self, timeout: float = None) -> bool:
+        """
+        Sends the pending push and waits for it.
+        :return: whether everything was pushed before the timeout
+        """
+        return self.push_scheduler.flush(timeout)
+
+    def close(self):
+        self.push_scheduler.stop()
+        self.worker.stop()
 
     @abstractmethod
     def checkout(self, branch: str):
@@ -37,19 +177,48 @@ class GitManagerInterface(ABC):
         pass
 
     @abstractmethod
-    def pull(self):
+    def snapshot_commit(self, message: str, branch: str, paths, amend=False) -> str:
+        """
+        Commits the current state of `paths` on top of `branch` (created from HEAD if needed) through a private index,
+        leaving HEAD, the index and the working tree alone.
+        :return: the id of the new commit
+        """
+        pass
+
+    @abstractmethod
+    def fetch(self):
+        pass
+
+    @abstractmethod
+    def pull(self, fetch: bool = True):
+        """
+        :param fetch: whether to fetch first, the upstream branch being merged as it was last fetched otherwise
+        """
         pass
 
     @abstractmethod
     def push(self, all: bool, tags: bool):
+        """
+        Pushes right away, raising an error if the remote did not accept everything.
+        """
         pass
 
     @abstractmethod
     def add(self, file_path, intent_to_add: bool = False, force: bool = False):
         pass
 
+    @abstractmethod
+    def add_paths(self, paths):
+        """
+        Stages the current state of several files at once, deletions included.
+        """
+        pass
+
     @abstractmethod
     def add_all(self):
+        """
+        Stages every change but the paths kept out by `withhold`.
+        """
         pass
 
     @abstractmethod
@@ -66,21 +235,103 @@ class GitManagerInterface(ABC):
 
     @abstractmethod
     def get_current_branch(self):
+        """
+        :return: the name of the checked out branch, None if HEAD is detached
+        """
+        pass
+
+    @abstractmethod
+    def has_branch(self, branch: str) -> bool:
         pass
 
     @abstractmethod
     def get_diff(self, ref: str = None):
         pass
 
+    @abstractmethod
+    def get_committed_blob(self, file_path, ref: str = "HEAD"):
+        """
+        :return: the blob id and size of the file on the reference, None if it is not tracked there
+        """
+        pass
+
+    @abstractmethod
+    def hash_object(self, file_path) -> str:
+        pass
+
+    @abstractmethod
+    def has_content_filters(self) -> bool:
+        """
+        :return: whether files are converted (end of lines, filters) when stored, making a raw hash unreliable
+        """
+        pass
+
+    @abstractmethod
+    def get_commit_id(self, ref: str = "HEAD"):
+        """
+        :return: the id of the commit the reference points to, None if it does not exist
+        """
+        pass
+
     @abstractmethod
     def stash(self, command: str = "push", target: str = None, all: bool = False, message: str = None,
               untracked: bool = False):
         pass
 
+    @abstractmethod
+    def park(self, name: str, paths, message: str = None):
+        """
+        Stores the files under the `refs/lawg/parked/<name>` ref, next to what is parked there already, without
+        touching the index or the working tree.
+        :return: the id of the parking commit, None if there was nothing to park
+        """
+        pass
+
+    @abstractmethod
+    def restore_parked(self, name: str):
+        """
+        Writes back the files parked under the name, except the ones already on disk with the same content, and drops
+        the ref. Like `git stash pop`, a file created meanwhile under the same name is never replaced: it is reported
+        and the ref is kept, the parked version staying there.
+        :return: the restored paths, None if nothing is parked under the name
+        """
+        pass
+
+    @abstractmethod
+    def get_untracked_files(self) -> list[Path]:
+        """
+        :return: the untracked files, ignored ones included
+        """
+        pass
+
     @abstractmethod
     def is_ignored(self, paths) -> bool:
         pass
 
+    @abstractmethod
+    def is_ignore_file(self, path) -> bool:
+        pass
+
+    @abstractmethod
+    def refresh_ignore_rules(self):
+        pass
+
+    @abstractmethod
+    def count_objects(self) -> dict:
+        """
+        :return: the figures of `git count-objects -v`, such as the number of loose ("count") and packed ("in-pack")
+        objects
+        """
+        pass
+
+    @abstractmethod
+    def expire_reflogs(self, expire: str, refs=("HEAD", f"refs/heads/{AUTO_BRANCH}")):
+        """
+        Drops the reflog entries older than `expire` (e.g. "2.hours.ago") from the reflogs of `refs`, the ones the
+        auto-commits write to. The other reflogs, `refs/stash` first, are left alone.
+        """
+        pass
+
     @abstractmethod
     def merge(self, abort=False):
         pass
@@ -103,16 +354,33 @@ class GitManagerInterface(ABC):
 
 
 class GitManagerPython(GitManagerInterface):
+    repo_options = {}
+
     def __init__(self, repo_path, ssh_path, nickname, pat):
         super().__init__(repo_path, ssh_path)
-        self.repo = Repo(repo_path)
+        self.repo = LockRetryingRepo(repo_path, **self.repo_options)
         self.remote = self.repo.remote(name=REMOTE_NAME)
         if pat is not None and nickname is not None:
             self.remote.set_url(generate_authenticated_repo_uri(nickname+":"+pat, self.remote.url), self.remote.url)
-
+        self.transport = Transport(self.remote.url, ssh_path)
+        self.ignore_matcher = GitignoreMatcher(repo_path, self.get_global_excludes_path()) \
+            if GitignoreMatcher.is_available() else None
+        self.batch = GitBatchPool(repo_path, self.repo.git.GIT_PYTHON_GIT_EXECUTABLE)
+        self._snapshot_bases = {}
+        self.refs = RefCache(self.repo.git_dir, self._read_ref, self._list_refs, self._read_head_target)
+        self.refs.start_watching()
+
+    def close(self):
+        super().close()
+        self.batch.close()
+        self.refs.stop_watching()
+        self.transport.close()
+
+    @invalidates_refs
     def checkout(self, branch: str):
         return self.repo.git.checkout(branch)
 
+    @invalidates_refs
     def reset(self, ref: str, soft=False, mixed=True, hard=False):
         return self.repo.head.reset(ref, index=not soft, working_tree=hard)
 
@@ -122,57 +390,211 @@ class GitManagerPython(GitManagerInterface):
     def checkout_index(self):
         return self.repo.git.checkout_index(f=True, a=True)
 
+    @invalidates_refs
     def commit(self, message: str, amend=False, allow_empty=False):
         return self.repo.git.commit(message=message, amend=amend, allow_empty=allow_empty)
 
     def duplicate_commit(self, message: str, branch: str, amend=False, allow_empty=False):
-        if branch not in self.get_local_branches():
-            self.branch(branch)
-
         self.add_all()
         self.commit(message, allow_empty=True)
-        self.reset(branch)
-        self.commit(message, allow_empty=True)
-        self.branch(branch, force=True)
-        self.reset("HEAD@{2}")
-        self.push(all=True)
-
-    def pull(self):
-        self.remote.pull()
+        # The same tree goes on the other branch, without checking it out
+        self._commit_tree_on_branch(self.repo.commit("HEAD").tree.hexsha, message, branch)
+        self.schedule_push(all=True, urgent=True)
+
+    def snapshot_commit(self, message: str, branch: str, paths, amend=False) -> str:
+        tip = self.get_commit_id(f"refs/heads/{branch}")
+        base = tip or self.get_commit_id("HEAD")
+        index_path = self._snapshot_index_path(branch)
+        with self.repo.git.custom_environment(GIT_INDEX_FILE=str(index_path)):
+            # The private index is kept between two snapshots and only reloaded when the branch moved behind our back
+            if self._snapshot_bases.get(branch) != base or not index_path.exists():
+                self.repo.git.read_tree(base)
+            try:
+                self.batch.update_index(paths, index_file=index_path)
+            except GitBatchError:
+                self.repo.git.add("--", *[str(Path(path).relative_to(self.repo_path)) for path in paths])
+            tree = self.repo.git.write_tree()
+        commit_id = self._commit_tree_on_branch(tree, message, branch, amend)
+        self._snapshot_bases[branch] = commit_id
+        return commit_id
+
+    def _snapshot_index_path(self, branch: str) -> Path:
+        index_path = Path(self.repo.git_dir) / "lawg" / f"index-{branch}"
+        index_path.parent.mkdir(parents=True, exist_ok=True)
+        return index_path
+
+    def _commit_tree_on_branch(self, tree: str, message: str, branch: str, amend=False) -> str:
+        """
+        Commits the tree on top of the branch and moves the branch with a compare-and-swap, so that a concurrent update
+        of the branch makes it fail instead of being lost.
+        """
+        tip = self.get_commit_id(f"refs/heads/{branch}")
+        if tip is None:
+            parents = [self.get_commit_id("HEAD")]
+        else:
+            parents = [parent.hexsha for parent in self.repo.commit(tip).parents] if amend else [tip]
+        parent_args = [arg for parent in parents for arg in ("-p", parent)]
+        commit_id = self.repo.git.commit_tree(tree, *parent_args, m=message)
+        self.repo.git.update_ref("-m", f"commit{' (amend)' if amend else ''}: {message.splitlines()[0]}",
+                                 f"refs/heads/{branch}", commit_id, tip or "0" * 40)
+        self.refs.update(f"refs/heads/{branch}", commit_id)
+        return commit_id
+
+    @invalidates_refs
+    def fetch(self):
+        with self.transport.timed("fetch"), self.repo.git.custom_environment(**self.transport.environment()):
+            return self.remote.fetch()
+
+    @invalidates_refs
+    def pull(self, fetch=True):
+        if not fetch:
+            return self.repo.git.merge("@{upstream}")
+        with self.transport.timed("pull"), self.repo.git.custom_environment(**self.transport.environment()):
+            self.remote.pull()
 
     def push(self, all=False, tags=False):
-        try:
-            ssh_cmd = f'ssh -v -i {self.ssh_path}'
-            with self.repo.git.custom_environment(GIT_SSH_COMMAND=ssh_cmd):
-                return self.remote.push(all=all, tag=tags)  # progress=MyProgressPrinter())
-        except Exception as e:
-            print(e)
+        # git refuses --all and --tags together, a merged request needs two pushes
+        options = [{"all": True}] * all + [{"tag": True}] * tags or [{}]
+        push_infos = []
+        with self.transport.timed("push"), self.repo.git.custom_environment(**self.transport.environment()):
+            for option in options:
+                push_infos += self.remote.push(**option)  # progress=MyProgressPrinter())
+        rejected = [push_info.remote_ref_string for push_info in push_infos if push_info.flags & push_info.ERROR]
+        if rejected:
+            raise GitCommandError(["git", "push"], 1, f"rejected: {', '.join(rejected)}")
+        return push_infos
 
     def add(self, file_path, intent_to_add=False, force=False):
         path = Path(file_path)
         return self.repo.git.add(str(path.relative_to(self.repo_path)), intent_to_add=intent_to_add, force=force)
 
-    def add_all(self):
-        return self.repo.git.add(A=True)
+    def add_paths(self, paths):
+        if not paths:
+            return
+        try:
+            return self.batch.update_index(paths)
+        except GitBatchError as e:
+            logging.debug(f"Staging with git add ({e}).")
+        return self.repo.git.add("--", *[str(Path(path).relative_to(self.repo_path)) for path in paths])
 
+    def add_all(self):
+        withheld_paths = self.__withheld_changes()
+        if not withheld_paths:
+            return self.repo.git.add(A=True)
+        return self.repo.git.add("-A", "--", ".", *[f":(exclude,literal){path}" for path in withheld_paths])
+
+    def __withheld_changes(self) -> list[str]:
+        if self.withhold is None:
+            return []
+        changed_paths = self.repo.git.ls_files("-z", "--modified", "--others", "--exclude-standard").split("\0")
+        withheld_paths = self.withhold([Path(self.repo_path) / path for path in changed_paths if path])
+        return [Path(path).relative_to(self.repo_path).as_posix() for path in withheld_paths]
+
+    @invalidates_refs
     def branch(self, branch: str, force=False):
         return self.repo.git.branch(branch, force=force)
 
     def get_local_branches(self):
-        return [branch.name for branch in self.repo.heads]
+        return self.refs.local_branches()
 
     def get_remote_branches(self):
-        return [ref.name for ref in self.repo.remote().refs]
+        return [name for name in self.refs.remote_branches() if name.startswith(f"{REMOTE_NAME}/")]
 
     def get_current_branch(self):
-        return self.repo.head
+        return self.refs.current_branch()
+
+    def has_branch(self, branch: str) -> bool:
+        return self.refs.has_branch(branch)
 
     def get_diff(self, ref=None):
         return self.repo.git.diff(ref)
 
-    def is_ignored(self, paths) -> bool:
-        return bool(self.repo.ignored(paths))
+    def get_committed_blob(self, file_path, ref="HEAD"):
+        path = Path(file_path)
+        if path.is_absolute():
+            path = path.relative_to(self.repo_path)
+        if "\n" not in f"{ref}{path}":
+            try:
+                info = self.batch.object_info(f"{ref}:{path.as_posix()}")
+                return (info[0], info[2]) if info is not None and info[1] == "blob" else None
+            except GitBatchError:
+                pass
+        return self._get_tree_blob(path, ref)
+
+    def _get_tree_blob(self, path: Path, ref: str):
+        try:
+            blob = self.repo.commit(ref).tree / path.as_posix()
+        except (KeyError, ValueError, BadName):
+            return None
+        return (blob.hexsha, blob.size) if blob.type == "blob" else None
 
+    def hash_object(self, file_path) -> str:
+        try:
+            return self.batch.hash_object(file_path)
+        except GitBatchError:
+            pass
+        return self.repo.git.hash_object(str(Path(file_path).relative_to(self.repo_path)))
+
+    def has_content_filters(self) -> bool:
+        autocrlf = str(self.repo.config_reader().get_value("core", "autocrlf", "false")).lower()
+        return autocrlf in ("true", "input") or (Path(self.repo_path) / ".gitattributes").exists()
+
+    def get_commit_id(self, ref="HEAD"):
+        # Plain ref names are answered by the cache, revision expressions (HEAD~1, @{1}, ids) by git
+        if re.fullmatch(r"[\w./-]+", ref) and ".." not in ref and self.refs.full_name(ref) is not None:
+            return self.refs.commit_id(ref)
+        return self._read_commit_id(ref)
+
+    def _read_commit_id(self, ref: str):
+        try:
+            return self.repo.commit(ref).hexsha
+        except (ValueError, BadName):
+            return None
+
+    def _read_ref(self, name: str):
+        if not name.startswith("refs/heads/") and name != "HEAD":
+            # Tags may be annotated, they are peeled to their commit
+            return self._read_commit_id(name)
+        try:
+            return SymbolicReference.dereference_recursive(self.repo, name)
+        except (ValueError, OSError):
+            return None
+
+    def _list_refs(self) -> list[str]:
+        return [ref.path for ref in self.repo.references]
+
+    def _read_head_target(self):
+        head = self.repo.head
+        try:
+            return None if head.is_detached else head.ref.path
+        except (ValueError, TypeError):
+            return None
+
+    def is_ignored(self, paths) -> bool:
+        if self.ignore_matcher is None:
+            try:
+                return any(self.batch.check_ignore(paths if isinstance(paths, (list, tuple, set)) else [paths]))
+            except GitBatchError:
+                return bool(self.repo.ignored(paths))
+        paths = paths if isinstance(paths, (list, tuple, set)) else [paths]
+        return any(self.ignore_matcher.is_ignored(path) for path in paths)
+
+    def is_ignore_file(self, path) -> bool:
+        return self.ignore_matcher is not None and self.ignore_matcher.is_ignore_file(path)
+
+    def refresh_ignore_rules(self):
+        if self.ignore_matcher is not None:
+            self.ignore_matcher.invalidate()
+        self.batch.forget_ignore_rules()
+
+    def get_global_excludes_path(self):
+        excludes_path = self.repo.config_reader().get_value("core", "excludesfile", "")
+        if not excludes_path:
+            config_home = os.environ.get("XDG_CONFIG_HOME") or Path.home() / ".config"
+            excludes_path = Path(config_home) / "git" / "ignore"
+        return Path(os.path.expanduser(str(excludes_path)))
+
+    @invalidates_refs
     def stash(self, command="push", target=None, all=False, message=None, untracked=False):
         valid_commands = {"push", "pop", "apply", "clear", "drop", "create", "store", "save", "list"}
         if command not in valid_commands:
@@ -184,6 +606,116 @@ class GitManagerPython(GitManagerInterface):
         self.add_param_if_true(command_params, untracked, "-u")
         return self.repo.git.stash(command_params)
 
+    def park(self, name: str, paths, message=None):
+        paths = list(paths)
+        if not paths:
+            return None
+        ref = f"{PARKED_REFS_PREFIX}{name}"
+        parent = self.get_commit_id(ref)
+        index_path = Path(self.repo.git_dir) / "lawg" / f"index-parked-{name}"
+        index_path.parent.mkdir(parents=True, exist_ok=True)
+        index_path.unlink(missing_ok=True)
+        try:
+            with self.repo.git.custom_environment(GIT_INDEX_FILE=str(index_path)):
+                if parent is not None:
+                    # Files parked by a session whose restore failed are kept
+                    self.repo.git.read_tree(parent)
+                try:
+                    # Unlike git add, update-index does not refuse ignored files
+                    self.batch.update_index(paths, index_file=index_path)
+                except GitBatchError:
+                    self.repo.git.add("--force", "--", *[str(Path(path).relative_to(self.repo_path)) for path in paths])
+                tree = self.repo.git.write_tree()
+        finally:
+            index_path.unlink(missing_ok=True)
+        parent_args = ["-p", parent] if parent is not None else []
+        commit_id = self.repo.git.commit_tree(tree, *parent_args, m=message or f"Parked {name}")
+        self.repo.git.update_ref("-m", f"park: {name}", ref, commit_id, parent or "0" * 40)
+        self.refs.update(ref, commit_id)
+        return commit_id
+
+    def restore_parked(self, name: str):
+        ref = f"{PARKED_REFS_PREFIX}{name}"
+        commit_id = self.get_commit_id(ref)
+        if commit_id is None:
+            return None
+        restored, conflicts = [], []
+        for entry in self.repo.git.ls_tree("-r", "-l", "-z", commit_id).split("\0"):
+            if not entry:
+                continue
+            info, _, relative_path = entry.partition("\t")
+            mode, _, blob_id, size = info.split()
+            path = Path(self.repo_path) / relative_path
+            if self.__is_restored(path, mode, blob_id, int(size)):
+                continue
+            try:
+                self.__write_blob(path, relative_path, mode, blob_id)
+            except (FileExistsError, NotADirectoryError):
+                conflicts.append(relative_path)
+                continue
+            restored.append(path)
+        if conflicts:
+            logging.warning(f"{len(conflicts)} parked file(s) not restored, another file has their name: "
+                            f"{', '.join(conflicts)}. They are kept under {ref} "
+                            f"(git show {ref}:{conflicts[0]}).")
+            return restored
+        self.repo.git.update_ref("-d", ref, commit_id)
+        self.refs.update(ref, None)
+        return restored
+
+    def __is_restored(self, path: Path, mode: str, blob_id: str, size: int) -> bool:
+        if mode == "120000":
+            return path.is_symlink() and os.fsencode(os.readlink(path)) == self.__read_blob(blob_id)
+        if path.is_symlink() or not path.is_file() or path.stat().st_size != size:
+            return False
+        return self.hash_object(path) == blob_id
+
+    def __write_blob(self, path: Path, relative_path: str, mode: str, blob_id: str):
+        """
+        :raise FileExistsError: if something exists at the path, the file being created exclusively
+        """
+        path.parent.mkdir(parents=True, exist_ok=True)
+        if mode == "120000":
+            os.symlink(os.fsdecode(self.__read_blob(blob_id)), path)
+            return
+        if self.has_content_filters():
+            # The end of lines and filters of the working tree are applied back, as a checkout would
+            content = self.repo.git.cat_file("--filters", f"--path={relative_path}", blob_id,
+                                             stdout_as_string=False, strip_newline_in_stdout=False)
+        else:
+            content = self.__read_blob(blob_id)
+        with open(path, "xb") as file:
+            file.write(content)
+        if mode == "100755":
+            path.chmod(path.stat().st_mode | 0o111)
+
+    def __read_blob(self, blob_id: str) -> bytes:
+        try:
+            blob = self.batch.read_object(blob_id)
+            if blob is not None:
+                return blob[2]
+        except GitBatchError:
+            pass
+        return self.repo.git.cat_file("blob", blob_id, stdout_as_string=False, strip_newline_in_stdout=False)
+
+    def get_untracked_files(self) -> list[Path]:
+        output = self.repo.git.ls_files("--others", "-z")
+        # Nested repositories are listed as folders, they are left alone
+        return [Path(self.repo_path) / path for path in output.split("\0") if path and not path.endswith("/")]
+
+    def count_objects(self) -> dict:
+        counts = {}
+        for line in self.repo.git.count_objects(v=True).splitlines():
+            key, _, value = line.partition(":")
+            counts[key.strip()] = int(value) if value.strip().isdigit() else value.strip()
+        return counts
+
+    def expire_reflogs(self, expire: str, refs=("HEAD", f"refs/heads/{AUTO_BRANCH}")):
+        refs = [ref for ref in refs if (Path(self.repo.git_dir) / "logs" / ref).is_file()]
+        if refs:
+            return self.repo.git.reflog("expire", f"--expire={expire}", f"--expire-unreachable={expire}", *refs)
+
+    @invalidates_refs
     def merge(self, abort=False):
         return self.repo.git.merge(abort=abort)
 
@@ -198,8 +730,213 @@ class GitManagerPython(GitManagerInterface):
     def rm(self, target: str, cached=False):
         return self.repo.git.rm(target, cached=cached)
 
+    @invalidates_refs
     def tag(self, tag: str):
         return self.repo.git.tag(tag)
 
     def version(self):
         return self.repo.git.version()
+
+
+class GitManagerInProcess(GitManagerPython):
+    """
+    Writes blobs, trees, commits, the index and the refs (with their reflogs) through GitPython without spawning git,
+    for the operations run on every auto-commit. Hooks are not run. Anything it cannot do exactly as git would
+    (content filters, hard resets, merges in progress, index formats GitPython cannot read) is left to git.
+    """
+    # Objects are read by GitPython itself rather than through a `git cat-file` helper
+    repo_options = {"odbt": RepackAwareGitDB}
+
+    def __init__(self, repo_path, ssh_path, nickname, pat):
+        super().__init__(repo_path, ssh_path, nickname, pat)
+        self.git_dir = Path(self.repo.git_dir)
+        try:
+            self.repo.index.entries
+            self.in_process = not self.has_content_filters()
+        except Exception as e:
+            logging.warning(f"The index cannot be handled in-process ({e}), falling back to git commands.")
+            self.in_process = False
+
+    def add(self, file_path, intent_to_add=False, force=False):
+        path = Path(file_path)
+        if intent_to_add or not self.in_process or path.is_dir():
+            return super().add(file_path, intent_to_add=intent_to_add, force=force)
+        relative_path = path.relative_to(self.repo_path).as_posix() if path.is_absolute() else path.as_posix()
+        return retry_on_index_lock(lambda: self.__add(path, relative_path, force))
+
+    def __add(self, path: Path, relative_path: str, force: bool):
+        index = self.repo.index
+        is_tracked = (relative_path, 0) in index.entries
+        if not os.path.lexists(path):
+            if not is_tracked:
+                raise GitCommandError(["git", "add", relative_path], 128,
+                                      f"fatal: pathspec '{relative_path}' did not match any files")
+            del index.entries[(relative_path, 0)]
+            index.write()
+            return
+        if not force and not is_tracked and self.is_ignored(path):
+            raise GitCommandError(["git", "add", relative_path], 1,
+                                  f"The following paths are ignored by one of your .gitignore files:\n{relative_path}")
+        index.add([relative_path])
+
+    def add_paths(self, paths):
+        if not self.in_process:
+            return super().add_paths(paths)
+        for path in paths:
+            self.add(path)
+
+    def get_committed_blob(self, file_path, ref="HEAD"):
+        path = Path(file_path)
+        return self._get_tree_blob(path.relative_to(self.repo_path) if path.is_absolute() else path, ref)
+
+    def snapshot_commit(self, message: str, branch: str, paths, amend=False) -> str:
+        if not self.in_process:
+            return super().snapshot_commit(message, branch, paths, amend)
+        base = self.get_commit_id(f"refs/heads/{branch}") or self.get_commit_id("HEAD")
+        # In memory only: the tree is written from it, the index file itself is never written
+        index = IndexFile.new(self.repo, self.repo.commit(base).tree)
+        for path in paths:
+            path = Path(path)
+            relative_path = path.relative_to(self.repo_path).as_posix() if path.is_absolute() else path.as_posix()
+            if os.path.lexists(path):
+                index.add([relative_path], write=False)
+            else:
+                index.entries.pop((relative_path, 0), None)
+        return self._commit_tree_on_branch(index.write_tree(), message, branch, amend)
+
+    def _commit_tree_on_branch(self, tree, message: str, branch: str, amend=False) -> str:
+        if not self.in_process:
+            return super()._commit_tree_on_branch(tree, message, branch, amend)
+        tip = self.get_commit_id(f"refs/heads/{branch}")
+        if tip is None:
+            parents = [self.repo.commit("HEAD")]
+        else:
+            parents = list(self.repo.commit(tip).parents) if amend else [self.repo.commit(tip)]
+        # Like `git commit-tree -m`, which only ends the message with a newline
+        commit = Commit.create_from_tree(self.repo, tree, message if message.endswith("\n") else f"{message}\n",
+                                         parent_commits=parents)
+        logmsg = f"commit{' (amend)' if amend else ''}: {message.splitlines()[0]}"
+        self.__update_ref(f"refs/heads/{branch}", commit, tip, logmsg)
+        return commit.hexsha
+
+    def __update_ref(self, ref: str, commit: Commit, old: Optional[str], logmsg: str):
+        """
+        Compare-and-swap like `git update-ref <ref> <new> <old>`: the ref is only moved if, with its lock held, it still
+        points on disk to `old`, a concurrent update making it fail instead of being lost.
+        """
+        ref_path = self.git_dir / ref
+        lock_path = ref_path.with_name(ref_path.name + ".lock")
+        ref_path.parent.mkdir(parents=True, exist_ok=True)
+        try:
+            lock = os.open(lock_path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o666)
+        except FileExistsError:
+            raise GitCommandError(["git", "update-ref", ref], 128,
+                                  f"fatal: cannot lock ref '{ref}': Unable to create '{lock_path}': File exists.")
+        try:
+            with os.fdopen(lock, "w") as lock_file:
+                if self._read_ref(ref) != old:
+                    # The cache missed the move, it is read again from disk next time
+                    self.refs.invalidate()
+                    raise GitCommandError(["git", "update-ref", ref], 128,
+                                          f"fatal: cannot lock ref '{ref}': reference changed")
+                lock_file.write(f"{commit.hexsha}\n")
+            # Like git, the move is logged before the ref is, in the reflog of HEAD too if it is checked out
+            old_binsha = bytes.fromhex(old) if old else b"\0" * 20
+            logged_refs = [ref] + (["HEAD"] if self._read_head_target() == ref else [])
+            for logged_ref in logged_refs:
+                RefLog.append_entry(commit.committer, RefLog.path(SymbolicReference(self.repo, logged_ref)),
+                                    old_binsha, commit.binsha, logmsg)
+            os.replace(lock_path, ref_path)
+        finally:
+            if lock_path.exists():
+                lock_path.unlink()
+        self.refs.update(ref, commit.hexsha)
+
+    def commit(self, message: str, amend=False, allow_empty=False):
+        head_id = self.get_commit_id("HEAD")
+        if not self.in_process or head_id is None or (self.git_dir / "MERGE_HEAD").exists():
+            return super().commit(message, amend=amend, allow_empty=allow_empty)
+        message = cleaned_message(message)
+        if not message:
+            raise GitCommandError(["git", "commit"], 1, "Aborting commit due to empty commit message.")
+        head_commit = self.repo.commit(head_id)
+        parents = list(head_commit.parents) if amend else [head_commit]
+        tree = self.repo.index.write_tree()
+        if not allow_empty and parents and tree.binsha == parents[0].tree.binsha:
+            raise GitCommandError(["git", "commit"], 1, "nothing to commit, working tree clean")
+        author = {}
+        if amend:
+            # Like git, amending keeps the authorship of the replaced commit
+            author = {"author": head_commit.author,
+                      "author_date": f"{head_commit.authored_date} "
+                                     f"{altz_to_utctz_str(head_commit.author_tz_offset)}"}
+        commit = Commit.create_from_tree(self.repo, tree, message, parent_commits=parents, **author)
+        self.__move_head(commit, f"commit{' (amend)' if amend else ''}: {message.splitlines()[0]}")
+        return commit.hexsha
+
+    def reset(self, ref: str, soft=False, mixed=True, hard=False):
+        if hard or not self.in_process or self.get_commit_id("HEAD") is None:
+            return super().reset(ref, soft=soft, mixed=mixed, hard=hard)
+        # Resolved before HEAD moves, reflog references such as HEAD@{2} would shift otherwise
+        commit = self.__resolve(ref)
+        self.__move_head(commit, f"reset: moving to {ref}")
+        if not soft:
+            retry_on_index_lock(lambda: self.__reset_index(commit))
+
+    def __reset_index(self, commit: Commit):
+        index = self.repo.index
+        entries = {}
+        for key, entry in IndexFile.new(self.repo, commit.tree).entries.items():
+            previous_entry = index.entries.get(key)
+            # Keeping the stat data of unchanged entries spares git a rehash of the whole working tree
+            same_blob = previous_entry is not None and (previous_entry.binsha, previous_entry.mode) == \
+                (entry.binsha, entry.mode)
+            entries[key] = previous_entry if same_blob else entry
+        index.entries.clear()
+        index.entries.update(entries)
+        index.write()
+
+    def branch(self, branch: str, force=False):
+        if not self.in_process:
+            return super().branch(branch, force=force)
+        exists = self.has_branch(branch)
+        if exists and not force:
+            raise GitCommandError(["git", "branch", branch], 128, f"fatal: A branch named '{branch}' already exists.")
+        head = self.repo.create_head(branch, "HEAD", force=force,
+                                     logmsg="branch: Reset to HEAD" if exists else "branch: Created from HEAD")
+        self.refs.update(head.path, head.commit.hexsha)
+
+    def tag(self, tag: str):
+        if not self.in_process:
+            return super().tag(tag)
+        try:
+            tag_reference = self.repo.create_tag(tag)
+        except OSError as e:
+            raise GitCommandError(["git", "tag", tag], 128, str(e))
+        self.refs.update(tag_reference.path, tag_reference.commit.hexsha)
+
+    def __resolve(self, ref: str) -> Commit:
+        match = re.fullmatch(r"(.*)@\{(\d+)\}", ref)
+        if match is None:
+            return self.repo.commit(ref)
+        # GitPython counts reflog entries from the oldest one, git from the newest one
+        name = match.group(1) or "HEAD"
+        reference = self.repo.head if name == "HEAD" else self.repo.refs[name]
+        try:
+            entry = reference.log_entry(-1 - int(match.group(2)))
+        except IndexError:
+            raise GitCommandError(["git", "reset", ref], 128, f"fatal: log for '{name}' is too short")
+        return self.repo.commit(entry.newhexsha)
+
+    def __move_head(self, commit: Commit, logmsg: str):
+        head = self.repo.head
+        # Like git, the move is logged in the HEAD reflog and in the one of the checked out branch
+        reference = head if head.is_detached else head.ref
+        reference.set_commit(commit, logmsg=logmsg)
+        self.refs.update(reference.path, commit.hexsha)
+
+
+GIT_ENGINES = {
+    "subprocess": GitManagerPython,
+    "in-process": GitManagerInProcess,
+}
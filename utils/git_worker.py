@@ -0,0 +1,101 @@
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+
+class GitWorker:
+    """
+    Single thread executing every job that mutates the repository, in submission order.
+    """
+
+    def __init__(self, max_queue_size: int = 100):
+        self._queue = queue.Queue(maxsize=max_queue_size)
+        self._thread = None
+        self._start_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self.jobs_done = 0
+        self.total_latency = 0.0
+        self.max_latency = 0.0
+        self.last_latency = 0.0
+        self.last_wait = 0.0
+
+    @property
+    def queue_depth(self) -> int:
+        return self._queue.qsize()
+
+    def is_worker_thread(self) -> bool:
+        return threading.current_thread() is self._thread
+
+    def submit(self, job, *args, **kwargs) -> Future:
+        """
+        Queues a job, waiting for a free slot when the queue is full.
+        :return: a future resolved with the result of the job
+        """
+        future = Future()
+        if self.is_worker_thread():
+            # A job submitting another one would otherwise wait for itself
+            self.__execute(future, job, args, kwargs, time.monotonic())
+            return future
+        self.__ensure_started()
+        self._queue.put((future, job, args, kwargs, time.monotonic()))
+        return future
+
+    def run(self, job, *args, **kwargs):
+        """
+        Queues a job and waits for its result, raising its exception if any.
+        """
+        return self.submit(job, *args, **kwargs).result()
+
+    def stop(self, timeout: float = None):
+        thread = self._thread
+        if thread is None:
+            return
+        self._queue.put(None)
+        thread.join(timeout)
+        self._thread = None
+        logging.info(f"Git worker stopped: {self.stats()}")
+
+    def stats(self) -> dict:
+        with self._stats_lock:
+            return {
+                "queue_depth": self.queue_depth,
+                "jobs_done": self.jobs_done,
+                "last_wait": self.last_wait,
+                "last_latency": self.last_latency,
+                "mean_latency": self.total_latency / self.jobs_done if self.jobs_done else 0.0,
+                "max_latency": self.max_latency,
+            }
+
+    def __ensure_started(self):
+        with self._start_lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self.__run, name="GitWorker", daemon=True)
+                self._thread.start()
+
+    def __run(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            future, job, args, kwargs, submitted_at = item
+            self.__execute(future, job, args, kwargs, submitted_at)
+
+    def __execute(self, future: Future, job, args, kwargs, submitted_at: float):
+        if not future.set_running_or_notify_cancel():
+            return
+        started_at = time.monotonic()
+        try:
+            future.set_result(job(*args, **kwargs))
+        except BaseException as e:
+            future.set_exception(e)
+        finished_at = time.monotonic()
+        with self._stats_lock:
+            self.jobs_done += 1
+            self.last_wait = started_at - submitted_at
+            self.last_latency = finished_at - started_at
+            self.total_latency += self.last_latency
+            self.max_latency = max(self.max_latency, self.last_latency)
+        logging.debug(f"Git job {getattr(job, '__name__', job)} waited {self.last_wait:.3f}s, "
+                      f"ran {self.last_latency:.3f}s, {self.queue_depth} job(s) queued")
@@ -0,0 +1,149 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Optional
+
+try:
+    import pathspec
+except ImportError:
+    pathspec = None
+
+IGNORE_FILE_NAME = ".gitignore"
+
+
+def rebase_pattern(line: str, prefix: str) -> Optional[str]:
+    """
+    Rewrites a pattern read from the ignore file of the folder `prefix` so that it applies from the repository root.
+    :return: the rewritten pattern, None for blank lines and comments
+    """
+    if not line.endswith("\\ "):
+        line = line.rstrip()
+    if not line or line.startswith("#"):
+        return None
+    if not prefix:
+        return line
+
+    negation = "!" if line.startswith("!") else ""
+    pattern = line[len(negation):]
+    anchored = "/" in pattern.rstrip("/")
+    pattern = pattern.lstrip("/")
+    return f"{negation}{prefix}{'' if anchored else '**/'}{pattern}"
+
+
+def read_patterns(path: Path, prefix: str = "") -> list[str]:
+    try:
+        with open(path, "r", encoding="utf-8", errors="replace") as ignore_file:
+            lines = ignore_file.read().splitlines()
+    except OSError:
+        return []
+    return [pattern for pattern in (rebase_pattern(line, prefix) for line in lines) if pattern is not None]
+
+
+class GitignoreMatcher:
+    """
+    In-memory equivalent of `git check-ignore` built from the global excludes file, `.git/info/exclude` and every
+    nested `.gitignore`. Results are kept in a bounded cache that is dropped whenever an ignore file changes.
+    """
+
+    def __init__(self, repo_path, global_excludes_path=None, cache_size: int = 4096, check_interval: float = 1.0):
+        self.repo_path = Path(repo_path).resolve()
+        self.global_excludes_path = Path(global_excludes_path) if global_excludes_path else None
+        self.cache_size = cache_size
+        self.check_interval = check_interval
+        self._spec = None
+        self._watched_sources = {}
+        self._last_check = 0
+        self._cache = OrderedDict()
+        self._lock = threading.RLock()
+
+    @staticmethod
+    def is_available() -> bool:
+        return pathspec is not None and hasattr(pathspec, "GitIgnoreSpec")
+
+    def is_ignore_file(self, path) -> bool:
+        path = Path(path)
+        return path.name == IGNORE_FILE_NAME or path in self._watched_sources
+
+    def invalidate(self):
+        with self._lock:
+            self._spec = None
+            self._cache.clear()
+
+    def is_ignored(self, path) -> bool:
+        relative_path = self.__relative(path)
+        if relative_path is None:
+            return False
+        with self._lock:
+            self.__check_sources()
+            if relative_path in self._cache:
+                self._cache.move_to_end(relative_path)
+                return self._cache[relative_path]
+            if self._spec is None:
+                self.__load()
+            is_dir = (self.repo_path / relative_path).is_dir()
+            ignored = self.__match(relative_path + "/" if is_dir else relative_path)
+            self._cache[relative_path] = ignored
+            if len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+            return ignored
+
+    def __relative(self, path) -> Optional[str]:
+        path = Path(path)
+        if not path.is_absolute():
+            path = self.repo_path / path
+        try:
+            relative_path = path.relative_to(self.repo_path).as_posix()
+        except ValueError:
+            return None
+        if relative_path == "." or ".git" in Path(relative_path).parts:
+            return None
+        return relative_path
+
+    def __match(self, relative_path: str) -> bool:
+        # As with git, a file cannot be re-included when one of its parent folders is excluded
+        parts = relative_path.rstrip("/").split("/")
+        for depth in range(1, len(parts)):
+            if self._spec.match_file("/".join(parts[:depth]) + "/"):
+                return True
+        return self._spec.match_file(relative_path)
+
+    def __check_sources(self):
+        # Sources outside of the working tree are not seen by the watcher, they are polled instead
+        now = time.monotonic()
+        if self._spec is None or now - self._last_check < self.check_interval:
+            return
+        self._last_check = now
+        for source, mtime in self._watched_sources.items():
+            if self.__mtime(source) != mtime:
+                self.invalidate()
+                return
+
+    def __load(self):
+        info_exclude_path = self.repo_path / ".git" / "info" / "exclude"
+        self._watched_sources = {source: self.__mtime(source)
+                                 for source in (self.global_excludes_path, info_exclude_path) if source}
+        patterns = []
+        for source in self._watched_sources:
+            patterns += read_patterns(source)
+        spec = pathspec.GitIgnoreSpec.from_lines(patterns)
+
+        for folder, folder_names, file_names in os.walk(self.repo_path):
+            relative_folder = Path(folder).relative_to(self.repo_path).as_posix()
+            prefix = "" if relative_folder == "." else relative_folder + "/"
+            if IGNORE_FILE_NAME in file_names:
+                patterns += read_patterns(Path(folder) / IGNORE_FILE_NAME, prefix)
+                spec = pathspec.GitIgnoreSpec.from_lines(patterns)
+            # git does not read the ignore files of excluded folders, neither do we
+            folder_names[:] = [name for name in folder_names
+                               if name != ".git" and not spec.match_file(f"{prefix}{name}/")]
+        self._spec = spec
+        self._last_check = time.monotonic()
+
+    @staticmethod
+    def __mtime(path: Path):
+        try:
+            return os.stat(path).st_mtime_ns
+        except OSError:
+            return None
@@ -3,9 +3,6 @@ from abc import ABC, abstractmethod
 from pathlib import Path
 
 
-from utils import ok_dialog, radiolist_dialog
-
-
 class IdentityCreatorInterface(ABC):
     def __init__(self):
         pass
@@ -42,6 +39,8 @@ class IdentityCreatorInterface(ABC):
 
 class IdentityCreatorDialog(IdentityCreatorInterface):
     def ask_first_name(self) -> str:
+        from utils.dialogs import ok_dialog
+
         first_name = ok_dialog(
             title='Creation of the identity file',
             text='Please enter your first name: ').run()
@@ -49,6 +48,8 @@ class IdentityCreatorDialog(IdentityCreatorInterface):
         return first_name
 
     def ask_last_name(self) -> str:
+        from utils.dialogs import ok_dialog
+
         last_name = ok_dialog(
             title='Creation of the identity file',
             text='Please enter your last name: ').run()
@@ -56,6 +57,8 @@ class IdentityCreatorDialog(IdentityCreatorInterface):
         return last_name
 
     def ask_group(self, groups: list) -> str:
+        from utils.dialogs import radiolist_dialog
+
         groupss = [(groups[i], groups[i]) for i in range(len(groups))] if len(groups) > 0 else [("1", "1"),
                                                                                                 ("2", "2")]
 
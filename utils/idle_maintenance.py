@@ -0,0 +1,122 @@
+import logging
+import shutil
+import subprocess
+import threading
+import time
+
+from utils.constant import MAINTENANCE_IDLE_DELAY, MAINTENANCE_MIN_INTERVAL, MAINTENANCE_LOOSE_OBJECTS, \
+    MAINTENANCE_REFLOG_EXPIRE
+
+STEPS = [
+    ["commit-graph", "write", "--reachable", "--split"],
+    # Without -a: only the loose objects are packed, the existing packs are left alone
+    ["repack", "-d", "-q", "--no-write-bitmap-index"],
+]
+
+
+class IdleMaintenance:
+    """
+    Keeps the repository fast during a session of micro-commits: once the watcher has been idle for `idle_delay`
+    seconds, and at most every `min_interval` seconds, it writes a commit-graph, packs the loose objects and expires the
+    old reflog entries. Any new event interrupts it, the running git command being terminated.
+    """
+
+    def __init__(self, git_manager, repo_path, idle_delay: float = MAINTENANCE_IDLE_DELAY,
+                 min_interval: float = MAINTENANCE_MIN_INTERVAL, loose_objects: int = MAINTENANCE_LOOSE_OBJECTS,
+                 reflog_expire: str = MAINTENANCE_REFLOG_EXPIRE):
+        self.git_manager = git_manager
+        self.repo_path = repo_path
+        self.idle_delay = idle_delay
+        self.min_interval = min_interval
+        self.loose_objects = loose_objects
+        self.reflog_expire = reflog_expire
+        self.git_executable = shutil.which("git")
+        self.last_report = None
+        self._last_activity_time = time.monotonic()
+        self._last_run_time = None
+        self._condition = threading.Condition()
+        self._interrupted = threading.Event()
+        self._running = False
+        self._thread = None
+
+    def notify_activity(self):
+        with self._condition:
+            self._last_activity_time = time.monotonic()
+        self._interrupted.set()
+
+    def start(self):
+        if self.git_executable is None:
+            logging.warning("git is not available, the repository will not be maintained.")
+            return
+        with self._condition:
+            self._running = True
+        self._thread = threading.Thread(target=self.__run, name="IdleMaintenance", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        with self._condition:
+            self._running = False
+            self._condition.notify_all()
+        self._interrupted.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def run_once(self) -> bool:
+        """
+        Maintains the repository right away.
+        :return: whether the maintenance went through without being interrupted
+        """
+        self._interrupted.clear()
+        before = self.git_manager.count_objects()
+        if before.get("count", 0) < self.loose_objects:
+            logging.debug(f"Repository maintenance skipped, {before.get('count', 0)} loose objects.")
+            return True
+        started = time.monotonic()
+        completed = all(self.__run_step(step) for step in STEPS) and not self._interrupted.is_set()
+        if completed:
+            self.git_manager.run(self.git_manager.expire_reflogs, self.reflog_expire)
+        after = self.git_manager.count_objects()
+        self.last_report = {"before": before, "after": after, "duration": time.monotonic() - started,
+                            "completed": completed}
+        logging.info(f"Repository maintenance {'done' if completed else 'interrupted'} in "
+                     f"{self.last_report['duration']:.1f}s: {before.get('count')} loose objects and "
+                     f"{before.get('in-pack')} packed objects before, {after.get('count')} and "
+                     f"{after.get('in-pack')} after.")
+        return completed
+
+    def __due_time(self) -> float:
+        idle_time = self._last_activity_time + self.idle_delay
+        return idle_time if self._last_run_time is None else max(idle_time, self._last_run_time + self.min_interval)
+
+    def __run(self):
+        while True:
+            with self._condition:
+                while self._running and time.monotonic() < self.__due_time():
+                    self._condition.wait(self.__due_time() - time.monotonic())
+                if not self._running:
+                    return
+            try:
+                if self.run_once():
+                    self._last_run_time = time.monotonic()
+            except Exception as e:
+                logging.warning(f"Repository maintenance failed: {e}")
+                self._last_run_time = time.monotonic()
+            with self._condition:
+                # Waits for the next idle period, whether it completed or not
+                self._last_activity_time = max(self._last_activity_time, time.monotonic())
+
+    def __run_step(self, args: list[str]) -> bool:
+        if self._interrupted.is_set():
+            return False
+        process = subprocess.Popen([self.git_executable] + args, cwd=self.repo_path,
+                                   stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+        while process.poll() is None:
+            if self._interrupted.wait(0.05):
+                # SIGTERM lets git remove its lock and temporary files
+                process.terminate()
+                process.wait()
+                return False
+        if process.returncode != 0:
+            logging.warning(f"git {' '.join(args)} failed: {process.stderr.read().decode(errors='replace').strip()}")
+        return True
@@ -0,0 +1,179 @@
+import contextlib
+import logging
+import os
+import threading
+from collections import Counter
+from functools import partial
+from typing import Optional
+
+from watchdog.observers.api import BaseObserver, DEFAULT_OBSERVER_TIMEOUT
+from watchdog.observers.polling import PollingEmitter
+from watchdog.utils import platform
+
+NATIVE_BACKEND = "native"
+POLLING_BACKEND = "polling"
+
+
+def _inotify_emitter():
+    from watchdog.observers.inotify import InotifyEmitter
+    return InotifyEmitter
+
+
+def _fsevents_emitter():
+    from watchdog.observers.fsevents import FSEventsEmitter
+    return FSEventsEmitter
+
+
+def _kqueue_emitter():
+    from watchdog.observers.kqueue import KqueueEmitter
+    return KqueueEmitter
+
+
+def _windows_emitter():
+    from watchdog.observers.read_directory_changes import WindowsApiEmitter
+    return WindowsApiEmitter
+
+
+def _polling_emitter():
+    return PollingEmitter
+
+
+BACKENDS = {
+    "inotify": _inotify_emitter,
+    "fsevents": _fsevents_emitter,
+    "kqueue": _kqueue_emitter,
+    "windows": _windows_emitter,
+    POLLING_BACKEND: _polling_emitter,
+}
+
+
+def native_backends() -> list[str]:
+    """
+    Returns the kernel-event backends to try on this platform, best first.
+    """
+    if platform.is_linux():
+        return ["inotify"]
+    if platform.is_darwin():
+        return ["fsevents", "kqueue"]
+    if platform.is_bsd():
+        return ["kqueue"]
+    if platform.is_windows():
+        return ["windows"]
+    return []
+
+
+def resolve_backend(backend: str = NATIVE_BACKEND):
+    """
+    Finds the first usable emitter class for the requested backend, polling being the last resort.
+    :return: the backend name and its emitter class
+    """
+    if backend not in BACKENDS and backend != NATIVE_BACKEND:
+        raise ValueError(f"Error: backend must be one of the following: "
+                         f"{[NATIVE_BACKEND] + list(BACKENDS)!r}.")
+    candidates = native_backends() if backend == NATIVE_BACKEND else [backend]
+    for candidate in candidates:
+        try:
+            return candidate, BACKENDS[candidate]()
+        except Exception as e:
+            logging.warning(f"Watcher backend '{candidate}' is unavailable ({e}), falling back.")
+    return POLLING_BACKEND, PollingEmitter
+
+
+def event_paths(event) -> list[str]:
+    paths = [os.path.abspath(os.fsdecode(event.src_path))]
+    if hasattr(event, "dest_path"):
+        paths.append(os.path.abspath(os.fsdecode(event.dest_path)))
+    return paths
+
+
+def file_signature(path) -> Optional[tuple[int, int]]:
+    """
+    :return: the size and modification time of the file, None if it does not exist
+    """
+    try:
+        status = os.stat(path)
+        return status.st_size, status.st_mtime_ns
+    except OSError:
+        return None
+
+
+class PausingObserver(BaseObserver):
+    """
+    Observer able to tell the events caused by LAWG itself from the edits of the student: the paths written by an
+    operation are declared beforehand, and their events are dropped only while the files are still in the state the
+    operation left them in.
+    """
+
+    def __init__(self, backend: str = NATIVE_BACKEND, timeout=DEFAULT_OBSERVER_TIMEOUT, listdir=None):
+        self.backend, emitter_class = resolve_backend(backend)
+        if self.backend == POLLING_BACKEND and listdir is not None:
+            emitter_class = partial(PollingEmitter, listdir=listdir)
+        super().__init__(emitter_class, timeout=timeout)
+        self._generation = 0
+        self._writing = Counter()
+        self._expected = {}
+        self._deferred = []
+        self._expectation_lock = threading.Lock()
+
+    @property
+    def is_polling(self):
+        return self.backend == POLLING_BACKEND
+
+    @property
+    def generation(self):
+        return self._generation
+
+    def dispatch_events(self, event_queue, timeout):
+        event, watch = event_queue.get(block=True, timeout=timeout)
+        try:
+            if self.__is_self_generated(event, watch):
+                return
+            with self._lock:
+                # Same as BaseObserver: handlers may be unscheduled by the handlers themselves
+                for handler in list(self._handlers.get(watch, [])):
+                    if handler in self._handlers.get(watch, []):
+                        handler.dispatch(event)
+        finally:
+            event_queue.task_done()
+
+    @contextlib.contextmanager
+    def ignore_events(self, paths=()):
+        """
+        Suppresses the events the enclosed operation causes on `paths`, without blocking nor dropping anything else.
+        :return: the generation of the operation
+        """
+        paths = [os.path.abspath(os.fsdecode(path)) for path in paths]
+        with self._expectation_lock:
+            self._generation += 1
+            generation = self._generation
+            self._writing.update(paths)
+        try:
+            yield generation
+        finally:
+            with self._expectation_lock:
+                self._writing.subtract(paths)
+                self._writing += Counter()
+                for path in paths:
+                    self._expected[path] = (generation, file_signature(path))
+                released = [(event, watch) for event, watch in self._deferred
+                            if not any(path in self._writing for path in event_paths(event))]
+                self._deferred = [deferred for deferred in self._deferred if deferred not in released]
+            # Checked again now that the final state of the files is known
+            for event, watch in released:
+                self.event_queue.put((event, watch))
+
+    def __is_self_generated(self, event, watch) -> bool:
+        paths = event_paths(event)
+        with self._expectation_lock:
+            if any(path in self._writing for path in paths):
+                self._deferred.append((event, watch))
+                return True
+            if not all(path in self._expected for path in paths):
+                return False
+            if all(file_signature(path) == self._expected[path][1] for path in paths):
+                logging.debug(f"Event {event} suppressed (generation {self._expected[paths[0]][0]}).")
+                return True
+            # Touched again since the operation: the student is at work, stop ignoring these paths
+            for path in paths:
+                self._expected.pop(path, None)
+            return False
@@ -32,16 +32,20 @@ class PromptInterface(ABC):
 
 
 class PromptAutocomplete(PromptInterface):
-    def prompt(self):
+    def __init__(self, commands: List[CommandInterface], bottom_toolbar):
+        super().__init__(commands, bottom_toolbar)
         commands_dict = {command: args for x in
                          self.commands for command, args in
                          x.command.items()}
-        commands = NestedCompleter.from_nested_dict(commands_dict)
+        self.completer = NestedCompleter.from_nested_dict(commands_dict)
+        self.validator = CommandValidator(self.commands)
+
+    def prompt(self):
         command_str = prompt(
             "Type a command (use Tab for autocompletion): ",
-            completer=commands,
+            completer=self.completer,
             complete_while_typing=True,
-            validator=CommandValidator(self.commands),
+            validator=self.validator,
             bottom_toolbar=self.bottom_toolbar)
         command = find_command(command_str, self.commands)
         if command:
@@ -0,0 +1,186 @@
+import json
+import logging
+import os
+import threading
+import time
+from pathlib import Path
+
+from utils.constant import PUSH_MAX_DELAY, PUSH_MAX_COMMITS, PUSH_RETRY_DELAY, PUSH_MAX_RETRY_DELAY
+
+
+class PushScheduler:
+    """
+    Pushes in the background: requests are collapsed into a single pending push, sent once `max_delay` seconds passed
+    or `max_commits` requests piled up, and retried with an exponential backoff. The pending push is kept in an outbox
+    file so that a push that could not be sent before the end of the session is sent by the next one.
+    """
+
+    def __init__(self, push, outbox_path, max_delay: float = PUSH_MAX_DELAY, max_commits: int = PUSH_MAX_COMMITS,
+                 retry_delay: float = PUSH_RETRY_DELAY, max_retry_delay: float = PUSH_MAX_RETRY_DELAY):
+        self.push = push
+        self.outbox_path = Path(outbox_path)
+        self.max_delay = max_delay
+        self.max_commits = max_commits
+        self.retry_delay = retry_delay
+        self.max_retry_delay = max_retry_delay
+        self.pushes_done = 0
+        self.failures = 0
+        self._condition = threading.Condition()
+        self._pending = None
+        self._first_request_time = None
+        self._next_attempt_time = None
+        self._attempts = 0
+        self._urgent = False
+        self._in_flight = False
+        self._running = True
+        self._thread = None
+        self._outbox_loaded = False
+
+    @property
+    def is_pending(self) -> bool:
+        with self._condition:
+            return self._pending is not None or self._in_flight
+
+    def schedule(self, all: bool = True, tags: bool = False, urgent: bool = False):
+        """
+        Requests a push, merged with the pending one if any.
+        :param urgent: push without waiting for the delay or commit budgets
+        """
+        with self._condition:
+            self.__load_outbox()
+            if self._pending is None:
+                self._pending = {"all": False, "tags": False, "commits": 0}
+                self._first_request_time = time.monotonic()
+            self._pending["all"] |= all
+            self._pending["tags"] |= tags
+            self._pending["commits"] += 1
+            self._urgent |= urgent
+            self.__save()
+            self._condition.notify_all()
+        self.__ensure_started()
+
+    def flush(self, timeout: float = None) -> bool:
+        """
+        Pushes what is pending right away and waits for it.
+        :return: whether everything was pushed before the timeout
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._condition:
+            if self._pending is not None:
+                self._urgent = True
+                self._next_attempt_time = None
+                self._condition.notify_all()
+            self.__ensure_started()
+            while self._pending is not None or self._in_flight:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._condition.wait(remaining)
+            return True
+
+    def stop(self):
+        """
+        Stops the background thread, a pending push stays in the outbox for the next session.
+        """
+        with self._condition:
+            self._running = False
+            self._condition.notify_all()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def __ensure_started(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._running = True
+            self._thread = threading.Thread(target=self.__run, name="PushScheduler", daemon=True)
+            self._thread.start()
+
+    def __due_time(self) -> float:
+        due = self._first_request_time if self._urgent or self._pending["commits"] >= self.max_commits \
+            else self._first_request_time + self.max_delay
+        return max(due, self._next_attempt_time or due)
+
+    def __run(self):
+        while True:
+            with self._condition:
+                while self._running and (self._pending is None or time.monotonic() < self.__due_time()):
+                    self._condition.wait(None if self._pending is None else self.__due_time() - time.monotonic())
+                if not self._running:
+                    return
+                request, self._pending = self._pending, None
+                self._in_flight = True
+            error = None
+            try:
+                self.push(all=request["all"], tags=request["tags"])
+            except Exception as e:
+                error = e
+            with self._condition:
+                self._in_flight = False
+                if error is not None:
+                    self.failures += 1
+                    retry_delay = min(self.retry_delay * 2 ** self._attempts, self.max_retry_delay)
+                    self._attempts += 1
+                    self._next_attempt_time = time.monotonic() + retry_delay
+                    self.__merge_back(request)
+                    logging.warning(f"Push failed ({error}), retrying in {retry_delay} seconds.")
+                else:
+                    self.pushes_done += 1
+                    self._attempts = 0
+                    self._next_attempt_time = None
+                    if self._pending is None:
+                        self._urgent = False
+                self.__save()
+                self._condition.notify_all()
+
+    def __merge_back(self, request: dict):
+        if self._pending is None:
+            self._pending = request
+            self._first_request_time = time.monotonic()
+            return
+        self._pending["all"] |= request["all"]
+        self._pending["tags"] |= request["tags"]
+        self._pending["commits"] += request["commits"]
+
+    def resume(self):
+        """
+        Sends the push left in the outbox by the previous session, if any.
+        """
+        with self._condition:
+            self.__load_outbox()
+            if self._pending is None:
+                return
+            self._urgent = True
+            self._condition.notify_all()
+        logging.info("Resuming the push left over by the previous session.")
+        self.__ensure_started()
+
+    def __load_outbox(self):
+        # Called with the condition held, before the outbox is first rewritten so that the left over push is not lost
+        if self._outbox_loaded:
+            return
+        self._outbox_loaded = True
+        try:
+            with open(self.outbox_path, "r", encoding="utf-8") as outbox_file:
+                request = json.load(outbox_file)
+        except FileNotFoundError:
+            return
+        except (OSError, ValueError) as e:
+            logging.warning(f"Ignoring the unreadable push outbox {self.outbox_path}: {e}")
+            return
+        if request:
+            self.__merge_back({"all": request.get("all", True), "tags": request.get("tags", False),
+                               "commits": request.get("commits", 1)})
+
+    def __save(self):
+        # Called with the condition held, an in-flight push stays in the outbox until it succeeded
+        try:
+            if self._pending is None:
+                self.outbox_path.unlink(missing_ok=True)
+                return
+            self.outbox_path.parent.mkdir(parents=True, exist_ok=True)
+            temporary_path = self.outbox_path.with_name(self.outbox_path.name + ".tmp")
+            with open(temporary_path, "w", encoding="utf-8") as outbox_file:
+                json.dump(self._pending, outbox_file)
+            os.replace(temporary_path, self.outbox_path)
+        except OSError as e:
+            logging.warning(f"Cannot write the push outbox {self.outbox_path}: {e}")
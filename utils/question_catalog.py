@@ -0,0 +1,99 @@
+from bisect import bisect_left
+from typing import Callable, Iterator, Optional
+
+from prompt_toolkit.completion import Completer, Completion
+
+SEPARATOR = "."
+
+
+class CatalogNode:
+    def __init__(self):
+        self.children = {}
+        self.sorted_keys = []
+        self.question = None
+
+
+class QuestionCatalog:
+    """
+    The questions of the course in a trie of their dot-separated parts (`tp3.ex2.q4`), so that looking a question up or
+    listing the completions of a prefix costs as much as the prefix is long, whatever the size of the course.
+    """
+
+    def __init__(self, questions):
+        self.root = CatalogNode()
+        self.size = 0
+        for question in questions:
+            self.add(str(question))
+
+    def add(self, question: str):
+        node = self.root
+        for part in question.split(SEPARATOR):
+            if part not in node.children:
+                node.children[part] = CatalogNode()
+                node.sorted_keys.insert(bisect_left(node.sorted_keys, part), part)
+            node = node.children[part]
+        if node.question is None:
+            node.question = question
+            self.size += 1
+
+    def __contains__(self, question) -> bool:
+        node = self.__find(str(question).split(SEPARATOR))
+        return node is not None and node.question is not None
+
+    def __len__(self) -> int:
+        return self.size
+
+    def completions(self, prefix: str) -> Iterator[tuple[str, Optional[str], bool]]:
+        """
+        Lists the next part of the ids starting with the prefix, e.g. `tp3.ex1`, `tp3.ex2` for `tp3.e`.
+        :return: for each, the text completing the prefix up to that part, the question it is if any, and whether
+        deeper parts follow
+        """
+        *parent_parts, partial_part = prefix.split(SEPARATOR)
+        node = self.__find(parent_parts)
+        if node is None:
+            return
+        base = SEPARATOR.join(parent_parts + [""]) if parent_parts else ""
+        keys = node.sorted_keys
+        for index in range(bisect_left(keys, partial_part), len(keys)):
+            key = keys[index]
+            if not key.startswith(partial_part):
+                break
+            child = node.children[key]
+            yield base + key, child.question, bool(child.children)
+
+    def questions_under(self, prefix: str) -> Iterator[str]:
+        node = self.__find(prefix.split(SEPARATOR)) if prefix else self.root
+        pending = [node] if node is not None else []
+        while pending:
+            node = pending.pop()
+            if node.question is not None:
+                yield node.question
+            pending.extend(node.children[key] for key in reversed(node.sorted_keys))
+
+    def __find(self, parts) -> Optional[CatalogNode]:
+        node = self.root
+        for part in parts:
+            node = node.children.get(part)
+            if node is None:
+                return None
+        return node
+
+
+class QuestionCompleter(Completer):
+    """
+    Completes a question id one part at a time, the completed questions being marked as done.
+    """
+
+    def __init__(self, catalog: QuestionCatalog, is_completed: Callable[[str], bool] = None):
+        self.catalog = catalog
+        self.is_completed = is_completed or (lambda question: False)
+
+    def get_completions(self, document, complete_event):
+        prefix = document.get_word_before_cursor(WORD=True)
+        for text, question, has_children in self.catalog.completions(prefix):
+            if question is not None:
+                yield Completion(text, start_position=-len(prefix), display=text,
+                                 display_meta="done" if self.is_completed(question) else "")
+            if has_children:
+                yield Completion(text + SEPARATOR, start_position=-len(prefix), display=text + SEPARATOR)
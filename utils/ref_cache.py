@@ -0,0 +1,171 @@
+import logging
+import os
+import threading
+from pathlib import Path
+from typing import Optional
+
+from watchdog.events import FileSystemEventHandler, EVENT_TYPE_MODIFIED, EVENT_TYPE_CREATED, \
+    EVENT_TYPE_DELETED, EVENT_TYPE_MOVED
+from watchdog.observers import Observer
+
+HEAD = "HEAD"
+HEADS_PREFIX = "refs/heads/"
+REMOTES_PREFIX = "refs/remotes/"
+TAGS_PREFIX = "refs/tags/"
+UNKNOWN = object()
+
+
+class RefCache(FileSystemEventHandler):
+    """
+    Commit ids of HEAD and of the refs, the current branch and the branch lists, read from disk once and then kept up
+    to date by the writes of the git manager and by a watch on `.git/refs`, `.git/HEAD` and `.git/packed-refs`.
+    """
+
+    def __init__(self, git_dir, read_ref, list_refs, read_head_target):
+        """
+        :param read_ref: returns the commit id of a full ref name (or HEAD), None if it does not exist
+        :param list_refs: returns the full names of every ref
+        :param read_head_target: returns the full name of the checked out branch, None if HEAD is detached
+        """
+        self.git_dir = Path(git_dir)
+        self.read_ref = read_ref
+        self.list_refs = list_refs
+        self.read_head_target = read_head_target
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.RLock()
+        self._ids = {}
+        self._names = None
+        self._head_target = UNKNOWN
+        self._observer = None
+
+    def start_watching(self):
+        try:
+            observer = Observer()
+            observer.schedule(self, str(self.git_dir), recursive=False)
+            if (self.git_dir / "refs").is_dir():
+                observer.schedule(self, str(self.git_dir / "refs"), recursive=True)
+            observer.start()
+            self._observer = observer
+        except OSError as e:
+            # Without the watch every lookup reads the disk again
+            logging.warning(f"Cannot watch the refs ({e}), they will not be cached.")
+
+    def stop_watching(self):
+        if self._observer is not None:
+            self._observer.stop()
+            self._observer.join()
+            self._observer = None
+
+    @property
+    def is_watching(self) -> bool:
+        return self._observer is not None
+
+    def commit_id(self, name: str) -> Optional[str]:
+        """
+        :param name: HEAD, a full ref name or a short one
+        :return: the commit id, None if the ref does not exist
+        """
+        full_name = self.full_name(name)
+        if full_name is None:
+            return None
+        if not self.is_watching:
+            return self.read_ref(full_name)
+        with self._lock:
+            if full_name in self._ids:
+                self.hits += 1
+                return self._ids[full_name]
+            self.misses += 1
+            self._ids[full_name] = self.read_ref(full_name)
+            return self._ids[full_name]
+
+    def full_name(self, name: str) -> Optional[str]:
+        """
+        :return: the full name of the ref, None if no ref has this short name
+        """
+        if name == HEAD or name.startswith("refs/"):
+            return name
+        # Same precedence as git: a tag shadows a branch of the same name
+        names = self.__names()
+        for prefix in (TAGS_PREFIX, HEADS_PREFIX, REMOTES_PREFIX):
+            if prefix + name in names:
+                return prefix + name
+        return None
+
+    def local_branches(self) -> list[str]:
+        return [name[len(HEADS_PREFIX):] for name in self.__names() if name.startswith(HEADS_PREFIX)]
+
+    def remote_branches(self) -> list[str]:
+        return [name[len(REMOTES_PREFIX):] for name in self.__names()
+                if name.startswith(REMOTES_PREFIX) and not name.endswith("/HEAD")]
+
+    def has_branch(self, branch: str) -> bool:
+        return HEADS_PREFIX + branch in self.__names()
+
+    def current_branch(self) -> Optional[str]:
+        with self._lock:
+            if self._head_target is UNKNOWN or not self.is_watching:
+                self._head_target = self.read_head_target()
+            target = self._head_target
+        return target[len(HEADS_PREFIX):] if target and target.startswith(HEADS_PREFIX) else None
+
+    def update(self, full_name: str, commit_id: Optional[str]):
+        """
+        Records a ref written by the git manager itself, HEAD following the branch it points to.
+        """
+        with self._lock:
+            self._ids[full_name] = commit_id
+            if self._names is not None:
+                if commit_id is None:
+                    self._names.discard(full_name)
+                elif full_name != HEAD:
+                    self._names.add(full_name)
+            if full_name == HEAD:
+                return
+            if self._head_target == full_name:
+                self._ids[HEAD] = commit_id
+            elif self._head_target is UNKNOWN:
+                self._ids.pop(HEAD, None)
+
+    def invalidate(self):
+        """
+        Forgets everything, for the git commands that may move any ref.
+        """
+        with self._lock:
+            self._ids.clear()
+            self._names = None
+            self._head_target = UNKNOWN
+
+    def on_any_event(self, event):
+        if event.event_type not in (EVENT_TYPE_MODIFIED, EVENT_TYPE_CREATED, EVENT_TYPE_DELETED, EVENT_TYPE_MOVED):
+            return
+        # A modified ref keeps the list of names as it is, a created, deleted or moved one does not
+        renamed = event.event_type != EVENT_TYPE_MODIFIED
+        for path in (event.src_path, getattr(event, "dest_path", None)):
+            if path:
+                self.__on_path_changed(Path(os.fsdecode(path)), renamed)
+
+    def __on_path_changed(self, path: Path, renamed: bool):
+        if path.suffix == ".lock":
+            return
+        try:
+            relative_path = path.relative_to(self.git_dir).as_posix()
+        except ValueError:
+            return
+        if relative_path in ("packed-refs", HEAD):
+            self.invalidate()
+        elif relative_path.startswith("refs/"):
+            with self._lock:
+                # Our own writes come back as events, the cache already has their value
+                if relative_path in self._ids and path.is_file() and self._ids[relative_path] == self.read_ref(relative_path):
+                    return
+                self._ids.pop(relative_path, None)
+                self._ids.pop(HEAD, None)
+                if renamed:
+                    self._names = None
+
+    def __names(self) -> set[str]:
+        with self._lock:
+            if self._names is None or not self.is_watching:
+                self._names = set(self.list_refs())
+            return self._names
@@ -0,0 +1,51 @@
+from fnmatch import fnmatchcase
+from pathlib import Path
+from typing import Optional
+
+from utils.constant import SAVE_PATTERNS
+from utils.event_coalescer import CREATED, DELETED, MODIFIED, MOVED
+
+
+class SavePatternRecognizer:
+    """
+    Turns the write sequences of editors (swap/temporary files, atomic renames, backups) into the logical change they
+    stand for, so that a single save of the student gives a single `[modified]` event.
+    """
+
+    def __init__(self, patterns: list[str] = None):
+        self.patterns = SAVE_PATTERNS if patterns is None else patterns
+
+    def is_temporary(self, path) -> bool:
+        name = Path(path).name
+        return any(fnmatchcase(name, pattern) for pattern in self.patterns)
+
+    def recognize(self, kind: str, path: Path, src_path: Optional[Path] = None) \
+            -> list[tuple[str, Path, Optional[Path]]]:
+        """
+        :return: the logical changes, as (kind, path, source path) tuples, behind a raw file event
+        """
+        if kind != MOVED:
+            return [] if self.is_temporary(path) else [(kind, path, None)]
+
+        from_temporary, to_temporary = self.is_temporary(src_path), self.is_temporary(path)
+        if from_temporary and to_temporary:
+            return []
+        if from_temporary:
+            # Temporary file renamed over the target: vim, JetBrains "safe write", gedit, ...
+            return [(MODIFIED, path, None)]
+        if to_temporary:
+            # Target moved aside as a backup, it is recreated right after and the deletion folds into a modification
+            return [(DELETED, src_path, None)]
+        return [(MOVED, path, src_path)]
+
+
+def reconcile_kind(kind: str, is_tracked: bool) -> str:
+    """
+    Fixes the kind of a folded change against the reference: a tracked file can only be modified, an untracked one
+    can only be created.
+    """
+    if kind == CREATED and is_tracked:
+        return MODIFIED
+    if kind == MODIFIED and not is_tracked:
+        return CREATED
+    return kind
@@ -1,12 +1,13 @@
 import sys
 from abc import ABC, abstractmethod
+from concurrent.futures import Future
 from pathlib import Path
 
 from git import GitCommandError
 
 from utils import find_stash_with_message
 from utils.constant import NO_AUTO_BRANCH, AUTO_BRANCH, NO_SESSION_CLOSURE, AUTH_CONFIG_FILE_NAME, CONFIG_FILE_NAME, \
-    DATA_FILE_NAME, IDENTITY_FILE_NAME
+    DATA_FILE_NAME, IDENTITY_FILE_NAME, PUSH_FLUSH_TIMEOUT, DELETE_IN_BACKGROUND
 from utils.data_file_manager import DataFileManagerInterface
 from utils.file_manager import FileManagerInterface
 from utils.file_watcher import FileWatcherInterface
@@ -36,7 +37,10 @@ class SessionManagerInterface(ABC):
         pass
 
     @abstractmethod
-    def open_session(self, __file__):
+    def open_session(self, __file__, repo_path, fetched: Future = None):
+        """
+        :param fetched: a fetch started beforehand, the remote branch is merged without fetching again if it succeeded
+        """
         pass
 
     @abstractmethod
@@ -45,16 +49,34 @@ class SessionManagerInterface(ABC):
 
 
 class SessionManager(SessionManagerInterface):
-    def stash_untracked_files(self, auth_file_path: str):
+    def park_untracked_files(self, auth_file_path: str, kept_paths=()):
+        """
+        Parks the auth file, then the untracked and ignored files but the kept ones, under their own refs and removes
+        them.
+        """
         try:
-            self.git_manager.add(auth_file_path, force=True)
-            self.git_manager.stash(target=auth_file_path, message="auth")
-            self.git_manager.stash(all=True, message="auto")
-        except GitCommandError as stash_error:
+            auth_file = Path(self.git_manager.repo_path) / auth_file_path
+            if auth_file.is_file():
+                self.git_manager.park("auth", [auth_file])
+                self.file_manager.delete_file(auth_file)
+            kept_paths = {Path(path).absolute() for path in kept_paths}
+            untracked_files = [path for path in self.git_manager.get_untracked_files()
+                               if not any(kept_path == path.absolute() or kept_path in path.absolute().parents
+                                          for kept_path in kept_paths)]
+            if self.git_manager.park("untracked", untracked_files) is not None:
+                for untracked_file in untracked_files:
+                    self.file_manager.delete_file(untracked_file)
+        except (GitCommandError, OSError) as park_error:
             pass
 
     def restore_auth_file(self, auth_file_path: str):
+        self.git_manager.run(self.__restore_auth_file, auth_file_path)
+
+    def __restore_auth_file(self, auth_file_path: str):
         try:
+            if self.git_manager.restore_parked("auth") is not None:
+                return
+            # Parked by an older version of LAWG
             stash_list = self.git_manager.stash(command="list")
             auth_stash = find_stash_with_message(stash_list, "auth")
             if auth_stash:
@@ -65,6 +87,8 @@ class SessionManager(SessionManagerInterface):
 
     def restore_all_untracked_files(self):
         try:
+            if self.git_manager.restore_parked("untracked") is not None:
+                return
             stash_list = self.git_manager.stash(command="list")
             auto_stash = find_stash_with_message(stash_list, "auto")
             if auto_stash:
@@ -72,7 +96,12 @@ class SessionManager(SessionManagerInterface):
         except GitCommandError as stash_error:
             pass
 
-    def open_session(self, __file__, repo_path):
+    def open_session(self, __file__, repo_path, fetched=None):
+        self.git_manager.run(self.__resume, repo_path, fetched)
+        self.data_file_manager.set_cross_close(True)
+        self.git_manager.resume_pushes()
+
+    def __resume(self, repo_path, fetched=None):
         cross_close = self.data_file_manager.cross_close
 
         if not cross_close:
@@ -81,37 +110,46 @@ class SessionManager(SessionManagerInterface):
         self.restore_all_untracked_files()
 
         try:
-            code = self.git_manager.pull()
+            code = self.git_manager.pull(fetch=not self.__wait_for_fetch(fetched))
         except GitCommandError as pull_error:
             print("An error as occurred when pulling, aborting the merge...")
             self.git_manager.merge(abort=True)
             print("The program will be stop, please contact your supervisor to handle the problem manually.")
             raise
 
+        if self.file_watcher is not None:
+            # Commits what changed while closed file by file, the resume commit only picks up what is left
+            self.file_watcher.catch_up()
+
         update_gitignore(Path(repo_path) / ".gitignore")
         commit_message = f"Resume"
         if NO_AUTO_BRANCH:
             self.git_manager.add_all()
             self.git_manager.commit(commit_message, allow_empty=True)
-            self.git_manager.push(all=True)
+            self.git_manager.schedule_push(all=True, urgent=True)
         else:
             self.git_manager.duplicate_commit(commit_message, AUTO_BRANCH, allow_empty=True)
-        self.data_file_manager.set_cross_close(True)
+
+    @staticmethod
+    def __wait_for_fetch(fetched: Future) -> bool:
+        if fetched is None:
+            return False
+        try:
+            fetched.result()
+            return True
+        except GitCommandError as fetch_error:
+            # Fetched again by the pull, which reports the error if it happens again
+            return False
 
     def close_session(self, folder_to_watch, __file__):
         self.file_watcher.stop()
-        commit_message = f"Pause"
-        if NO_AUTO_BRANCH:
-            self.git_manager.add_all()
-            self.git_manager.commit(commit_message, allow_empty=True)
-            self.git_manager.push(all=True)
-        else:
-            self.git_manager.duplicate_commit(commit_message, AUTO_BRANCH, allow_empty=True)
-
-        if not NO_SESSION_CLOSURE:
-            auth_file_path = str((Path(folder_to_watch) / AUTH_CONFIG_FILE_NAME).relative_to(folder_to_watch))
-            self.stash_untracked_files(auth_file_path)
+        self.git_manager.run(self.__pause)
 
+        if NO_SESSION_CLOSURE:
+            self.file_watcher.save_snapshot()
+        else:
+            # The files are all recreated with new inodes on the next opening, a snapshot would report them as modified
+            self.file_watcher.discard_snapshot()
             if getattr(sys, 'frozen', False):
                 application_path = Path(sys.executable).relative_to(Path(folder_to_watch).absolute())
             elif __file__:
@@ -120,12 +158,28 @@ class SessionManager(SessionManagerInterface):
                 raise RuntimeError("For some unknown reason, the type of the currently executed file "
                                    "is not recognized.")
 
-            self.file_manager.delete_all(Path(folder_to_watch), [Path(folder_to_watch) / ".git/",
-                                                            Path(folder_to_watch) / CONFIG_FILE_NAME,
-                                                            Path(folder_to_watch) / AUTH_CONFIG_FILE_NAME,
-                                                            Path(folder_to_watch) / DATA_FILE_NAME,
-                                                            Path(folder_to_watch) / IDENTITY_FILE_NAME,
-                                                            Path(folder_to_watch) / ".gitignore",
-                                                            Path(application_path)])
+            kept_paths = [Path(folder_to_watch) / ".git/",
+                          Path(folder_to_watch) / CONFIG_FILE_NAME,
+                          Path(folder_to_watch) / AUTH_CONFIG_FILE_NAME,
+                          Path(folder_to_watch) / DATA_FILE_NAME,
+                          Path(folder_to_watch) / IDENTITY_FILE_NAME,
+                          Path(folder_to_watch) / ".gitignore",
+                          Path(application_path)]
+            auth_file_path = str((Path(folder_to_watch) / AUTH_CONFIG_FILE_NAME).relative_to(folder_to_watch))
+            self.git_manager.run(self.park_untracked_files, auth_file_path, kept_paths)
+
+            self.file_manager.delete_all(Path(folder_to_watch), kept_paths, background=DELETE_IN_BACKGROUND)
 
-        self.data_file_manager.set_cross_close(False)
\ No newline at end of file
+        self.data_file_manager.set_cross_close(False)
+        if not self.git_manager.flush_pushes(PUSH_FLUSH_TIMEOUT):
+            print("Your work could not be sent yet, it will be sent the next time LAWG is launched.")
+        self.git_manager.close()
+
+    def __pause(self):
+        commit_message = f"Pause"
+        if NO_AUTO_BRANCH:
+            self.git_manager.add_all()
+            self.git_manager.commit(commit_message, allow_empty=True)
+            self.git_manager.schedule_push(all=True, urgent=True)
+        else:
+            self.git_manager.duplicate_commit(commit_message, AUTO_BRANCH, allow_empty=True)
\ No newline at end of file
@@ -0,0 +1,149 @@
+import importlib.abc
+import logging
+import sys
+import threading
+import time
+from concurrent.futures import Future
+from contextlib import contextmanager
+
+
+class PhaseTimer:
+    """
+    Times the phases of the startup, the ones on the critical path as well as the ones run in the background, for which
+    the time the critical path waited for them is reported too.
+    """
+
+    def __init__(self, started: float = None):
+        """
+        :param started: the `time.monotonic()` the process started at, now by default
+        """
+        self.phases = []
+        self.started = started if started is not None else time.monotonic()
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def phase(self, name: str):
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            self.__record(name, time.monotonic() - started)
+
+    def background(self, name: str, job, *args, submit=None, **kwargs) -> Future:
+        """
+        Runs the job in its own thread, or through `submit` (e.g. on the git worker) when given.
+        :return: a future of its result
+        """
+        def timed_job():
+            started = time.monotonic()
+            try:
+                return job(*args, **kwargs)
+            finally:
+                self.__record(f"{name} (background)", time.monotonic() - started)
+
+        if submit is not None:
+            future = submit(timed_job)
+        else:
+            future = Future()
+
+            def run():
+                try:
+                    future.set_result(timed_job())
+                except BaseException as e:
+                    future.set_exception(e)
+
+            threading.Thread(target=run, name=f"Startup-{name}", daemon=True).start()
+        future.phase_name = name
+        return future
+
+    def wait(self, future: Future):
+        """
+        :return: the result of the background job, the time spent waiting for it being recorded
+        """
+        with self.phase(f"waiting for {future.phase_name}"):
+            return future.result()
+
+    def report(self) -> str:
+        with self._lock:
+            phases = list(self.phases)
+        details = ", ".join(f"{name} {duration * 1000:.0f} ms" for name, duration in phases)
+        return f"Started in {(time.monotonic() - self.started) * 1000:.0f} ms: {details}"
+
+    def __record(self, name: str, duration: float):
+        with self._lock:
+            self.phases.append((name, duration))
+        logging.debug(f"Startup phase '{name}' took {duration * 1000:.0f} ms")
+
+
+class ImportProfiler(importlib.abc.MetaPathFinder):
+    """
+    Times the import of every module from the moment it is installed, like `python -X importtime` does, which a frozen
+    executable cannot be given.
+    """
+
+    def __init__(self):
+        self.timings = {}
+        self._local = threading.local()
+
+    @classmethod
+    def install(cls) -> "ImportProfiler":
+        profiler = cls()
+        sys.meta_path.insert(0, profiler)
+        return profiler
+
+    def find_spec(self, fullname, path, target=None):
+        for finder in sys.meta_path:
+            if finder is self or not hasattr(finder, "find_spec"):
+                continue
+            spec = finder.find_spec(fullname, path, target)
+            if spec is not None:
+                if spec.loader is not None and hasattr(spec.loader, "exec_module"):
+                    spec.loader = TimedLoader(spec.loader, self, fullname)
+                return spec
+        return None
+
+    @contextmanager
+    def timing(self, name: str):
+        # The time of the modules imported meanwhile is subtracted from the own time of this one
+        stack = self._local.__dict__.setdefault("stack", [])
+        stack.append(0.0)
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            duration = time.monotonic() - started
+            children_duration = stack.pop()
+            if stack:
+                stack[-1] += duration
+            cumulated, own = self.timings.get(name, (0.0, 0.0))
+            self.timings[name] = (cumulated + duration, own + duration - children_duration)
+
+    def report(self, count: int = 15) -> str:
+        timings = sorted(self.timings.items(), key=lambda item: item[1][1], reverse=True)
+        lines = [f"{sum(own for _, own in self.timings.values()) * 1000:.0f} ms of imports in {len(timings)} modules, "
+                 f"the most expensive ones:"]
+        lines += [f"  {own * 1000:7.1f} ms  {name} ({cumulated * 1000:.1f} ms with its imports)"
+                  for name, (cumulated, own) in timings[:count]]
+        return "\n".join(lines)
+
+
+class TimedLoader:
+    """
+    Wraps the loader of a module to time its execution, anything else being left to the wrapped loader.
+    """
+
+    def __init__(self, loader, profiler: ImportProfiler, name: str):
+        self.loader = loader
+        self.profiler = profiler
+        self.name = name
+
+    def create_module(self, spec):
+        with self.profiler.timing(self.name):
+            return self.loader.create_module(spec) if hasattr(self.loader, "create_module") else None
+
+    def exec_module(self, module):
+        with self.profiler.timing(self.name):
+            self.loader.exec_module(module)
+
+    def __getattr__(self, name):
+        return getattr(self.loader, name)
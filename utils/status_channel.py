@@ -0,0 +1,121 @@
+import threading
+import time
+from collections import deque
+
+from utils.constant import STATUS_FRAME_RATE, STATUS_SUMMARY_WINDOW
+
+
+def redraw_prompt():
+    # prompt_toolkit is already loaded when a prompt runs, and nothing is to be redrawn otherwise
+    from prompt_toolkit.application.current import get_app_or_none
+
+    app = get_app_or_none()
+    if app is not None and app.is_running:
+        app.invalidate()
+
+
+class StatusChannel:
+    """
+    Carries the events of the watcher and of the commands to the bottom toolbar. Publishing is thread-safe and only
+    asks for a redraw, at most `frame_rate` times a second, the toolbar reading the summary when it is rendered.
+    """
+
+    def __init__(self, message: str = "Workspace opened", frame_rate: float = STATUS_FRAME_RATE,
+                 summary_window: float = STATUS_SUMMARY_WINDOW, redraw=redraw_prompt, clock=time.monotonic):
+        """
+        :param summary_window: the saves of the last `summary_window` seconds are counted in the summary
+        """
+        self.frame_rate = frame_rate
+        self.summary_window = summary_window
+        self.redraw = redraw
+        self.clock = clock
+        self._lock = threading.Lock()
+        self._message = message
+        self._headline = message.partition("\n")[0]
+        self._saves = deque()
+        self._last_redraw = None
+        self._redraw_timer = None
+        self._expiry_timer = None
+
+    def configure(self, frame_rate: float = None, summary_window: float = None):
+        with self._lock:
+            self.frame_rate = frame_rate or self.frame_rate
+            self.summary_window = summary_window or self.summary_window
+
+    def publish(self, message: str, save: bool = True):
+        """
+        :param save: whether the message reports an automatic save, counted in the summary
+        """
+        with self._lock:
+            now = self.clock()
+            self._message = message
+            self._headline = message.partition("\n")[0]
+            if save:
+                self._saves.append(now)
+                self.__expire(now)
+                if self._expiry_timer is None:
+                    self.__schedule_expiry(now)
+        self.request_redraw()
+
+    @property
+    def last_message(self) -> str:
+        return self._message
+
+    def summary(self) -> str:
+        with self._lock:
+            self.__expire(self.clock())
+            saves, headline = len(self._saves), self._headline
+        if saves < 2:
+            return headline
+        return f"{saves} saves in the last {self.summary_window:g}s, last: {headline}"
+
+    def request_redraw(self):
+        with self._lock:
+            if self._redraw_timer is not None:
+                # The pending redraw will show this change too
+                return
+            now = self.clock()
+            delay = 0 if self._last_redraw is None else self._last_redraw + 1 / self.frame_rate - now
+            if delay > 0:
+                self._redraw_timer = self.__start_timer(delay, self.__redraw)
+                return
+            self._last_redraw = now
+        self.redraw()
+
+    def close(self):
+        with self._lock:
+            for timer in (self._redraw_timer, self._expiry_timer):
+                if timer is not None:
+                    timer.cancel()
+            self._redraw_timer = self._expiry_timer = None
+
+    def __redraw(self):
+        with self._lock:
+            self._redraw_timer = None
+            self._last_redraw = self.clock()
+        self.redraw()
+
+    def __expire(self, now: float):
+        while self._saves and self._saves[0] <= now - self.summary_window:
+            self._saves.popleft()
+
+    def __schedule_expiry(self, now: float):
+        # The summary changes when the oldest save leaves the window, even if nothing else happens
+        delay = self._saves[0] + self.summary_window - now
+        self._expiry_timer = self.__start_timer(max(delay, 0), self.__on_expiry)
+
+    def __on_expiry(self):
+        with self._lock:
+            now = self.clock()
+            self.__expire(now)
+            self._expiry_timer = None
+            if self._saves:
+                self.__schedule_expiry(now)
+        self.request_redraw()
+
+    @staticmethod
+    def __start_timer(delay: float, function) -> threading.Timer:
+        timer = threading.Timer(delay, function)
+        timer.daemon = True
+        timer.start()
+        return timer
@@ -0,0 +1,126 @@
+import logging
+import os
+import re
+import shlex
+import shutil
+import subprocess
+import tempfile
+import time
+from contextlib import contextmanager
+from typing import Optional
+from urllib.parse import urlsplit
+
+from utils.constant import SSH_CONTROL_PERSIST
+
+SCP_LIKE_URL = re.compile(r"^(?:(?P<user>[^@/]+)@)?(?P<host>[^:/]+):(?!//)")
+
+
+def ssh_destination(url: str) -> Optional[tuple[str, Optional[int]]]:
+    """
+    :return: the `user@host` and port the remote is reached through, None if it is not an SSH remote
+    """
+    if url.startswith(("ssh://", "git+ssh://", "ssh+git://")):
+        parts = urlsplit(url)
+        user = f"{parts.username}@" if parts.username else ""
+        return f"{user}{parts.hostname}", parts.port
+    if "://" in url or os.path.exists(url):
+        return None
+    match = SCP_LIKE_URL.match(url)
+    if match is None:
+        return None
+    return (f"{match.group('user')}@" if match.group("user") else "") + match.group("host"), None
+
+
+class Transport:
+    """
+    The connection to the remote, shared by the pushes and pulls of a session. Over SSH, a master connection is opened
+    once and every git command is multiplexed over it, so only the first one pays for the handshake. HTTP connections
+    cannot outlive a git command, HTTP and local remotes are used as they are.
+    """
+
+    def __init__(self, url: str, ssh_path: str = None, control_persist: int = SSH_CONTROL_PERSIST):
+        self.url = url
+        self.ssh_path = ssh_path
+        self.control_persist = control_persist
+        self.destination = ssh_destination(url)
+        self.ssh_executable = shutil.which("ssh")
+        # Windows' OpenSSH has no connection multiplexing
+        self.multiplexed = self.destination is not None and self.ssh_executable is not None and os.name == "posix"
+        self.timings = []
+        self._control_dir = None
+
+    def ssh_command(self, *options: str) -> list[str]:
+        command = ["ssh"]
+        if self.ssh_path:
+            command += ["-i", str(self.ssh_path)]
+        if self.multiplexed:
+            command += ["-o", f"ControlPath={self.__control_path()}", *options]
+        return command
+
+    def environment(self) -> dict:
+        """
+        :return: the environment variables git commands reaching the remote should run with
+        """
+        if self.destination is None:
+            return {}
+        return {"GIT_SSH_COMMAND": shlex.join(self.ssh_command("-o", "ControlMaster=auto",
+                                                              "-o", f"ControlPersist={self.control_persist}"))}
+
+    def connect(self) -> float:
+        """
+        Opens the master connection if it is not open yet.
+        :return: the time spent on the handshake, 0 when the connection was reused
+        """
+        if not self.multiplexed or self.is_connected():
+            return 0.0
+        started = time.monotonic()
+        # -f only returns once authenticated, the remaining time is the one of the handshake
+        result = subprocess.run(self.ssh_command("-o", "ControlMaster=yes", "-o", f"ControlPersist={self.control_persist}",
+                                                 "-fN", *self.__port_args(), self.destination[0]),
+                                stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+        if result.returncode != 0:
+            # git opens its own connection then, and reports the error if it fails too
+            logging.warning(f"Cannot open the SSH connection to {self.destination[0]}: "
+                            f"{result.stderr.decode(errors='replace').strip()}")
+        return time.monotonic() - started
+
+    def is_connected(self) -> bool:
+        if not self.multiplexed or self._control_dir is None:
+            return False
+        return self.__control("check") == 0
+
+    @contextmanager
+    def timed(self, operation: str):
+        """
+        Connects, then times the operation run in the block, handshake and transfer being reported apart.
+        """
+        handshake = self.connect()
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            transfer = time.monotonic() - started
+            self.timings.append((operation, handshake, transfer))
+            logging.info(f"git {operation}: {handshake * 1000:.0f} ms of handshake, {transfer * 1000:.0f} ms of transfer")
+
+    def close(self):
+        if self._control_dir is None:
+            return
+        if self.is_connected():
+            self.__control("exit")
+        shutil.rmtree(self._control_dir, ignore_errors=True)
+        self._control_dir = None
+
+    def __control(self, command: str) -> int:
+        return subprocess.run(self.ssh_command("-O", command, *self.__port_args(), self.destination[0]),
+                              stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL,
+                              stderr=subprocess.DEVNULL).returncode
+
+    def __port_args(self) -> list[str]:
+        return ["-p", str(self.destination[1])] if self.destination[1] else []
+
+    def __control_path(self) -> str:
+        if self._control_dir is None:
+            # Unix sockets paths are limited to about a hundred characters, the repository path could be too long
+            self._control_dir = tempfile.mkdtemp(prefix="lawg-ssh-")
+        return os.path.join(self._control_dir, "master")
@@ -0,0 +1,94 @@
+import os
+from pathlib import Path, PurePosixPath
+
+from utils.constant import PRUNED_FOLDERS
+
+try:
+    import pathspec
+except ImportError:
+    pathspec = None
+
+WILDCARDS = "*?["
+
+
+def literal_prefix(pattern: str) -> PurePosixPath:
+    """
+    :return: the folders a glob starts with before its first wildcard, e.g. `tp1/src` for `tp1/src/**/*.py`
+    """
+    parts = []
+    for part in pattern.strip("/").split("/")[:-1]:
+        if any(wildcard in part for wildcard in WILDCARDS):
+            break
+        parts.append(part)
+    return PurePosixPath(*parts)
+
+
+class WatchScope:
+    """
+    Decides which parts of the workspace are watched. `.git`, heavy generated folders and ignored folders are pruned,
+    `include` and `exclude` globs (gitignore syntax) let a teacher restrict the watch to the exercise folders.
+    """
+
+    def __init__(self, repo_path, git_manager, include: list[str] = None, exclude: list[str] = None,
+                 pruned_folders: list[str] = PRUNED_FOLDERS):
+        if (include or exclude) and pathspec is None:
+            raise ValueError("The 'watch' settings require the pathspec package.")
+        self.repo_path = Path(repo_path)
+        self.git_manager = git_manager
+        self.pruned_folders = set(pruned_folders)
+        self.include = pathspec.GitIgnoreSpec.from_lines(include) if include else None
+        self.include_prefixes = [literal_prefix(pattern) for pattern in include or []]
+        self.exclude = pathspec.GitIgnoreSpec.from_lines(exclude) if exclude else None
+
+    def is_pruned(self, folder: Path) -> bool:
+        """
+        Tells whether nothing below the folder has to be watched.
+        """
+        if folder.name in self.pruned_folders:
+            return True
+        relative_folder = PurePosixPath(folder.relative_to(self.repo_path).as_posix())
+        if self.exclude is not None and self.exclude.match_file(f"{relative_folder}/"):
+            return True
+        if self.include is not None and not any(
+                prefix in relative_folder.parents or relative_folder in prefix.parents or prefix == relative_folder
+                for prefix in self.include_prefixes):
+            return True
+        return self.git_manager.is_ignored(folder)
+
+    def accepts(self, path: Path) -> bool:
+        """
+        Tells whether events on the file are in the scope.
+        """
+        try:
+            relative_path = path.relative_to(self.repo_path)
+        except ValueError:
+            return False
+        if any(part in self.pruned_folders for part in relative_path.parts[:-1]):
+            return False
+        if self.exclude is not None and self.exclude.match_file(relative_path.as_posix()):
+            return False
+        return self.include is None or self.include.match_file(relative_path.as_posix())
+
+    def listdir(self, folder):
+        """
+        `os.scandir` replacement for the polling snapshots that never descends into pruned folders.
+        """
+        with os.scandir(folder) as entries:
+            return [entry.name for entry in entries
+                    if not (entry.is_dir(follow_symlinks=False) and self.is_pruned(Path(entry.path)))]
+
+    def top_level_folders(self) -> list[Path]:
+        with os.scandir(self.repo_path) as entries:
+            return [Path(entry.path) for entry in entries
+                    if entry.is_dir(follow_symlinks=False) and not self.is_pruned(Path(entry.path))]
+
+    def walk_files(self, folder: Path):
+        """
+        Yields every file in scope below the folder, without entering pruned folders.
+        """
+        for root, folder_names, file_names in os.walk(folder):
+            folder_names[:] = [name for name in folder_names if not self.is_pruned(Path(root) / name)]
+            for file_name in file_names:
+                path = Path(root) / file_name
+                if self.accepts(path):
+                    yield path
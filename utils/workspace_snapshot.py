@@ -0,0 +1,96 @@
+import gzip
+import logging
+import os
+from pathlib import Path
+from typing import Optional
+
+from utils.event_coalescer import CREATED, DELETED, MODIFIED, MOVED
+
+SNAPSHOT_VERSION = "1"
+
+
+class WorkspaceSnapshot:
+    """
+    The inode, size and modification time of every watched file, kept between two sessions so that the changes made
+    while LAWG was closed can be replayed as precise events instead of being found by a full rescan and rehash.
+    """
+
+    def __init__(self, repo_path, entries: dict[str, tuple[int, int, int]] = None):
+        self.repo_path = Path(repo_path)
+        self.entries = entries or {}
+
+    @classmethod
+    def scan(cls, scope) -> "WorkspaceSnapshot":
+        """
+        Stats the files in scope with `os.scandir`, without entering pruned folders and without reading any file.
+        """
+        entries = {}
+        folders = [scope.repo_path]
+        while folders:
+            folder = folders.pop()
+            try:
+                with os.scandir(folder) as folder_entries:
+                    for entry in folder_entries:
+                        path = Path(entry.path)
+                        if entry.is_dir(follow_symlinks=False):
+                            if not scope.is_pruned(path):
+                                folders.append(path)
+                        elif scope.accepts(path):
+                            status = entry.stat(follow_symlinks=False)
+                            entries[path.relative_to(scope.repo_path).as_posix()] = \
+                                (entry.inode(), status.st_size, status.st_mtime_ns)
+            except (FileNotFoundError, NotADirectoryError, PermissionError):
+                continue
+        return cls(scope.repo_path, entries)
+
+    @classmethod
+    def load(cls, repo_path, snapshot_path) -> Optional["WorkspaceSnapshot"]:
+        """
+        :return: the snapshot saved by the previous session, None if there is none or if it cannot be read
+        """
+        entries = {}
+        try:
+            with gzip.open(snapshot_path, "rt", encoding="utf-8", newline="\n") as snapshot_file:
+                if snapshot_file.readline().rstrip("\n") != f"lawg-snapshot {SNAPSHOT_VERSION}":
+                    return None
+                for line in snapshot_file:
+                    inode, size, mtime_ns, path = line.rstrip("\n").split("\t", 3)
+                    entries[path] = (int(inode), int(size), int(mtime_ns))
+        except FileNotFoundError:
+            return None
+        except (OSError, EOFError, ValueError) as e:
+            logging.warning(f"Ignoring the unreadable watcher snapshot {snapshot_path}: {e}")
+            return None
+        return cls(repo_path, entries)
+
+    def save(self, snapshot_path):
+        snapshot_path = Path(snapshot_path)
+        snapshot_path.parent.mkdir(parents=True, exist_ok=True)
+        temporary_path = snapshot_path.with_name(snapshot_path.name + ".tmp")
+        with gzip.open(temporary_path, "wt", encoding="utf-8", newline="\n", compresslevel=1) as snapshot_file:
+            snapshot_file.write(f"lawg-snapshot {SNAPSHOT_VERSION}\n")
+            snapshot_file.writelines(f"{inode}\t{size}\t{mtime_ns}\t{path}\n"
+                                     for path, (inode, size, mtime_ns) in self.entries.items())
+        os.replace(temporary_path, snapshot_path)
+
+    def changes_since(self, previous: "WorkspaceSnapshot") -> list[tuple[str, Path, Optional[Path]]]:
+        """
+        :return: the (kind, path, source path) changes turning the previous snapshot into this one, a deleted and a
+        created file sharing an inode, a size and a modification time being a move
+        """
+        created = self.entries.keys() - previous.entries.keys()
+        deleted = previous.entries.keys() - self.entries.keys()
+        deleted_by_inode = {previous.entries[path][0]: path for path in deleted}
+        changes = []
+        for path in sorted(created):
+            src_path = deleted_by_inode.get(self.entries[path][0])
+            if src_path is not None and src_path in deleted and previous.entries[src_path] == self.entries[path]:
+                deleted.discard(src_path)
+                changes.append((MOVED, self.repo_path / path, self.repo_path / src_path))
+            else:
+                changes.append((CREATED, self.repo_path / path, None))
+        changes.extend((DELETED, self.repo_path / path, None) for path in sorted(deleted))
+        changes.extend((MODIFIED, self.repo_path / path, None)
+                       for path in sorted(self.entries.keys() & previous.entries.keys())
+                       if self.entries[path] != previous.entries[path])
+        return changes